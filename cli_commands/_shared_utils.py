@@ -17,12 +17,33 @@ def add_dtl_costs_to_parser(parser: argparse.ArgumentParser):
     parser.add_argument("-l", "--loss-cost", type=float, metavar="<loss_cost>",
                         default=1.0, help="floating point cost incurred on each loss event")
 
-def set_csv_path(args, command_str):
+def positive_int(value: str) -> int:
+    """
+    argparse type of a count such as a number of processes, at least 1
+    """
+    count = int(value)
+    if count < 1:
+        raise argparse.ArgumentTypeError("%s is not at least 1" % value)
+    return count
+
+def probability(value: str) -> float:
+    """
+    argparse type of a level such as a significance or confidence level, strictly between 0 and 1
+    """
+    level = float(value)
+    if not 0 < level < 1:
+        raise argparse.ArgumentTypeError("%s is not strictly between 0 and 1" % value)
+    return level
+
+def set_csv_path(args, command_str, suffixes=(".csv",)):
+    """
+    Fill in args.csv from the parasite file name if it was not given.
+    suffixes are the allowed file name endings, the first one is used for the default name.
+    """
     fname = Path(args.parasite)
     cost_suffix = ".{}.{}-{}-{}".format(command_str, args.dup_cost, args.trans_cost, args.loss_cost)
     if args.csv is None:
-        args.csv = fname.with_suffix(cost_suffix + ".csv")
-    # If args.csv was set, make sure it's a .csv file
+        args.csv = fname.with_suffix(cost_suffix + suffixes[0])
+    # If args.csv was set, make sure it has one of the allowed suffixes
     else:
-        p = Path(args.csv)
-        assert p.suffix == ".csv"
+        assert str(args.csv).endswith(tuple(suffixes)), "output file must end with one of " + ", ".join(suffixes)
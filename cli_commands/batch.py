@@ -0,0 +1,49 @@
+import argparse
+import csv
+import json
+from pathlib import Path
+
+import cli_commands._shared_utils
+from empress.reconcile import batch
+
+
+def add_batch_to_parser(batch_parser: argparse.ArgumentParser):
+    batch_parser.add_argument("host", metavar="<host_file>",
+                              help="file path to the host tree")
+    batch_parser.add_argument("manifest", metavar="<manifest_file>",
+                              help="file listing one family per line: '<parasite_file> <mapping_file> [<name>]', "
+                                   "with paths relative to the manifest")
+    cli_commands._shared_utils.add_dtl_costs_to_parser(batch_parser)
+    batch_parser.add_argument("--jobs", metavar="<number of processes>",
+                              type=cli_commands._shared_utils.positive_int, default=1,
+                              help="Number of processes to reconcile families in.")
+    batch_parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl",
+                              help="format of the results, one JSON object or CSV row per family")
+    batch_parser.add_argument("--outfile", metavar="<filename>",
+                              help="Output the results at the path provided. If no filename is provided, outputs "
+                                   "to a filename based on the manifest file.")
+
+
+def run_batch(args):
+    if args.outfile is None:
+        cost_suffix = ".batch.{}-{}-{}.{}".format(args.dup_cost, args.trans_cost, args.loss_cost, args.format)
+        args.outfile = Path(args.manifest).with_suffix(cost_suffix)
+    print("Output to {}".format(args.outfile))
+    families = batch.read_manifest(args.manifest)
+    records = batch.reconcile_families(args.host, families, args.dup_cost, args.trans_cost, args.loss_cost,
+                                       args.jobs)
+    n_failed = 0
+    with open(args.outfile, "w", newline="") as out_file:
+        if args.format == "csv":
+            writer = csv.DictWriter(out_file, fieldnames=batch.RECORD_FIELDS)
+            writer.writeheader()
+        # Every record is written and flushed as soon as its family is done
+        for record in records:
+            if args.format == "csv":
+                writer.writerow(record)
+            else:
+                out_file.write(json.dumps(record) + "\n")
+            out_file.flush()
+            if record["error"] is not None:
+                n_failed += 1
+    print("Reconciled {} families, {} failed".format(len(families) - n_failed, n_failed))
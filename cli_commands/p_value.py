@@ -3,6 +3,7 @@ from pathlib import Path
 from matplotlib import pyplot as plt
 import cli_commands._shared_utils
 import empress
+from empress.reconcile import statistics
 
 def add_p_value_to_parser(p_value_parser: argparse.ArgumentParser):
     cli_commands._shared_utils.add_recon_input_args_to_parser(p_value_parser)
@@ -12,6 +13,21 @@ def add_p_value_to_parser(p_value_parser: argparse.ArgumentParser):
                                 "provided, outputs to a filename based on the input host file.")
     p_value_parser.add_argument("--n-samples", metavar="<number of samples>", type=int,
                                 help="Number of random mappings to sample.", default=100)
+    p_value_parser.add_argument("--jobs", metavar="<number of processes>",
+                                type=cli_commands._shared_utils.positive_int, default=1,
+                                help="Number of processes to spread the random samples over.")
+    p_value_parser.add_argument("--seed", metavar="<seed>", type=int, default=None,
+                                help="Seed for the random mappings. Results are reproducible for the same seed "
+                                "and number of processes.")
+    p_value_parser.add_argument("--alpha", metavar="<significance level>",
+                                type=cli_commands._shared_utils.probability, default=None,
+                                help="Stop sampling early once the p-value is confidently below or above this "
+                                "level. --n-samples is then the largest number of samples.")
+    p_value_parser.add_argument("--confidence", metavar="<confidence level>",
+                                type=cli_commands._shared_utils.probability, default=0.99,
+                                help="Confidence level used to decide when to stop sampling with --alpha, strictly "
+                                "between 0 and 1. It holds over all the stopping checks together, not only the "
+                                "last one.")
 
 def run_p_value(args):
     recon_input = empress.ReconInputWrapper.from_files(args.host, args.parasite, args.mapping)
@@ -22,6 +38,14 @@ def run_p_value(args):
     else:
         outfile = args.outfile
     recongraph = recon_input.reconcile(args.dup_cost, args.trans_cost, args.loss_cost)
-    fig = recongraph.draw_stats(args.n_samples)
+    if args.alpha is None:
+        fig = recongraph.draw_stats(args.n_samples, args.jobs, args.seed)
+    else:
+        costs, p, (p_low, p_high) = recongraph.sequential_stats(args.alpha, args.n_samples, args.confidence,
+                                                                args.seed, args.jobs)
+        print("p-value: {} after {} samples ({}% confidence interval: {} - {})".format(
+            p, len(costs), 100 * args.confidence, p_low, p_high))
+        fig, ax = plt.subplots(1, 1)
+        statistics.draw_stats(ax, recongraph.total_cost, costs, p)
     fig.savefig(outfile)
     plt.close(fig)
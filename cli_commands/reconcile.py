@@ -1,7 +1,7 @@
 import argparse
 
 import empress
-from empress.reconcile import recongraph_tools
+from empress.reconcile import graph_export
 import cli_commands._shared_utils
 
 
@@ -9,10 +9,19 @@ def add_reconcile_to_parser(reconcile_parser: argparse.ArgumentParser):
     cli_commands._shared_utils.add_recon_input_args_to_parser(reconcile_parser)
     cli_commands._shared_utils.add_dtl_costs_to_parser(reconcile_parser)
     reconcile_parser.add_argument("--csv", metavar="<filename>",
-                                  help="output the reconciliation as a .csv file at the path provided. If no "
+                                  help="output the reconciliation as a .csv file at the path provided, or as JSON "
+                                       "lines if the path ends with .jsonl; a .gz suffix compresses the output. If no "
                                        "filename is provided, outputs to a filename based on the input host file")
+    reconcile_parser.add_argument("--columns", default=",".join(graph_export.DEFAULT_COLUMNS),
+                                  help="comma separated columns of the output, out of "
+                                       + ", ".join(graph_export.COLUMNS))
+    reconcile_parser.add_argument("--gzip", action="store_true",
+                                  help="compress the output with gzip (the default file name then ends with .gz)")
     reconcile_parser.add_argument("--graph", action="store_true",
                                   help="instead of outputting a random median, output the entire reconciliation graph")
+    reconcile_parser.add_argument("--counting", choices=["exact", "log", "modular"], default="exact",
+                                  help="how to count reconciliations: exactly, or in log space (optionally with the "
+                                       "count modulo a large prime) for very large numbers of reconciliations")
     
 
 def run_reconcile(args):
@@ -20,13 +29,22 @@ def run_reconcile(args):
         command_str = "recon_graph"
     else:
         command_str = "recon"
-    cli_commands._shared_utils.set_csv_path(args, command_str)
+    suffixes = [".csv", ".jsonl"]
+    if args.gzip:
+        suffixes = [suffix + ".gz" for suffix in suffixes]
+    else:
+        suffixes += [suffix + ".gz" for suffix in suffixes]
+    cli_commands._shared_utils.set_csv_path(args, command_str, suffixes)
+    columns = [column.strip() for column in args.columns.split(",")]
     print("Output to {}".format(args.csv))
     recon_input = empress.ReconInputWrapper.from_files(args.host, args.parasite, args.mapping)
-    recon_graph = recon_input.reconcile(args.dup_cost, args.trans_cost, args.loss_cost)
+    recon_graph = recon_input.reconcile(args.dup_cost, args.trans_cost, args.loss_cost, counting=args.counting)
     if args.graph:
-        recon_graph.export_csv(args.csv)
+        recon_graph.export_csv(args.csv, columns)
     else:
         median = recon_graph.median()
-        median.export_csv(args.csv)
-    print("Number of optimal reconciliations: {}".format(recon_graph.n_recon))
+        median.export_csv(args.csv, columns)
+    if args.counting == "exact":
+        print("Number of optimal reconciliations: {}".format(recon_graph.n_recon))
+    else:
+        print("Log10 of the number of optimal reconciliations: {}".format(recon_graph.n_recon))
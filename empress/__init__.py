@@ -2,6 +2,7 @@
 Wraps empress functionalities
 """
 from typing import Dict
+import math
 import sys
 
 from matplotlib import pyplot as plt
@@ -10,13 +11,20 @@ from abc import ABC, abstractmethod
 
 from empress.xscape.CostVector import CostVector
 from empress.input_reader import _ReconInput
+from empress.recon_graph import CompactReconGraph, LazyMapping
+from empress import binary_io
+from empress import result_cache
 from empress.xscape.reconcile import reconcile as xscape_reconcile
 from empress.xscape.plotcosts_analytic import plot_costs_on_axis as xscape_plot_costs_on_axis
 from empress.reconcile import recongraph_tools
+from empress.reconcile import graph_export
+from empress.reconcile import array_dp
+from empress.reconcile import array_median
+from empress.reconcile import rerooting
 from empress.reconcile import recongraph_visualization
-from empress.reconcile import median
 from empress.reconcile import diameter
 from empress.reconcile import statistics
+from empress.reconcile import mpr_counting
 from empress.histogram import histogram_display
 from empress.histogram import histogram_alg
 from empress.cluster import cluster_util
@@ -132,16 +140,24 @@ class ReconciliationWrapper(Drawable):
                 loss_count += 1
         return cospec_count, dup_count, trans_count, loss_count
 
-    def export_csv(self, filename):
-        recongraph_tools.export_csv(filename, self._reconciliation, [self.root],
-                self.event_frequencies, self.node_frequencies)
+    def export_csv(self, filename, columns=graph_export.DEFAULT_COLUMNS, file_format: str = None,
+                   compress: bool = None):
+        """
+        Stream the events of the reconciliation to filename, see graph_export.export_graph
+        """
+        graph_export.export_graph(filename, self._reconciliation, [self.root], self.event_frequencies,
+                                  self.node_frequencies, columns, file_format, compress)
 
 class ReconGraphWrapper(Drawable):
     # TODO: Replace dict with ReconGraph type
     # https://github.com/ssantichaivekin/eMPRess/issues/30
     def __init__(self, recongraph: dict, roots: list, n_recon: int, recon_input: _ReconInput, dup_cost, trans_cost,
                  loss_cost, total_cost: float, event_frequencies: Dict[tuple, float] = None,
-                 node_frequencies: Dict[tuple, float] = None):
+                 node_frequencies: Dict[tuple, float] = None, counting: str = "exact"):
+        """
+        counting is the name of the mpr_counting backend used for MPR counts and frequencies. With any backend
+        other than "exact", n_recon is the log10 of the number of MPRs.
+        """
         self.recon_input = recon_input
         self.dup_cost = dup_cost
         self.trans_cost = trans_cost
@@ -152,19 +168,97 @@ class ReconGraphWrapper(Drawable):
         self.roots = roots
         self.event_frequencies = event_frequencies
         self.node_frequencies = node_frequencies
+        self.counting = mpr_counting.get_backend(counting)
+        # Filled DP tables, kept by ReconInputWrapper.reconcile(..., keep_tables=True) for update_tip_mapping
+        self._dp_tables = None
+        # Intermediate results shared by the methods below, computed on first use (see _memoized)
+        self._session = {}
+
+    def _memoized(self, name: str, compute):
+        """
+        Return the intermediate result called name, calling compute() the first time it is asked for.
+        The results only depend on the recongraph and the input trees, which a wrapper never changes.
+        """
+        if name not in self._session:
+            self._session[name] = compute()
+        return self._session[name]
+
+    def _vertex_trees(self):
+        """
+        Return the parasite and host trees in the vertex format of the histogram and median algorithms:
+        (parasite tree, parasite root, host tree, host root)
+        """
+        def compute():
+            parasite_tree, parasite_root, _ = self.recon_input.parasite_index.vertex_tree()
+            host_tree, host_root, _ = self.recon_input.host_index.vertex_tree()
+            return parasite_tree, parasite_root, host_tree, host_root
+        return self._memoized("vertex_trees", compute)
+
+    def _postorder_graph(self) -> CompactReconGraph:
+        """
+        Return the recongraph as a CompactReconGraph in postorder, the input of array_median. Reconciliations made
+        by ReconInputWrapper.reconcile get it from the DP; other graphs are converted once.
+        """
+        def compute():
+            recon_input = self.recon_input
+            graph = self.recongraph
+            if not (isinstance(graph, CompactReconGraph) and graph.parasite_names == recon_input.parasite_index.names
+                    and graph.host_names == recon_input.host_index.names):
+                graph = CompactReconGraph.from_dict(graph, parasite_index=recon_input.parasite_index,
+                                                    host_index=recon_input.host_index)
+            return graph.postorder()
+        return self._memoized("postorder_graph", compute)
+
+    def _schedule(self) -> array_median.Schedule:
+        return self._memoized("schedule", lambda: array_median.Schedule(
+            self._postorder_graph(), self.recon_input.parasite_index, self.recon_input.host_index))
+
+    def _frequency_arrays(self):
+        """
+        Return the (node frequencies, event frequencies) of the recongraph as arrays over the mapping nodes and
+        events of _postorder_graph
+        """
+        def compute():
+            schedule = self._schedule()
+            node_counts, event_counts = array_median.count_mprs(schedule, self.counting)
+            node_frequencies, event_frequencies, _ = array_median.frequencies(schedule, node_counts, event_counts,
+                                                                              self.counting)
+            return node_frequencies, event_frequencies
+        return self._memoized("frequency_arrays", compute)
+
+    def _frequencies(self):
+        """
+        Return the (node frequencies, event frequencies) of the recongraph, as dicts from mapping nodes and events
+        """
+        def compute():
+            graph = self._postorder_graph()
+            node_frequencies, event_frequencies = self._frequency_arrays()
+            return dict(zip(graph, node_frequencies.tolist())), \
+                dict(zip(graph.event_tuples(), event_frequencies.tolist()))
+        return self._memoized("frequencies", compute)
+
+    def _histogram(self) -> dict:
+        """
+        Return the pairwise distance histogram of the recongraph, as a dict from distance to number of pairs
+        """
+        def compute():
+            parasite_tree, parasite_root, host_tree, _ = self._vertex_trees()
+            return histogram_alg.diameter_algorithm(host_tree, parasite_tree, parasite_root, self.recongraph,
+                                                    self.recongraph, False, False,
+                                                    species_index=self.recon_input.host_index).histogram_dict
+
+        def compute_or_read_cache():
+            cache = result_cache.active_cache()
+            if cache is None:
+                return compute()
+            return cache.get_or_compute(cache.key("histogram", self.recon_input, self.recongraph), compute)
+        return self._memoized("histogram", compute_or_read_cache)
 
     def draw_on(self, axes: plt.Axes, y_label=True):
         """
         Draw Pairwise Distance Histogram on axes
         """
-        # Reformat the host and parasite tree to use it with the histogram algorithm
-        parasite_tree, parasite_tree_root, parasite_node_count = diameter.reformat_tree(self.recon_input.parasite_dict, "pTop")
-        host_tree, host_tree_root, host_node_count \
-            = diameter.reformat_tree(self.recon_input.host_dict, "hTop")
-        hist = histogram_alg.diameter_algorithm(
-            host_tree, parasite_tree, parasite_tree_root, self.recongraph, self.recongraph,
-            False, False)
-        histogram_display.plot_histogram_to_ax(axes, hist.histogram_dict, y_label)
+        histogram_display.plot_histogram_to_ax(axes, self._histogram(), y_label)
 
     def draw_graph_to_file(self, fname):
         """
@@ -172,17 +266,33 @@ class ReconGraphWrapper(Drawable):
         """
         recongraph_visualization.visualize_and_save(self.recongraph, fname)
 
-    def stats(self, num_trials: int = STATS_TRIALS):
-        _, costs, p = statistics.stats(self.recon_input, self.dup_cost, self.trans_cost, self.loss_cost, num_trials)
+    def stats(self, num_trials: int = STATS_TRIALS, n_jobs: int = 1, seed: int = None):
+        """
+        Return the costs of num_trials reconciliations with random tip mappings and the p-value of self's cost.
+        The trials are spread over n_jobs processes. If seed is given, the result only depends on seed and n_jobs.
+        """
+        _, costs, p = statistics.stats(self.recon_input, self.dup_cost, self.trans_cost, self.loss_cost, num_trials,
+                                       n_jobs, seed, mpr_cost=self.total_cost)
         return costs, p
 
-    def draw_stats_on(self, ax: plt.Axes, num_trials: int = STATS_TRIALS):
-        costs, p = self.stats(num_trials)
+    def sequential_stats(self, alpha: float, max_trials: int = STATS_TRIALS, confidence: float = 0.99,
+                         seed: int = None, n_jobs: int = 1):
+        """
+        Like stats, but stops as soon as the p-value is confidently below or above alpha.
+        Return the costs of the trials that were run, the p-value and its confidence interval.
+        """
+        _, costs, p, interval = statistics.sequential_stats(self.recon_input, self.dup_cost, self.trans_cost,
+                                                            self.loss_cost, alpha, max_trials, confidence, seed,
+                                                            mpr_cost=self.total_cost, n_jobs=n_jobs)
+        return costs, p, interval
+
+    def draw_stats_on(self, ax: plt.Axes, num_trials: int = STATS_TRIALS, n_jobs: int = 1, seed: int = None):
+        costs, p = self.stats(num_trials, n_jobs, seed)
         statistics.draw_stats(ax, self.total_cost, costs, p)
 
-    def draw_stats(self, num_trials: int = STATS_TRIALS):
+    def draw_stats(self, num_trials: int = STATS_TRIALS, n_jobs: int = 1, seed: int = None):
         figure, ax = plt.subplots(1, 1)
-        self.draw_stats_on(ax, num_trials)
+        self.draw_stats_on(ax, num_trials, n_jobs, seed)
         return figure
 
     def median(self) -> ReconciliationWrapper:
@@ -190,16 +300,22 @@ class ReconGraphWrapper(Drawable):
         Return one of the best ReconciliationWrapper that best represents the
         reconciliation graph. The function internally uses random and is not deterministic.
         """
-        postorder_parasite_tree, parasite_tree_root, _ = diameter.reformat_tree(self.recon_input.parasite_dict, "pTop")
-        postorder_host_tree, _, _ = diameter.reformat_tree(self.recon_input.host_dict, "hTop")
-
-        # Compute the median reconciliation graph
-        median_reconciliation, n_meds, roots_for_median = median.get_median_graph(
-            self.recongraph, postorder_parasite_tree, postorder_host_tree, parasite_tree_root, self.roots)
-
-        med_counts_dict = median.get_med_counts(median_reconciliation, roots_for_median)
-
-        random_median = median.choose_random_median_wrapper(median_reconciliation, roots_for_median, med_counts_dict)
+        def compute_median_graph():
+            graph = self._postorder_graph()
+            schedule = self._schedule()
+            _, event_frequencies = self._frequency_arrays()
+            best_events, median_roots = array_median.median_events(
+                schedule, event_frequencies, [graph.node_id(root) for root in self.roots])
+            # Medians are always counted exactly, like median.get_med_counts
+            median_node_counts, median_event_counts = array_median.count_mprs(schedule, mpr_counting.EXACT,
+                                                                              best_events)
+            return best_events, median_roots, median_node_counts, median_event_counts
+
+        # Only the final random choice differs between calls
+        best_events, median_roots, median_node_counts, median_event_counts = self._memoized("median_graph",
+                                                                                            compute_median_graph)
+        random_median = array_median.choose_random_median(self._postorder_graph(), best_events, median_roots,
+                                                          median_node_counts, median_event_counts)
         median_root = _find_roots(random_median)[0]
         return ReconciliationWrapper(random_median, median_root, self.recon_input, self.dup_cost, self.trans_cost,
                                      self.loss_cost, self.total_cost, self.event_frequencies, self.node_frequencies)
@@ -208,11 +324,17 @@ class ReconGraphWrapper(Drawable):
         """
         Cluster self into list of n ReconGraphWrapper.
         """
-        if n > self.n_recon:
+        n_recon_exceeded = n > self.n_recon if self.counting is mpr_counting.EXACT else math.log10(n) > self.n_recon
+        if n_recon_exceeded:
             raise Exception("Cannot cluster %d Reconciliation into %d clusters" % (self.n_recon, n))
 
-        parasite_tree, host_tree, parasite_root, recon_g, mpr_count, best_roots = \
-            cluster_util.get_tree_info(self.recon_input, self.dup_cost, self.trans_cost, self.loss_cost)
+        parasite_tree, parasite_root, host_tree, _ = self._vertex_trees()
+        # The splitting needs the exact number of MPRs, which n_recon only holds with exact counting
+        if self.counting is mpr_counting.EXACT:
+            mpr_count = self.n_recon
+        else:
+            mpr_count = self._memoized("exact_mpr_count",
+                                       lambda: recongraph_tools.count_mprs_wrapper(self.roots, self.recongraph))
 
         score = cluster_util.mk_pdv_score(host_tree, parasite_tree, parasite_root)
         n_splits = CLUSTER_NSPLITS
@@ -224,10 +346,10 @@ class ReconGraphWrapper(Drawable):
         new_graphs = []
         for graph in graphs:
             roots = _find_roots(graph)
-            n = recongraph_tools.count_mprs_wrapper(roots, graph)
+            n = self.counting.n_recon(recongraph_tools.count_mprs_wrapper(roots, graph, self.counting))
             new_graphs.append(
                 ReconGraphWrapper(graph, roots, n, self.recon_input, self.dup_cost, self.trans_cost, self.loss_cost,
-                                  self.total_cost, self.event_frequencies))
+                                  self.total_cost, self.event_frequencies, counting=self.counting.name))
         return new_graphs
 
     def set_event_frequencies(self):
@@ -236,16 +358,97 @@ class ReconGraphWrapper(Drawable):
         event_frequencies is a dictionary that maps events nodes to their frequencies in all the optimal reconciliations
         indicated by the recongraph
         """
-        postorder_parasite_tree, parasite_tree_root, _ = diameter.reformat_tree(self.recon_input.parasite_dict, "pTop")
-        postorder_host_tree, _, _ = diameter.reformat_tree(self.recon_input.host_dict, "hTop")
-        postorder_mapping_node_list = median.mapping_node_sort(postorder_parasite_tree, postorder_host_tree,
-                                                    list(self.recongraph.keys()))
-        node_frequencies, event_frequencies, _ = median.generate_frequencies_dict(postorder_mapping_node_list[::-1], self.recongraph, parasite_tree_root)
+        node_frequencies, event_frequencies = self._frequencies()
         self.event_frequencies = event_frequencies
         self.node_frequencies = node_frequencies
 
-    def export_csv(self, filename):
-        recongraph_tools.export_csv(filename, self.recongraph, self.roots, self.event_frequencies, self.node_frequencies)
+    def compact(self) -> CompactReconGraph:
+        """
+        Return the recongraph and its frequencies (if they are set) as a CompactReconGraph whose name tables are
+        the tree indices of recon_input. It can be passed anywhere the recongraph dict is read.
+        """
+        # A graph loaded from a file is already compact
+        if isinstance(self.recongraph, CompactReconGraph) and \
+                (self.event_frequencies is None or self.recongraph.event_frequencies is not None):
+            return self.recongraph
+
+        def compute():
+            return CompactReconGraph.from_dict(self.recongraph, self.event_frequencies, self.node_frequencies,
+                                               parasite_index=self.recon_input.parasite_index,
+                                               host_index=self.recon_input.host_index)
+        # The frequencies can be set after the graph, so they are part of the name
+        return self._memoized(("compact", self.event_frequencies is not None), compute)
+
+    def update_tip_mapping(self, tip_mapping_changes: Dict[str, str]) -> 'ReconGraphWrapper':
+        """
+        Reconcile again after some parasite tips were mapped to other host tips. Only the DP rows of the
+        parasite nodes above a changed tip are recomputed, the rest are reused from self.
+        The rows are only reused if self was created by ReconInputWrapper.reconcile(..., keep_tables=True);
+        otherwise the new tip mapping is reconciled from scratch. self is not modified.
+        :param tip_mapping_changes - maps each changed parasite tip to its new host tip
+        :return: the reconciliation graph of the new tip mapping, with its tables kept
+        """
+        tip_mapping = dict(self.recon_input.tip_mapping)
+        tip_mapping.update(tip_mapping_changes)
+        recon_input = ReconInputWrapper(self.recon_input.host_dict, self.recon_input.host_distances,
+                                        self.recon_input.parasite_dict, self.recon_input.parasite_distances,
+                                        tip_mapping)
+        if self._dp_tables is None:
+            return recon_input.reconcile(self.dup_cost, self.trans_cost, self.loss_cost, keep_tables=True,
+                                         counting=self.counting.name)
+        tables = self._dp_tables.copy()
+        tables.update_tip_mapping(tip_mapping)
+        graph, total_cost, n_recon, roots, postorder_graph = array_dp.reconcile_tables(tables, self.counting,
+                                                                                       compact=True)
+        recongraph = ReconGraphWrapper(graph, roots, self.counting.n_recon(n_recon), recon_input, self.dup_cost,
+                                       self.trans_cost, self.loss_cost, total_cost, counting=self.counting.name)
+        recongraph._dp_tables = tables
+        recongraph._session["postorder_graph"] = postorder_graph
+        recongraph.set_event_frequencies()
+        return recongraph
+
+    def export_csv(self, filename, columns=graph_export.DEFAULT_COLUMNS, file_format: str = None,
+                   compress: bool = None):
+        """
+        Stream the events of the recongraph to filename, see graph_export.export_graph
+        """
+        graph_export.export_graph(filename, self.recongraph, self.roots, self.event_frequencies,
+                                  self.node_frequencies, columns, file_format, compress)
+
+    def save(self, path: str):
+        """
+        Write the recongraph, its frequencies, the input trees and tip mapping and the costs to a binary file that
+        ReconGraphWrapper.load maps back into memory without copying (see binary_io.py)
+        """
+        metadata = {"dup_cost": self.dup_cost, "trans_cost": self.trans_cost, "loss_cost": self.loss_cost,
+                    "total_cost": self.total_cost, "n_recon": self.n_recon, "counting": self.counting.name}
+        recon_input = self.recon_input
+        binary_io.save_recon_result(path, self.compact(), self.roots, recon_input.host_index,
+                                    recon_input.parasite_index, recon_input.tip_mapping, recon_input.host_distances,
+                                    recon_input.parasite_distances, metadata)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'ReconGraphWrapper':
+        """
+        Open a file written by ReconGraphWrapper.save. The recongraph is a CompactReconGraph over the mapped
+        arrays, and the frequency dicts are only built when they are first read.
+        """
+        result = binary_io.load_recon_result(path, mmap)
+        host_index = result["host_index"]
+        parasite_index = result["parasite_index"]
+        recon_input = ReconInputWrapper(host_index.to_edge_dict(), result["host_distances"],
+                                        parasite_index.to_edge_dict(), result["parasite_distances"],
+                                        result["tip_mapping"])
+        # The indices were just read, there is no need to build them again from the dicts
+        recon_input._host_index = (recon_input.host_dict, host_index)
+        recon_input._parasite_index = (recon_input.parasite_dict, parasite_index)
+        graph = result["graph"]
+        metadata = result["metadata"]
+        event_frequencies = None if graph.event_frequencies is None else LazyMapping(graph.event_frequencies_dict)
+        node_frequencies = None if graph.node_frequencies is None else LazyMapping(graph.node_frequencies_dict)
+        return cls(graph, result["roots"], metadata["n_recon"], recon_input, metadata["dup_cost"],
+                   metadata["trans_cost"], metadata["loss_cost"], metadata["total_cost"], event_frequencies,
+                   node_frequencies, counting=metadata["counting"])
 
 class CostRegionsWrapper(Drawable):
     def __init__(self, cost_vectors, transfer_min, transfer_max, dup_min, dup_max):
@@ -281,15 +484,83 @@ class ReconInputWrapper(_ReconInput, Drawable):
         parasite_dict = self.parasite_dict
         host_dict = self.host_dict
         tip_mapping = self.tip_mapping
-        cost_vectors = xscape_reconcile(parasite_dict, host_dict, tip_mapping, transfer_min, transfer_max, dup_min, dup_max)
+        cache = result_cache.active_cache()
+        if cache is None:
+            cost_vectors = xscape_reconcile(parasite_dict, host_dict, tip_mapping, transfer_min, transfer_max,
+                                            dup_min, dup_max)
+        else:
+            cost_vectors = cache.get_or_compute(
+                cache.key("cost-regions", self, transfer_min, transfer_max, dup_min, dup_max),
+                lambda: xscape_reconcile(parasite_dict, host_dict, tip_mapping, transfer_min, transfer_max,
+                                         dup_min, dup_max))
         return CostRegionsWrapper(cost_vectors, transfer_min, transfer_max, dup_min, dup_max)
 
-    def reconcile(self, dup_cost: int, trans_cost: int, loss_cost: int) -> ReconGraphWrapper:
+    def reconcile(self, dup_cost: int, trans_cost: int, loss_cost: int,
+                  keep_tables: bool = False, counting: str = "exact") -> ReconGraphWrapper:
         """
         Given self (which has parasite tree, host tree, and tip mapping info)
         and the cost of the three events, computes and returns a reconciliation graph.
+        If keep_tables is set, the DP tables are kept on the result so that ReconGraphWrapper.update_tip_mapping
+        can reconcile an edited tip mapping incrementally.
+        counting selects how MPRs are counted: "exact" (Python integers), "log" (log-space floats) or "modular"
+        (log-space floats and counts modulo a large prime). The last two keep counts and frequencies finite on
+        huge numbers of MPRs and make n_recon the log10 of the count.
+        If a result cache is active (see empress.result_cache), a result computed earlier for the same trees, tip
+        mapping, costs and counting is read from it instead of reconciling again.
         """
-        graph, total_cost, n_recon, roots = recongraph_tools.DP(self, dup_cost, trans_cost, loss_cost)
-        recongraph = ReconGraphWrapper(graph, roots, n_recon, self, dup_cost, trans_cost, loss_cost, total_cost)
+        backend = mpr_counting.get_backend(counting)
+        # Tables are not cached, so a result that has to keep them is always computed
+        cache = None if keep_tables else result_cache.active_cache()
+        if cache is not None:
+            key = cache.key("reconcile", self, dup_cost, trans_cost, loss_cost, counting)
+            cached = cache.get(key)
+            if cached is not None:
+                graph, total_cost, n_recon, roots, event_frequencies, node_frequencies = cached
+                return ReconGraphWrapper(graph, roots, n_recon, self, dup_cost, trans_cost, loss_cost, total_cost,
+                                         event_frequencies, node_frequencies, counting=counting)
+        tables = array_dp.DPTables(self, dup_cost, trans_cost, loss_cost)
+        tables.fill(keep_tables=keep_tables)
+        graph, total_cost, n_recon, roots, postorder_graph = array_dp.reconcile_tables(tables, backend, compact=True)
+        recongraph = ReconGraphWrapper(graph, roots, backend.n_recon(n_recon), self, dup_cost, trans_cost, loss_cost,
+                                       total_cost, counting=counting)
+        # The DP already knows the postorder of the mapping nodes
+        recongraph._session["postorder_graph"] = postorder_graph
+        if keep_tables:
+            recongraph._dp_tables = tables
         recongraph.set_event_frequencies()
+        if cache is not None:
+            cache.put(key, (graph, total_cost, recongraph.n_recon, roots, recongraph.event_frequencies,
+                            recongraph.node_frequencies))
         return recongraph
+
+    def reconcile_best_rootings(self, dup_cost: float, trans_cost: float,
+                                loss_cost: float) -> List[Tuple['ReconInputWrapper', ReconGraphWrapper]]:
+        """
+        Treat the parasite tree of self as unrooted and reconcile it under its cheapest rootings. The costs of all
+        rootings are found in two passes over the trees rather than one reconciliation per rooting.
+        Returns one (rerooted input, reconciliation graph) pair for every rooting of lowest cost.
+        """
+        rootings = []
+        for rerooted, (graph, total_cost, n_recon, roots) in rerooting.best_rootings(self, dup_cost, trans_cost,
+                                                                                    loss_cost):
+            recon_input = ReconInputWrapper(rerooted.host_dict, rerooted.host_distances, rerooted.parasite_dict,
+                                            None, rerooted.tip_mapping)
+            recongraph = ReconGraphWrapper(graph, roots, n_recon, recon_input, dup_cost, trans_cost, loss_cost,
+                                           total_cost)
+            recongraph.set_event_frequencies()
+            rootings.append((recon_input, recongraph))
+        return rootings
+
+    def reconcile_batch(self, cost_triples: List[Tuple[float, float, float]]) -> List[ReconGraphWrapper]:
+        """
+        Reconcile self under every (dup_cost, trans_cost, loss_cost) triple in cost_triples.
+        The DP runs once for all triples, so this is much faster than calling reconcile for each triple.
+        Returns one reconciliation graph per triple, in the same order.
+        """
+        recongraphs = []
+        results = array_dp.DP_batch(self, cost_triples)
+        for (dup_cost, trans_cost, loss_cost), (graph, total_cost, n_recon, roots) in zip(cost_triples, results):
+            recongraph = ReconGraphWrapper(graph, roots, n_recon, self, dup_cost, trans_cost, loss_cost, total_cost)
+            recongraph.set_event_frequencies()
+            recongraphs.append(recongraph)
+        return recongraphs
@@ -0,0 +1,286 @@
+# binary_io.py
+# Versioned binary files of reconciliation graphs, tree indices and histograms
+
+# A file is a short fixed header, a JSON table of contents, and the raw bytes of NumPy arrays, each starting at a
+# multiple of ALIGNMENT bytes:
+#
+#   MAGIC | format version (uint32) | table of contents length (uint32) | table of contents | padding | arrays
+#
+# The table of contents records the kind of object stored ("recon-graph", "tree-index", "histogram" or
+# "recon-result"), small metadata such as costs, and the dtype, shape and offset of every array. Arrays are read
+# with a single read-only memory map of the file, so loading does not copy them: opening a multi-GB graph only
+# reads its table of contents, pages are loaded when they are touched, and worker processes that map the same file
+# share those pages. Sequences of names are stored as UTF-8 bytes plus an offset array and decoded on load, as
+# are integers too large for int64 (exact MPR counts), which are written in decimal.
+#
+# Files are written to a temporary file and renamed into place, like the entries of result_cache.py. A reader
+# refuses files written with a newer FORMAT_VERSION.
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from empress.histogram.Histogram import Histogram
+from empress.recon_graph import CompactReconGraph
+from empress.tree_index import TreeIndex
+
+# Bump whenever the layout of a kind of file changes
+FORMAT_VERSION = 1
+
+MAGIC = b"EMPRESS-BIN\x00"
+ALIGNMENT = 64
+
+# Encodings of the table of contents
+_RAW = "raw"
+_STRINGS = "strings"
+_INTEGERS = "integers"
+
+_GRAPH_ARRAYS = ("node_parasites", "node_hosts", "event_offsets", "event_types", "event_children1",
+                 "event_children2")
+_GRAPH_OPTIONAL_ARRAYS = ("event_frequencies", "node_frequencies", "node_counts")
+
+
+def _encode_strings(strings) -> tuple:
+    """
+    :return: (offsets, bytes) arrays, string i being the UTF-8 bytes offsets[i]:offsets[i + 1]
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _decode_strings(offsets: np.ndarray, data: np.ndarray) -> list:
+    data = data.tobytes()
+    offsets = offsets.tolist()
+    return [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+
+def _is_large_integer_array(array: np.ndarray) -> bool:
+    # np.asarray turns Python ints beyond int64 into an object array
+    return array.dtype == object
+
+
+def write_arrays(path: str, kind: str, arrays: dict, metadata: dict = None):
+    """
+    :param path <str> - file to write
+    :param kind <str> - kind of object stored, checked by read_arrays
+    :param arrays <dict> - arrays by name. A list of strings is stored as strings, an object array of Python ints
+        as integers, anything else with np.asarray
+    :param metadata <dict> - JSON-serializable values stored in the table of contents
+    """
+    entries = {}
+    chunks = []
+    offset = 0
+
+    def add(name, array, encoding=_RAW):
+        nonlocal offset
+        array = np.ascontiguousarray(array)
+        offset += -offset % ALIGNMENT
+        entries[name] = {"encoding": encoding, "dtype": array.dtype.str, "shape": list(array.shape),
+                         "offset": offset}
+        chunks.append((offset, array))
+        offset += array.nbytes
+
+    for name, values in arrays.items():
+        if isinstance(values, (list, tuple)) and all(isinstance(value, str) for value in values):
+            string_offsets, data = _encode_strings(values)
+            add(name, string_offsets, _STRINGS)
+            add(name + ".data", data)
+            continue
+        array = np.asarray(values)
+        if _is_large_integer_array(array):
+            string_offsets, data = _encode_strings([str(int(value)) for value in array.tolist()])
+            add(name, string_offsets, _INTEGERS)
+            add(name + ".data", data)
+        else:
+            add(name, array)
+
+    contents = json.dumps({"kind": kind, "metadata": metadata or {}, "arrays": entries}).encode("utf-8")
+    header = MAGIC + FORMAT_VERSION.to_bytes(4, "little") + len(contents).to_bytes(4, "little") + contents
+    data_start = len(header) + (-len(header) % ALIGNMENT)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as output_file:
+            output_file.write(header.ljust(data_start, b"\x00"))
+            position = 0
+            for array_offset, array in chunks:
+                output_file.write(b"\x00" * (array_offset - position))
+                output_file.write(array.tobytes())
+                position = array_offset + array.nbytes
+        os.replace(temp_name, path)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+
+
+def read_arrays(path: str, kind: str = None, mmap: bool = True) -> tuple:
+    """
+    :param path <str> - file written by write_arrays
+    :param kind <str> - if given, the kind the file must hold
+    :param mmap <bool> - map the arrays into memory instead of reading them. Mapped arrays are read-only.
+    :return: (kind, arrays, metadata). Strings and integers are decoded into lists, other arrays are NumPy arrays.
+    """
+    with open(path, "rb") as input_file:
+        prefix = input_file.read(len(MAGIC) + 8)
+        if len(prefix) < len(MAGIC) + 8 or not prefix.startswith(MAGIC):
+            raise ValueError("%s is not an empress binary file" % path)
+        version = int.from_bytes(prefix[len(MAGIC):len(MAGIC) + 4], "little")
+        if version > FORMAT_VERSION:
+            raise ValueError("%s was written by format version %d, this version reads up to %d" %
+                             (path, version, FORMAT_VERSION))
+        contents_length = int.from_bytes(prefix[len(MAGIC) + 4:], "little")
+        contents = json.loads(input_file.read(contents_length).decode("utf-8"))
+        header_length = len(prefix) + contents_length
+        data_start = header_length + (-header_length % ALIGNMENT)
+        if not mmap:
+            input_file.seek(data_start)
+            buffer = np.frombuffer(input_file.read(), dtype=np.uint8)
+
+    if kind is not None and contents["kind"] != kind:
+        raise ValueError("%s holds a %s, not a %s" % (path, contents["kind"], kind))
+    if mmap:
+        if os.path.getsize(path) > data_start:
+            buffer = np.memmap(path, dtype=np.uint8, mode="r", offset=data_start)
+        else:
+            buffer = np.zeros(0, dtype=np.uint8)
+
+    def view(entry):
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=entry["offset"])
+        return array.reshape(entry["shape"])
+
+    entries = contents["arrays"]
+    arrays = {}
+    for name, entry in entries.items():
+        if name.endswith(".data") and name[:-len(".data")] in entries:
+            continue
+        if entry["encoding"] == _RAW:
+            arrays[name] = view(entry)
+        else:
+            strings = _decode_strings(view(entry), view(entries[name + ".data"]))
+            arrays[name] = strings if entry["encoding"] == _STRINGS else [int(value) for value in strings]
+    return contents["kind"], arrays, contents["metadata"]
+
+
+def _graph_arrays(graph: CompactReconGraph, prefix: str = "") -> dict:
+    arrays = {prefix + "parasite_names": list(graph.parasite_names), prefix + "host_names": list(graph.host_names)}
+    for name in _GRAPH_ARRAYS + _GRAPH_OPTIONAL_ARRAYS:
+        array = getattr(graph, name)
+        if array is not None:
+            arrays[prefix + name] = array
+    return arrays
+
+
+def _graph_from_arrays(arrays: dict, metadata: dict, prefix: str = "") -> CompactReconGraph:
+    optional = {name: arrays.get(prefix + name) for name in _GRAPH_OPTIONAL_ARRAYS}
+    return CompactReconGraph(arrays[prefix + "parasite_names"], arrays[prefix + "host_names"],
+                             *[arrays[prefix + name] for name in _GRAPH_ARRAYS],
+                             n_keys=metadata["n_keys"], **optional)
+
+
+def save_recon_graph(path: str, graph):
+    """
+    :param path <str> - file to write
+    :param graph - a CompactReconGraph, or a reconciliation graph dict
+    """
+    if not isinstance(graph, CompactReconGraph):
+        graph = CompactReconGraph.from_dict(graph)
+    write_arrays(path, "recon-graph", _graph_arrays(graph), {"n_keys": graph.n_keys})
+
+
+def load_recon_graph(path: str, mmap: bool = True) -> CompactReconGraph:
+    _, arrays, metadata = read_arrays(path, "recon-graph", mmap)
+    return _graph_from_arrays(arrays, metadata)
+
+
+def _tree_arrays(index: TreeIndex, prefix: str = "") -> dict:
+    return {prefix + "names": list(index.names), prefix + "left": index.left_array,
+            prefix + "right": index.right_array}
+
+
+def _tree_from_arrays(arrays: dict, root_edge_name: str, prefix: str = "") -> TreeIndex:
+    names = arrays[prefix + "names"]
+    vertex_tree = {}
+    for name, left, right in zip(names, arrays[prefix + "left"].tolist(), arrays[prefix + "right"].tolist()):
+        vertex_tree[name] = (None, None) if left == -1 else (names[left], names[right])
+    return TreeIndex.from_vertex_tree(vertex_tree, names[-1], root_edge_name)
+
+
+def save_tree_index(path: str, index: TreeIndex):
+    write_arrays(path, "tree-index", _tree_arrays(index), {"root_edge_name": index.root_edge_name})
+
+
+def load_tree_index(path: str) -> TreeIndex:
+    """
+    Trees are small next to their graphs, so the index is rebuilt in memory rather than mapped
+    """
+    _, arrays, metadata = read_arrays(path, "tree-index", mmap=False)
+    return _tree_from_arrays(arrays, metadata["root_edge_name"])
+
+
+def save_histogram(path: str, histogram):
+    """
+    :param path <str> - file to write
+    :param histogram - a Histogram or its histogram_dict, from distances to numbers of pairs
+    """
+    histogram_dict = histogram.histogram_dict if isinstance(histogram, Histogram) else histogram
+    write_arrays(path, "histogram", {"distances": np.array(list(histogram_dict.keys()), dtype=np.int64),
+                                     "counts": np.asarray(list(histogram_dict.values()))})
+
+
+def load_histogram(path: str) -> Histogram:
+    _, arrays, _ = read_arrays(path, "histogram", mmap=False)
+    counts = arrays["counts"]
+    counts = counts if isinstance(counts, list) else counts.tolist()
+    return Histogram(dict(zip(arrays["distances"].tolist(), counts)))
+
+
+def save_recon_result(path: str, graph: CompactReconGraph, roots: list, host_index: TreeIndex,
+                      parasite_index: TreeIndex, tip_mapping: dict, host_distances: dict = None,
+                      parasite_distances: dict = None, metadata: dict = None):
+    """
+    Write a reconciliation graph together with everything needed to analyze it again: its roots, the trees, the
+    tip mapping and metadata such as the costs (see ReconGraphWrapper.save)
+    """
+    arrays = _graph_arrays(graph, "graph.")
+    arrays.update(_tree_arrays(host_index, "host."))
+    arrays.update(_tree_arrays(parasite_index, "parasite."))
+    arrays["roots"] = np.array([graph.node_id(root) for root in roots], dtype=np.int32)
+    arrays["tip_mapping.parasites"] = list(tip_mapping.keys())
+    arrays["tip_mapping.hosts"] = list(tip_mapping.values())
+    for name, index, distances in (("host", host_index, host_distances),
+                                   ("parasite", parasite_index, parasite_distances)):
+        if distances is not None:
+            arrays[name + ".distances"] = np.array([distances.get(node, np.nan) for node in index.names],
+                                                   dtype=np.float64)
+    metadata = dict(metadata or {})
+    metadata.update(n_keys=graph.n_keys, host_root_edge_name=host_index.root_edge_name,
+                    parasite_root_edge_name=parasite_index.root_edge_name)
+    write_arrays(path, "recon-result", arrays, metadata)
+
+
+def load_recon_result(path: str, mmap: bool = True) -> dict:
+    """
+    :return: a dict with the graph (CompactReconGraph), roots, host_index, parasite_index, tip_mapping,
+    host_distances, parasite_distances (None if they were not saved) and metadata written by save_recon_result
+    """
+    _, arrays, metadata = read_arrays(path, "recon-result", mmap)
+    graph = _graph_from_arrays(arrays, metadata, "graph.")
+    host_index = _tree_from_arrays(arrays, metadata["host_root_edge_name"], "host.")
+    parasite_index = _tree_from_arrays(arrays, metadata["parasite_root_edge_name"], "parasite.")
+    result = {"graph": graph, "roots": [graph.node_name(root) for root in arrays["roots"].tolist()],
+              "host_index": host_index, "parasite_index": parasite_index,
+              "tip_mapping": dict(zip(arrays["tip_mapping.parasites"], arrays["tip_mapping.hosts"])),
+              "metadata": metadata}
+    for name, index in (("host", host_index), ("parasite", parasite_index)):
+        distances = arrays.get(name + ".distances")
+        result[name + "_distances"] = None if distances is None else \
+            {node: distance for node, distance in zip(index.names, distances.tolist()) if distance == distance}
+    return result
@@ -5,7 +5,8 @@ from collections import deque
 import numpy as np
 
 from empress.histogram import histogram_alg
-from empress.reconcile import recongraph_tools, diameter, median
+from empress.reconcile import recongraph_tools, median
+from empress.tree_index import TreeIndex
 
 
 def graph_union(g1, g2):
@@ -535,8 +536,10 @@ def mk_pdv_score(species_tree, gene_tree, gene_root):
     :param gene_root <node>
     :return score <function recon_graph->float>
     """
+    species_index = TreeIndex.from_vertex_tree(species_tree, next(reversed(species_tree)))
     def score(g):
-        hist = histogram_alg.diameter_algorithm(species_tree, gene_tree, gene_root, g, g, False, False)
+        hist = histogram_alg.diameter_algorithm(species_tree, gene_tree, gene_root, g, g, False, False,
+                                                species_index=species_index)
         return hist.mean()
     return score
 
@@ -586,8 +589,10 @@ def mk_get_pdv_hist(species_tree, gene_tree, gene_root):
     :param gene_root <node>
     :return get_hist <function recon_graph->dict int->int>
     """
+    species_index = TreeIndex.from_vertex_tree(species_tree, next(reversed(species_tree)))
     def get_hist(g):
-        h = histogram_alg.diameter_algorithm(species_tree, gene_tree, gene_root, g, g, False, False)
+        h = histogram_alg.diameter_algorithm(species_tree, gene_tree, gene_root, g, g, False, False,
+                                             species_index=species_index)
         return h.histogram_dict
     return get_hist
 
@@ -678,8 +683,7 @@ def get_tree_info(newick, d,t,l):
     edge_species_tree, edge_gene_tree, dtl_recon_graph, mpr_count, best_roots \
         = recongraph_tools.reconcile(newick, d, t, l)
     # Reformat the host and parasite tree to use it with the histogram algorithm
-    gene_tree, gene_root, gene_node_count = diameter.reformat_tree(edge_gene_tree, "pTop")
-    species_tree, species_tree_root, species_node_count \
-        = diameter.reformat_tree(edge_species_tree, "hTop")
+    gene_tree, gene_root, gene_node_count = newick.parasite_index.vertex_tree()
+    species_tree, species_tree_root, species_node_count = newick.host_index.vertex_tree()
     return gene_tree, species_tree, gene_root, dtl_recon_graph, mpr_count, best_roots
 
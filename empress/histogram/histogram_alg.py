@@ -3,6 +3,7 @@
 from itertools import product
 
 from empress.histogram.Histogram import Histogram
+from empress.tree_index import TreeIndex
 from empress.histogram.histogram_brute_force import BFVerifier
 
 # def reformat_tree(tree, root):
@@ -379,17 +380,21 @@ def make_group_dict(gene_tree, dtl_recon_graph, postorder_species_nodes):
     :return <dict>                          - a dict keyed by gene node, where the values are the lists of mapping nodes for that
                                               gene node
     """
-    postorder_group = {}
-    for u in gene_tree:
-        # First we make the dictionary only contain nodes that have this gene node
-        postorder_group[u] = [mapping for mapping in dtl_recon_graph if mapping[0] == u]
-        # Then we sort the dictionary into postorder, using the species node's index in the postorder species list as a
-        # guide.
-        postorder_group[u] = sorted(postorder_group[u], key=lambda mapping: postorder_species_nodes.index(mapping[1]))
+    # First we make the dictionary only contain nodes that have this gene node, in one pass over the graph
+    postorder_group = {u: [] for u in gene_tree}
+    for mapping in dtl_recon_graph:
+        if mapping[0] in postorder_group:
+            postorder_group[mapping[0]].append(mapping)
+    # Then we sort the dictionary into postorder, using the species node's index in the postorder species list as a
+    # guide.
+    species_positions = {species: position for position, species in enumerate(postorder_species_nodes)}
+    for u in postorder_group:
+        postorder_group[u].sort(key=lambda mapping: species_positions[mapping[1]])
     return postorder_group
 
 
-def diameter_algorithm(species_tree, gene_tree, gene_tree_root, dtl_recon_graph_a, dtl_recon_graph_b, debug, zero_loss, verify=False):
+def diameter_algorithm(species_tree, gene_tree, gene_tree_root, dtl_recon_graph_a, dtl_recon_graph_b, debug, zero_loss,
+                       verify=False, species_index=None):
     """
     This function finds the diameter of a reconciliation graph, as measured by the largest symmetric set difference
      of any two reconciliation trees inside of a reconciliation graph. While you can get standard diameter behaviour
@@ -404,6 +409,8 @@ def diameter_algorithm(species_tree, gene_tree, gene_tree_root, dtl_recon_graph_
     :param debug <bool>               - whether or not to print out pretty tables
     :param zero_loss <bool>           - whether losses should count at all
     :param verify <bool>              - whether to verify the calculations using brute force
+    :param species_index <TreeIndex>  - index of the species tree, built from species_tree if not given. Pass it
+                                        when calling this repeatedly on the same trees.
     :return <Histogram>               - the diameter of the reconciliation
     """
 
@@ -417,10 +424,13 @@ def diameter_algorithm(species_tree, gene_tree, gene_tree_root, dtl_recon_graph_
     postorder_group_a = make_group_dict(gene_tree, dtl_recon_graph_a, postorder_species_nodes)
     postorder_group_b = make_group_dict(gene_tree, dtl_recon_graph_b, postorder_species_nodes)
 
-    ancestral_table = calculate_ancestral_table(species_tree)
+    # Ancestry of two species nodes is read off their postorder ids, instead of a table over all pairs of names
+    if species_index is None:
+        species_index = TreeIndex.from_vertex_tree(species_tree, postorder_species_nodes[-1])
+    species_ids = species_index.ids
 
     if debug:
-        print_table_nicely(ancestral_table, ", ", "Ancestral", "literal")
+        print_table_nicely(calculate_ancestral_table(species_tree), ", ", "Ancestral", "literal")
 
     exit_table_a = {}
     exit_table_b = {}
@@ -440,8 +450,8 @@ def diameter_algorithm(species_tree, gene_tree, gene_tree_root, dtl_recon_graph_
                 hist_both_exit = calculate_hist_both_exit(zero_loss, enter_table, u, gene_tree, uA, dtl_recon_graph_a,
                                                             uB, dtl_recon_graph_b)
 
-                # Look up ancestry string in the precomputed table (indexed by the species nodes of the mapping nodes)
-                ancestry = ancestral_table[uA[1]][uB[1]] 
+                # Look up how the species nodes of the mapping nodes are related
+                ancestry = species_index.ancestry(species_ids[uA[1]], species_ids[uB[1]])
 
                 uA_loss_events = [event for event in dtl_recon_graph_a[uA] if isinstance(event, tuple) and event[0] == 'L']
                 uB_loss_events = [event for event in dtl_recon_graph_b[uB] if isinstance(event, tuple) and event[0] == 'L']
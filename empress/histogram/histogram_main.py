@@ -3,7 +3,8 @@ import math
 from pathlib import Path
 
 from empress.histogram import histogram_alg, histogram_display
-from empress.reconcile import recongraph_tools, diameter
+from empress.reconcile import recongraph_tools
+from empress import result_cache
 
 def calc_histogram(tree_data, d, t, l, time_it, normalize=False, zero_loss=False):
     """
@@ -27,16 +28,15 @@ def calc_histogram(tree_data, d, t, l, time_it, normalize=False, zero_loss=False
     #print(mpr_count)
 
     # Reformat the host and parasite tree to use it with the histogram algorithm
-    gene_tree, gene_tree_root, gene_node_count = diameter.reformat_tree(edge_gene_tree, "pTop")
-    species_tree, species_tree_root, species_node_count \
-        = diameter.reformat_tree(edge_species_tree, "hTop")
+    gene_tree, gene_tree_root, gene_node_count = tree_data.parasite_index.vertex_tree()
+    species_tree, species_tree_root, species_node_count = tree_data.host_index.vertex_tree()
 
     if time_it:
         start = time.time()
     # Calculate the histogram via histogram algorithm
     diameter_alg_hist = histogram_alg.diameter_algorithm(
         species_tree, gene_tree, gene_tree_root, dtl_recon_graph, dtl_recon_graph,
-        False, zero_loss)
+        False, zero_loss, species_index=tree_data.host_index)
     if time_it:
         end = time.time()
         elapsed = end - start
@@ -107,8 +107,15 @@ def compute_pdv(filename, tree_data, d, t, l, args):
     #     # converts args to dictionary first
     #     args = vars(args)
     #     args = HistogramMainInput.getInput(Path(filename), d, t, l, args)
-    hist, elapsed = calc_histogram(tree_data, d, t, l, args.time)
-    hist = hist.histogram_dict
+    # Timings are only meaningful if the histogram is actually computed, so --time bypasses the cache
+    cache = None if args.time else result_cache.active_cache()
+    if cache is None:
+        hist, elapsed = calc_histogram(tree_data, d, t, l, args.time)
+        hist = hist.histogram_dict
+    else:
+        elapsed = None
+        hist = cache.get_or_compute(cache.key("histogram-pdv", tree_data, d, t, l),
+                                    lambda: calc_histogram(tree_data, d, t, l, False)[0].histogram_dict)
     if args.time:
         print("Time spent: {} Seconds".format(elapsed))
     # Calculate the statistics (with zeros)
@@ -6,6 +6,8 @@ from Bio import Phylo
 
 from pathlib import Path
 
+from empress.tree_index import TreeIndex
+
 class ReconInputError(Exception):
     pass
 
@@ -24,6 +26,27 @@ class _ReconInput:
         self.parasite_dict = parasite_dict
         self.parasite_distances = parasite_distances
         self.tip_mapping = tip_mapping
+        # Lazily built TreeIndex of each tree, together with the tree dict it was built from
+        self._host_index = None
+        self._parasite_index = None
+
+    @property
+    def host_index(self) -> TreeIndex:
+        """
+        Integer index of self.host_dict, built on first use and shared by every algorithm run on self
+        """
+        if self._host_index is None or self._host_index[0] is not self.host_dict:
+            self._host_index = (self.host_dict, TreeIndex(self.host_dict, "hTop"))
+        return self._host_index[1]
+
+    @property
+    def parasite_index(self) -> TreeIndex:
+        """
+        Integer index of self.parasite_dict, built on first use and shared by every algorithm run on self
+        """
+        if self._parasite_index is None or self._parasite_index[0] is not self.parasite_dict:
+            self._parasite_index = (self.parasite_dict, TreeIndex(self.parasite_dict, "pTop"))
+        return self._parasite_index[1]
 
     @classmethod
     def from_files(cls, host_fname: str, parasite_fname: str, mapping_fname: str):
@@ -41,6 +64,7 @@ class _ReconInput:
         Takes a host filename as input and sets self.host_dict and self.host_distances
         :param file_name <str>    - filename of host file to parse
         """
+        self._host_index = None
         try:
             self.host_dict, self.host_distances = _ReconInput._read_newick_tree(file_name, "host")
         except Exception as e:
@@ -51,6 +75,7 @@ class _ReconInput:
         Takes a parasite filename as input and sets self.parasite_dict and self_host_distances
         :param file_name <str>   - filename of parasite file to parse
         """
+        self._parasite_index = None
         try:
             self.parasite_dict, self.parasite_distances = _ReconInput._read_newick_tree(file_name, "parasite")
         except Exception as e:
@@ -96,15 +121,21 @@ class _ReconInput:
 
     @staticmethod
     def _tree_dict_to_str(tree_dict, root):
-        parent, child, left_edge, right_edge = tree_dict[root]
-        if left_edge is None: # tip
-            return child
-        else:
-            return "({},{}){}".format(
-                _ReconInput._tree_dict_to_str(tree_dict, left_edge),
-                _ReconInput._tree_dict_to_str(tree_dict, right_edge),
-                child
-            )
+        # The stack holds edges still to be written and text to write once the subtree before it is done
+        pieces = []
+        stack = [(root, None)]
+        while stack:
+            edge, text = stack.pop()
+            if edge is None:
+                pieces.append(text)
+                continue
+            parent, child, left_edge, right_edge = tree_dict[edge]
+            if left_edge is None: # tip
+                pieces.append(child)
+            else:
+                pieces.append("(")
+                stack.extend([(None, "){}".format(child)), (right_edge, None), (None, ","), (left_edge, None)])
+        return "".join(pieces)
 
     @staticmethod
     def _save_tip_mapping_to_file(tip_mapping: dict, fname: str):
@@ -137,28 +168,47 @@ class _ReconInput:
         """
 
         tree = Phylo.read(StringIO(newick_string), "newick")
-        _ReconInput._name_unnamed_nodes(tree, tree_type)
-        distance_dict = tree.depths(unit_branch_lengths=True)
+        # The traversals of Bio.Phylo are recursive, so the clades are listed here with an explicit stack instead
+        clades, depths = _ReconInput._preorder_clades(tree)
+        _ReconInput._name_unnamed_nodes(tree, tree_type, clades)
         # Get the actual distance annotations (zero for unannotated trees)
         D = {}
-        for clade in distance_dict:
+        for clade, depth in zip(clades, depths):
             name = clade.name
-            dist = distance_dict[clade]
+            dist = depth
             D[name] = dist
-        dfs_list = [(node.name, float(D[node.name])) for node in tree.find_clades()]
+        dfs_list = [(node.name, float(D[node.name])) for node in clades]
         tree_dict = {}
         _ReconInput._build_tree_dictionary(_ReconInput._build_tree(dfs_list), "Top", tree_dict, tree_type)
-        real_distances = tree.depths()
         real_distance_dict = {}
-        for clade in real_distances:
+        for clade in clades:
             name = clade.name
             real_distance_dict[name] = dist
         return tree_dict, real_distance_dict
     
     @staticmethod
-    def _name_unnamed_nodes(tree: Phylo.Newick.Tree, tree_type: str):
+    def _preorder_clades(tree: Phylo.Newick.Tree):
+        """
+        :param tree <Phylo.Newick.Tree> - parsed newick tree
+        :return clades <list>        - the clades of tree in preorder, like tree.find_clades()
+        :return depths <list>        - the depth of each clade in number of branches, starting from the branch
+                                       length of the root (or zero), like tree.depths(unit_branch_lengths=True)
+        """
+        clades = []
+        depths = []
+        stack = [(tree.root, tree.root.branch_length or 0)]
+        while stack:
+            clade, depth = stack.pop()
+            clades.append(clade)
+            depths.append(depth)
+            for child in reversed(clade.clades):
+                stack.append((child, depth + 1))
+        return clades, depths
+
+    @staticmethod
+    def _name_unnamed_nodes(tree: Phylo.Newick.Tree, tree_type: str, clades: list = None):
         count = 0
-        for clade in tree.find_clades():
+        for clade in (tree.find_clades() if clades is None else clades):
             if clade.name is None:
                 if tree_type == "host":
                     new_name = "_h{}".format(count)
@@ -175,25 +225,33 @@ class _ReconInput:
         or None. This is an intermediate tree representation that can then
         be used to build the dictionary representation of trees used in
         the xscape tools.
-        :param dfs_list <list>   - list of tuples of the form (node_name, distance_from_root)
+        :param dfs_list <list>   - list of tuples of the form (node_name, distance_from_root), in preorder
         :return <tuple>          - tuple representation of the tree
         """
 
-        if len(dfs_list) == 1:
-            return dfs_list[0][0], None, None
-        else:
-            root_name = dfs_list[0][0]
-            dist = dfs_list[0][1]
-            split_point = 0
-            for x in range(len(dfs_list)-1, 0, -1):
-                if dfs_list[x][1] == dist+1:
-                    split_point = x
-                    break
-            left_list = dfs_list[1:split_point]
-            right_list = dfs_list[split_point:]
-            left_tree = _ReconInput._build_tree(left_list)
-            right_tree = _ReconInput._build_tree(right_list)
-            return root_name, left_tree, right_tree
+        # The parent of each node is the closest node before it in preorder that is one level higher
+        children = [[] for _ in dfs_list]
+        ancestors = [0]
+        for index in range(1, len(dfs_list)):
+            while dfs_list[ancestors[-1]][1] >= dfs_list[index][1]:
+                ancestors.pop()
+            children[ancestors[-1]].append(index)
+            ancestors.append(index)
+
+        # Build the tuples from the tips up, in reverse preorder
+        subtrees = [None] * len(dfs_list)
+        for index in range(len(dfs_list) - 1, -1, -1):
+            node_name = dfs_list[index][0]
+            if not children[index]:
+                subtrees[index] = (node_name, None, None)
+            elif len(children[index]) == 2:
+                left_index, right_index = children[index]
+                subtrees[index] = (node_name, subtrees[left_index], subtrees[right_index])
+                subtrees[left_index] = subtrees[right_index] = None
+            else:
+                raise ReconInputError("node %s has %d children, but trees must be binary"
+                                      % (node_name, len(children[index])))
+        return subtrees[0]
 
     @staticmethod
     def _build_tree_dictionary(tuple_tree, parent_vertex, tree_dict, tree_type):
@@ -208,29 +266,33 @@ class _ReconInput:
         :return <None>               - D is updated so that it may represent the tree
         """
 
-        root = tuple_tree[0]
-        left_tree = tuple_tree[1]
-        right_tree = tuple_tree[2]
-        if tree_type == "parasite" and parent_vertex == "Top":
-            edge_name = "pTop"
-        elif tree_type == "host" and parent_vertex == "Top":
-            edge_name = "hTop"
-        else:
-            edge_name = (parent_vertex, root)
-
-        if left_tree is None:  # and thus rightTree == None and this is a leaf
-            tree_dict[edge_name] = edge_name + (None, None)
-        else:
-            left_edge_name = (root, left_tree[0])
-            right_edge_name = (root, right_tree[0])
-            if edge_name == "pTop":
-                tree_dict[edge_name] = ("Top", root, left_edge_name, right_edge_name)
-            elif edge_name == "hTop":
-                tree_dict[edge_name] = ("Top", root, left_edge_name, right_edge_name)
+        # Subtrees still to be added with the vertex above them; the edges are added in preorder
+        stack = [(tuple_tree, parent_vertex)]
+        while stack:
+            tuple_tree, parent_vertex = stack.pop()
+            root = tuple_tree[0]
+            left_tree = tuple_tree[1]
+            right_tree = tuple_tree[2]
+            if tree_type == "parasite" and parent_vertex == "Top":
+                edge_name = "pTop"
+            elif tree_type == "host" and parent_vertex == "Top":
+                edge_name = "hTop"
+            else:
+                edge_name = (parent_vertex, root)
+
+            if left_tree is None:  # and thus rightTree == None and this is a leaf
+                tree_dict[edge_name] = edge_name + (None, None)
             else:
-                tree_dict[edge_name] = edge_name + (left_edge_name, right_edge_name)
-            _ReconInput._build_tree_dictionary(left_tree, root, tree_dict, tree_type)
-            _ReconInput._build_tree_dictionary(right_tree, root, tree_dict, tree_type)
+                left_edge_name = (root, left_tree[0])
+                right_edge_name = (root, right_tree[0])
+                if edge_name == "pTop":
+                    tree_dict[edge_name] = ("Top", root, left_edge_name, right_edge_name)
+                elif edge_name == "hTop":
+                    tree_dict[edge_name] = ("Top", root, left_edge_name, right_edge_name)
+                else:
+                    tree_dict[edge_name] = edge_name + (left_edge_name, right_edge_name)
+                stack.append((right_tree, root))
+                stack.append((left_tree, root))
 
     @staticmethod
     def _parse_tip_mapping(pairs):
@@ -260,8 +322,8 @@ class _ReconInput:
         """
         Throws exception if tip_mapping_dict is not valid
         """
-        host_leaves = _ReconInput._leaves_from_tree_dict(host_dict)
-        parasite_leaves = _ReconInput._leaves_from_tree_dict(parasite_dict)
+        host_leaves = set(_ReconInput._leaves_from_tree_dict(host_dict))
+        parasite_leaves = set(_ReconInput._leaves_from_tree_dict(parasite_dict))
         for parasite in tip_mapping_dict:
             host = tip_mapping_dict[parasite]
             if host not in host_leaves:
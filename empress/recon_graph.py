@@ -0,0 +1,339 @@
+# recon_graph.py
+# Compact array-based container for reconciliation graphs
+
+# A reconciliation graph (see the top of recongraph_tools.py) is a dict from (parasite, host) mapping nodes to lists
+# of (event type, child mapping node, child mapping node) tuples, and its frequencies are more dicts keyed by the
+# same tuples. Every event then costs a list slot, a 3-tuple, two 2-tuples and their hashes, several hundred bytes
+# in all. A CompactReconGraph stores the same graph in CSR layout:
+#
+#   - mapping node i is (parasite_names[node_parasites[i]], host_names[node_hosts[i]])
+#   - its events are the range event_offsets[i]:event_offsets[i + 1] of the event arrays
+#   - event e has type EVENT_TYPES[event_types[e]] and children event_children1[e] and event_children2[e], which are
+#     mapping node indices, or NO_NODE for the (None, None) placeholder
+#
+# so an event takes 9 bytes, plus 8 for each frequency or count array aligned with it. The nodes keep the insertion
+# order of the dict they were built from, and the events of a node keep their order too, so to_dict gives back an
+# equal dict with the same iteration order. A child that is not itself a key of the dict (a median or cluster
+# subgraph can reference one) is stored after the n_keys key nodes and is not a key of the dict-like view.
+#
+# CompactReconGraph is also a read-only Mapping with the interface of the dict it replaces: indexing with a
+# mapping node returns its list of event tuples, and iteration yields the mapping nodes in order. Code written for
+# dict graphs (median, histogram_alg, cluster_util, export_csv) runs on it unchanged and can move to the arrays one
+# function at a time. The view builds its tuples on demand, so code that only reads the arrays never pays for them.
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from empress.tree_index import TreeIndex
+
+# Event type of code i is EVENT_TYPES[i]
+EVENT_TYPES = ("S", "D", "T", "L", "C")
+EVENT_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+
+# Child index of the (None, None) placeholder
+NO_NODE = -1
+
+PLACEHOLDER = (None, None)
+
+
+def _names_and_ids(names, index: TreeIndex):
+    """
+    :return: the name table of a tree and the dict from names to positions in it, from index if there is one
+    """
+    if index is not None:
+        return list(index.names), dict(index.ids)
+    return list(names), {name: i for i, name in enumerate(names)}
+
+
+def _aligned(values, length: int, name: str):
+    if values is None:
+        return None
+    array = np.asarray(values)
+    if array.shape != (length,):
+        raise ValueError("%s has %d values instead of %d" % (name, array.size, length))
+    array.flags.writeable = False
+    return array
+
+
+class CompactReconGraph(Mapping):
+    """
+    Reconciliation graph with mapping nodes and events in integer-indexed arrays, and a read-only dict view
+    """
+
+    def __init__(self, parasite_names, host_names, node_parasites, node_hosts, event_offsets, event_types,
+                 event_children1, event_children2, n_keys: int = None, event_frequencies=None,
+                 node_frequencies=None, node_counts=None):
+        """
+        :param parasite_names <sequence> - name table of the parasite nodes
+        :param host_names <sequence> - name table of the host nodes
+        :param node_parasites, node_hosts <array> - for each mapping node, the positions of its names in the tables
+        :param event_offsets <array> - the events of mapping node i are event_offsets[i]:event_offsets[i + 1]
+        :param event_types <array> - for each event, the index of its type in EVENT_TYPES
+        :param event_children1, event_children2 <array> - for each event, the mapping node indices of its
+            children, NO_NODE for (None, None)
+        :param n_keys <int> - the first n_keys mapping nodes are the keys of the graph, all of them by default
+        :param event_frequencies <array> - optional, the frequency of each event
+        :param node_frequencies <array> - optional, the frequency of each mapping node
+        :param node_counts <array> - optional, the number of MPRs below each mapping node
+        """
+        self.parasite_names = tuple(parasite_names)
+        self.host_names = tuple(host_names)
+        self.node_parasites = np.asarray(node_parasites, dtype=np.int32)
+        self.node_hosts = np.asarray(node_hosts, dtype=np.int32)
+        self.event_offsets = np.asarray(event_offsets, dtype=np.int64)
+        self.event_types = np.asarray(event_types, dtype=np.uint8)
+        self.event_children1 = np.asarray(event_children1, dtype=np.int32)
+        self.event_children2 = np.asarray(event_children2, dtype=np.int32)
+        n_nodes = self.node_parasites.size
+        n_events = self.event_types.size
+        if self.node_hosts.size != n_nodes or self.event_offsets.size != n_nodes + 1:
+            raise ValueError("mapping node arrays have inconsistent lengths")
+        if self.event_offsets[-1] != n_events or self.event_children1.size != n_events or \
+                self.event_children2.size != n_events:
+            raise ValueError("event arrays have inconsistent lengths")
+        self.n_keys = n_nodes if n_keys is None else n_keys
+        for array in (self.node_parasites, self.node_hosts, self.event_offsets, self.event_types,
+                      self.event_children1, self.event_children2):
+            array.flags.writeable = False
+        self.event_frequencies = _aligned(event_frequencies, n_events, "event_frequencies")
+        self.node_frequencies = _aligned(node_frequencies, n_nodes, "node_frequencies")
+        self.node_counts = _aligned(node_counts, n_nodes, "node_counts")
+
+        # Tuples of the dict view, built on first use
+        self._node_names = None
+        self._node_ids = None
+
+    @classmethod
+    def from_dict(cls, graph: dict, event_frequencies: dict = None, node_frequencies: dict = None,
+                  node_counts: dict = None, parasite_index: TreeIndex = None,
+                  host_index: TreeIndex = None) -> 'CompactReconGraph':
+        """
+        :param graph <dict> - reconciliation graph in dict format
+        :param event_frequencies <dict> - optional, frequency of each event tuple
+        :param node_frequencies <dict> - optional, frequency of each mapping node
+        :param node_counts <dict> - optional, number of MPRs below each mapping node
+        :param parasite_index, host_index <TreeIndex> - optional, indices whose names and ids become the name
+            tables, e.g. _ReconInput.parasite_index. Otherwise names are numbered in order of appearance.
+        :return: the graph as a CompactReconGraph
+        """
+        node_ids = {}
+        node_names = []
+        for mapping_node in graph:
+            node_ids[mapping_node] = len(node_names)
+            node_names.append(mapping_node)
+        n_keys = len(node_names)
+
+        event_offsets = [0]
+        event_types = []
+        event_children1 = []
+        event_children2 = []
+        for mapping_node in node_names[:n_keys]:
+            for event_type, child1, child2 in graph[mapping_node]:
+                event_types.append(EVENT_CODES[event_type])
+                for child, children in ((child1, event_children1), (child2, event_children2)):
+                    if child == PLACEHOLDER:
+                        children.append(NO_NODE)
+                        continue
+                    if child not in node_ids:
+                        node_ids[child] = len(node_names)
+                        node_names.append(child)
+                    children.append(node_ids[child])
+            event_offsets.append(len(event_types))
+        # Children that are not keys have no events
+        event_offsets.extend([len(event_types)] * (len(node_names) - n_keys))
+
+        if parasite_index is None:
+            parasite_names = list(dict.fromkeys(parasite for parasite, _ in node_names))
+        else:
+            parasite_names = None
+        if host_index is None:
+            host_names = list(dict.fromkeys(host for _, host in node_names))
+        else:
+            host_names = None
+        parasite_names, parasite_ids = _names_and_ids(parasite_names, parasite_index)
+        host_names, host_ids = _names_and_ids(host_names, host_index)
+
+        compact = cls(parasite_names, host_names,
+                      np.fromiter((parasite_ids[parasite] for parasite, _ in node_names), np.int32, len(node_names)),
+                      np.fromiter((host_ids[host] for _, host in node_names), np.int32, len(node_names)),
+                      event_offsets, event_types, event_children1, event_children2, n_keys=n_keys,
+                      event_frequencies=None if event_frequencies is None else np.fromiter(
+                          (event_frequencies[event] for event in _iter_event_tuples(graph, node_names[:n_keys])),
+                          np.float64, len(event_types)),
+                      node_frequencies=None if node_frequencies is None else np.fromiter(
+                          (node_frequencies.get(mapping_node, 0.0) for mapping_node in node_names), np.float64,
+                          len(node_names)),
+                      node_counts=None if node_counts is None else
+                      [node_counts.get(mapping_node, 0) for mapping_node in node_names])
+        compact._node_names = node_names
+        compact._node_ids = node_ids
+        return compact
+
+    def postorder(self) -> 'CompactReconGraph':
+        """
+        :return: the same graph with its mapping nodes sorted by parasite id, then by host id. When the name tables
+        are the names of TreeIndex objects (see from_dict), ids are positions in postorder, so every child of a
+        mapping node comes before it, which is the order array_median.py works in. Only the arrays are reordered.
+        """
+        if self.n_keys != self.n_nodes:
+            raise ValueError("a graph whose children are not all keys cannot be put in postorder")
+        counts = np.diff(self.event_offsets)
+        order = np.argsort(self.node_parasites.astype(np.int64) * len(self.host_names) + self.node_hosts,
+                           kind="stable")
+        new_positions = np.empty(self.n_nodes + 1, dtype=np.int32)
+        new_positions[order] = np.arange(self.n_nodes, dtype=np.int32)
+        # NO_NODE (-1) reads the last entry
+        new_positions[-1] = NO_NODE
+
+        event_offsets = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(counts[order], out=event_offsets[1:])
+        # Event i of the new arrays is the event at the same position within the events of the same node
+        event_order = np.repeat(self.event_offsets[:-1][order] - event_offsets[:-1], counts[order]) + \
+            np.arange(self.n_events, dtype=np.int64)
+
+        def reorder(array, positions):
+            return None if array is None else array[positions]
+
+        return CompactReconGraph(self.parasite_names, self.host_names, self.node_parasites[order],
+                                 self.node_hosts[order], event_offsets, self.event_types[event_order],
+                                 new_positions[self.event_children1[event_order]],
+                                 new_positions[self.event_children2[event_order]],
+                                 event_frequencies=reorder(self.event_frequencies, event_order),
+                                 node_frequencies=reorder(self.node_frequencies, order),
+                                 node_counts=reorder(self.node_counts, order))
+
+    def to_dict(self) -> dict:
+        """
+        :return: the graph in dict format, with the same iteration order as the dict it was built from
+        """
+        return {mapping_node: self[mapping_node] for mapping_node in self}
+
+    def event_frequencies_dict(self) -> dict:
+        """
+        :return: the event frequencies as a dict from event tuples, like median.generate_frequencies_dict
+        """
+        return dict(zip(self.event_tuples(), self.event_frequencies.tolist()))
+
+    def node_frequencies_dict(self) -> dict:
+        """
+        :return: the frequencies of the key mapping nodes as a dict from mapping nodes
+        """
+        return dict(zip(self, self.node_frequencies[:self.n_keys].tolist()))
+
+    @property
+    def n_nodes(self) -> int:
+        return self.node_parasites.size
+
+    @property
+    def n_events(self) -> int:
+        return self.event_types.size
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the arrays, not counting the name tables
+        """
+        arrays = [self.node_parasites, self.node_hosts, self.event_offsets, self.event_types, self.event_children1,
+                  self.event_children2, self.event_frequencies, self.node_frequencies, self.node_counts]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def node_name(self, node: int) -> tuple:
+        """
+        :return: the (parasite name, host name) mapping node with index node, (None, None) for NO_NODE
+        """
+        if node == NO_NODE:
+            return PLACEHOLDER
+        return self._names()[node]
+
+    def node_id(self, mapping_node: tuple) -> int:
+        """
+        :return: the index of a (parasite name, host name) mapping node, NO_NODE for (None, None)
+        """
+        if mapping_node == PLACEHOLDER:
+            return NO_NODE
+        return self._ids()[mapping_node]
+
+    def node_events(self, node: int) -> range:
+        """
+        :return: the indices of the events of mapping node index node
+        """
+        return range(self.event_offsets[node], self.event_offsets[node + 1])
+
+    def event_tuples(self):
+        """
+        :return: an iterator over the event tuples of all nodes, in the order of the event arrays
+        """
+        names = self._names()
+        placeholder_names = names + [PLACEHOLDER]
+        for event_type, child1, child2 in zip(self.event_types.tolist(), self.event_children1.tolist(),
+                                              self.event_children2.tolist()):
+            # NO_NODE is -1, the placeholder at the end of placeholder_names
+            yield EVENT_TYPES[event_type], placeholder_names[child1], placeholder_names[child2]
+
+    def _names(self) -> list:
+        if self._node_names is None:
+            parasite_names = self.parasite_names
+            host_names = self.host_names
+            self._node_names = [(parasite_names[parasite], host_names[host]) for parasite, host in
+                                zip(self.node_parasites.tolist(), self.node_hosts.tolist())]
+        return self._node_names
+
+    def _ids(self) -> dict:
+        if self._node_ids is None:
+            self._node_ids = {mapping_node: node for node, mapping_node in enumerate(self._names())}
+        return self._node_ids
+
+    # Read-only dict view
+
+    def __getitem__(self, mapping_node: tuple) -> list:
+        node = self._ids().get(mapping_node)
+        if node is None or node >= self.n_keys:
+            raise KeyError(mapping_node)
+        start, end = self.event_offsets[node:node + 2].tolist()
+        return [(EVENT_TYPES[event_type], self.node_name(child1), self.node_name(child2))
+                for event_type, child1, child2 in zip(self.event_types[start:end].tolist(),
+                                                      self.event_children1[start:end].tolist(),
+                                                      self.event_children2[start:end].tolist())]
+
+    def __contains__(self, mapping_node) -> bool:
+        node = self._ids().get(mapping_node)
+        return node is not None and node < self.n_keys
+
+    def __iter__(self):
+        return iter(self._names()[:self.n_keys])
+
+    def __len__(self) -> int:
+        return self.n_keys
+
+    def __repr__(self):
+        return "CompactReconGraph(%d mapping nodes, %d events)" % (self.n_keys, self.n_events)
+
+
+class LazyMapping(Mapping):
+    """
+    Read-only dict that is only built, by calling build(), when it is first read
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._dict = None
+
+    def _built(self) -> dict:
+        if self._dict is None:
+            self._dict = self._build()
+        return self._dict
+
+    def __getitem__(self, key):
+        return self._built()[key]
+
+    def __iter__(self):
+        return iter(self._built())
+
+    def __len__(self) -> int:
+        return len(self._built())
+
+
+def _iter_event_tuples(graph: dict, mapping_nodes: list):
+    for mapping_node in mapping_nodes:
+        yield from graph[mapping_node]
@@ -5,12 +5,13 @@ Utilities related to conversion between data types
 
 from empress.recon_vis import recon
 from empress.recon_vis import tree
+from empress.tree_index import TreeIndex
 
 from typing import Dict, Tuple, List
 from collections import OrderedDict
 from enum import Enum
 
-__all__ = ['dict_to_tree', 'dict_to_reconciliation', 'build_trees_with_temporal_order']
+__all__ = ['dict_to_tree', 'index_to_tree', 'dict_to_reconciliation', 'build_trees_with_temporal_order']
 
 
 class ConsistencyType(Enum):
@@ -40,31 +41,32 @@ def dict_to_tree(tree_dict: dict, tree_type: tree.TreeType) -> tree.Tree:
     """
 
     root = "hTop" if tree_type == tree.TreeType.HOST else "pTop"
-    output_tree = tree.Tree()
-    output_tree.tree_type = tree_type
-    output_tree.root_node = _dict_to_tree_helper(tree_dict, root)
-    return output_tree
+    return index_to_tree(TreeIndex(tree_dict, root), tree_type)
 
 
-def _dict_to_tree_helper(tree_dict, root_edge):
+def index_to_tree(index: TreeIndex, tree_type: tree.TreeType) -> tree.Tree:
     """
-    Helper function for dict_to_tree.
+    :param index: A TreeIndex of the tree, such as _ReconInput.host_index
+    :param tree_type: tree.TreeType.{HOST, PARASITE} indicating the type of the tree.
+    :return: A representation of the tree in Tree format (see tree.py)
     """
-    root_name = tree_dict[root_edge][1]
-    new_node = tree.Node(root_name)
-    left_edge = tree_dict[root_edge][2]
-    right_edge = tree_dict[root_edge][3]
+    # Children have smaller ids than their parents, so nodes are linked to children that already exist
+    nodes = []
+    for node, name in enumerate(index.names):
+        new_node = tree.Node(name)
+        if not index.is_leaf(node):
+            new_left_node = nodes[index.left[node]]
+            new_right_node = nodes[index.right[node]]
+            new_node.left_node = new_left_node
+            new_left_node.parent_node = new_node
+            new_node.right_node = new_right_node
+            new_right_node.parent_node = new_node
+        nodes.append(new_node)
 
-    if left_edge is None and right_edge is None:
-        return new_node
-    else:
-        new_left_node = _dict_to_tree_helper(tree_dict, left_edge)
-        new_right_node = _dict_to_tree_helper(tree_dict, right_edge)
-        new_node.left_node = new_left_node
-        new_left_node.parent_node = new_node
-        new_node.right_node = new_right_node
-        new_right_node.parent_node = new_node
-        return new_node
+    output_tree = tree.Tree()
+    output_tree.tree_type = tree_type
+    output_tree.root_node = nodes[index.root]
+    return output_tree
 
 # ReconGraph utilities
 
@@ -355,26 +357,37 @@ def topological_order_helper(start_node, start_order, visiting_nodes, unvisited_
     is_leaf = start_node not in temporal_graph
     if is_leaf:
         return False, next_order
-    else:
-        has_cycle = start_node in visiting_nodes
-        if has_cycle:
-            return True, next_order
-        visiting_nodes.add(start_node)
-        child_nodes = sorted(temporal_graph[start_node])
+    has_cycle = start_node in visiting_nodes
+    if has_cycle:
+        return True, next_order
+    visiting_nodes.add(start_node)
+    # Depth-first search with an explicit stack of (node, iterator over its remaining children), so that long paths
+    # in the temporal graph do not reach the recursion limit
+    stack = [(start_node, iter(sorted(temporal_graph[start_node])))]
+    while stack:
+        node, child_nodes = stack[-1]
         for child_node in child_nodes:
             # if the child_node is already labeled, we skip it
             if child_node in ordering_dict:
                 continue
             if child_node in unvisited_nodes:
                 unvisited_nodes.pop(child_node)
-            has_cycle_child, next_order = topological_order_helper(child_node, next_order,  visiting_nodes,
-                                            unvisited_nodes, temporal_graph, ordering_dict)
+            # leaves of the temporal graph are not labeled
+            if child_node not in temporal_graph:
+                continue
             # if we find a cycle, we stop the process
-            if has_cycle_child: return True, next_order
-        # if children are all labeled, we can label the start_node
-        visiting_nodes.remove(start_node)
-        ordering_dict[start_node] = next_order
-        return False, next_order + 1
+            if child_node in visiting_nodes:
+                return True, next_order
+            visiting_nodes.add(child_node)
+            stack.append((child_node, iter(sorted(temporal_graph[child_node]))))
+            break
+        else:
+            # if children are all labeled, we can label the node
+            stack.pop()
+            visiting_nodes.remove(node)
+            ordering_dict[node] = next_order
+            next_order += 1
+    return False, next_order
 
 
 def populate_nodes_with_order(tree_node, tree_type, ordering_dict, leaf_order):
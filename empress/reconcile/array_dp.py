@@ -0,0 +1,865 @@
+# array_dp.py
+# Array-backed version of the DTL DP in recongraph_tools.py
+
+# recongraph_tools.DP keeps its A, C, O and best_switch tables in dictionaries
+# keyed by pairs of edge tuples, so every cell costs several tuple allocations
+# and hashes. This module gives every host and parasite node an integer id (its
+# position in postorder, so children always have smaller ids than their
+# parents) and keeps the tables in preallocated NumPy arrays indexed by
+# [parasite id, host id].
+#
+# The tables are filled on the same schedule as recongraph_tools.DP: parasite
+# nodes in postorder, and for each of them the host nodes in postorder for A, C
+# and O followed by the host nodes in preorder for best_switch.
+#
+# Instead of listing the candidate events of every cell during that bottom-up
+# pass, each cell gets two one-byte argmin markers: which events reach the
+# cell's cost, and which comparisons of O and best_switch are tight (these
+# locate transfer landing sites). The events of the mapping nodes reachable
+# from the best roots are then materialized top-down from the markers alone,
+# and the reconciliation graph, MPR count and best roots are exactly the ones
+# returned by recongraph_tools.DP. Apart from the C row of the parasite root,
+# nothing but the markers is needed for that, so by default the float rows of
+# a parasite node are freed as soon as its parent's rows are done and peak
+# table memory follows the parasite tree's frontier (see DPTables.fill).
+#
+# Mapping nodes are (parasite id, host id) pairs inside this module and are only
+# translated back to (parasite name, host name) pairs for the reachable part of
+# the reconciliation graph.
+
+import copy
+import concurrent.futures
+from typing import Tuple
+
+import numpy as np
+
+from empress.input_reader import _ReconInput
+from empress.recon_graph import CompactReconGraph, EVENT_CODES, NO_NODE
+from empress.tree_index import TreeIndex
+from empress.reconcile import recongraph_tools
+from empress.reconcile import mpr_counting
+
+Infinity = float('inf')
+
+# Bits of DPTables.event_markers: the events that give C(p, h) its cost
+DUPLICATION = 1
+TRANSFER_RIGHT = 2  # the right child of p is transferred away from h
+TRANSFER_LEFT = 4  # the left child of p is transferred away from h (only set without TRANSFER_RIGHT)
+CONTEMPORARY = 8
+LOSS_LEFT = 16
+LOSS_RIGHT = 32
+SPECIATION_SWAP = 64  # left child of p to right child of h, right child of p to left child of h
+SPECIATION = 128
+
+# Bits of DPTables.landing_markers, used to list transfer landing sites
+O_SELF = 1  # C(p, h) == O(p, h), h is a landing site
+O_LEFT = 2  # O(p, left child of h) == O(p, h)
+O_RIGHT = 4  # O(p, right child of h) == O(p, h)
+SWITCH_INHERIT = 8  # best_switch(p, h) == best_switch(p, parent of h)
+SWITCH_SIBLING = 16  # best_switch(p, h) == O(p, sibling of h)
+
+# Number of parasite subtrees per worker process in a parallel fill. More subtrees than workers lets the workers
+# that finish early pick up the remaining subtrees of unbalanced parasite trees.
+SUBTREES_PER_JOB = 4
+
+
+class DPTables:
+    """
+    The A, C, O and best_switch tables of one reconciliation problem, together with the integer-indexed trees
+    and costs used to fill them. Each table is a NumPy array of shape (number of parasite nodes, number of host
+    nodes); see the tech report for the definition of each table.
+
+    The tables can also hold a batch of problems that share the host and parasite trees. When the costs are
+    sequences of equal length, or several tip mappings are given, every table gets a trailing batch axis and
+    carries one cost per problem in each cell. Use batch_item to get the tables of a single problem back.
+    """
+
+    def __init__(self, tree_data: _ReconInput, dup_cost, transfer_cost, loss_cost, tip_mappings: list = None,
+                 host: TreeIndex = None):
+        """
+        :param tree_data <_ReconInput> - host tree, parasite tree and tip mapping
+        :param dup_cost, transfer_cost, loss_cost - event costs, either floats or equal-length sequences of floats
+        (one per problem in the batch)
+        :param tip_mappings <list> - optional list of tip mappings (one per problem in the batch) that replaces
+        tree_data.tip_mapping
+        :param host <TreeIndex> - optional index of tree_data.host_dict, to share it between inputs that do not
+        share tree_data
+        """
+        self.host = tree_data.host_index if host is None else host
+        self.parasite = tree_data.parasite_index
+
+        if np.ndim(dup_cost) == 0 and tip_mappings is None:
+            self.batch_size = None
+            self.dup_cost = dup_cost
+            self.transfer_cost = transfer_cost
+            self.loss_cost = loss_cost
+            # tip_host[p] is the id of the host tip that parasite tip p maps to, or -1 for internal parasite nodes
+            self.tip_host = self._tip_host(tree_data.tip_mapping)
+            self.shape = (len(self.parasite), len(self.host))
+        else:
+            dup_cost, transfer_cost, loss_cost = np.broadcast_arrays(
+                np.asarray(dup_cost, dtype=float), np.asarray(transfer_cost, dtype=float),
+                np.asarray(loss_cost, dtype=float))
+            if tip_mappings is None:
+                # One tip mapping shared by every problem in the batch, of shape (number of parasite nodes,)
+                self.tip_host = np.array(self._tip_host(tree_data.tip_mapping), dtype=np.int64)
+                self.batch_size = len(dup_cost)
+            else:
+                # One column per problem, of shape (number of parasite nodes, batch size)
+                self.tip_host = np.array([self._tip_host(tip_mapping) for tip_mapping in tip_mappings],
+                                         dtype=np.int64).T
+                self.batch_size = len(tip_mappings)
+            self.dup_cost, self.transfer_cost, self.loss_cost = \
+                [np.broadcast_to(cost, (self.batch_size,)) for cost in (dup_cost, transfer_cost, loss_cost)]
+            self.shape = (len(self.parasite), len(self.host), self.batch_size)
+
+        # The tables themselves are allocated by fill. A, C, O and best_switch stay None unless fill keeps them.
+        self.A = None
+        self.C = None
+        self.O = None
+        self.best_switch = None
+        self.event_markers = None
+        self.landing_markers = None
+        # The C row of the parasite root, always kept
+        self.root_costs = None
+        self.level_synchronous = False
+
+        # Events and MPR counts of the mapping nodes visited so far by reconcile_tables, keyed by
+        # (parasite id, host id). They stay valid until the rows of their parasite node change.
+        self.event_cache = None
+        self.count_cache = None
+
+    def _tip_host(self, tip_mapping: dict) -> list:
+        tip_host = [-1] * len(self.parasite)
+        for parasite_tip, host_tip in tip_mapping.items():
+            tip_host[self.parasite.ids[parasite_tip]] = self.host.ids[host_tip]
+        return tip_host
+
+    def batch_item(self, k: int) -> 'DPTables':
+        """
+        :return: the tables of the k-th problem of a batch. The tables are views into this object's tables.
+        """
+        item = copy.copy(self)
+        item.batch_size = None
+        item.dup_cost = float(self.dup_cost[k])
+        item.transfer_cost = float(self.transfer_cost[k])
+        item.loss_cost = float(self.loss_cost[k])
+        tip_host = self.tip_host if self.tip_host.ndim == 1 else self.tip_host[:, k]
+        item.tip_host = tip_host.tolist()
+        for table in ("A", "C", "O", "best_switch", "event_markers", "landing_markers"):
+            if getattr(self, table) is not None:
+                setattr(item, table, getattr(self, table)[:, :, k])
+        item.root_costs = self.root_costs[:, k]
+        item.event_cache = _EventsOnDemand(item)
+        item.count_cache = {}
+        return item
+
+    def copy(self) -> 'DPTables':
+        """
+        :return: a copy of filled, unbatched tables that can be updated without changing self
+        """
+        tables = copy.copy(self)
+        tables.tip_host = list(self.tip_host)
+        for table in ("A", "C", "O", "best_switch", "event_markers", "landing_markers"):
+            if getattr(self, table) is not None:
+                setattr(tables, table, getattr(self, table).copy())
+        tables.root_costs = self.root_costs.copy() if self.C is None else tables.C[self.parasite.root]
+        tables.event_cache = _EventsOnDemand(tables)
+        tables.event_cache.update(self.event_cache)
+        tables.count_cache = dict(self.count_cache)
+        return tables
+
+    def fill(self, level_synchronous: bool = False, keep_tables: bool = True, n_jobs: int = 1):
+        """
+        Fill every row of the tables and markers, children before parents.
+        :param level_synchronous: compute each row one host level at a time with NumPy operations
+        (see _compute_row_by_levels) instead of one host node at a time. Batched tables are always filled this way.
+        :param keep_tables: keep the A, C, O and best_switch tables. Otherwise the C and best_switch rows of a
+        parasite node are freed as soon as its parent's rows are done and only the markers and root_costs are
+        kept, which is all that reconcile_tables needs, but the tip mapping can no longer be updated.
+        :param n_jobs: number of worker processes. With more than one, disjoint parasite subtrees are filled in
+        parallel (see _fill_subtrees_in_parallel); this requires keep_tables=False.
+        """
+        if n_jobs > 1 and keep_tables:
+            raise ValueError("a parallel fill cannot keep the tables")
+        self.level_synchronous = level_synchronous or self.batch_size is not None
+        self._allocate(keep_tables)
+        self.event_cache = _EventsOnDemand(self)
+        self.count_cache = {}
+        waiting_rows = {}
+        done = [False] * len(self.parasite)
+        if n_jobs > 1:
+            self._fill_subtrees_in_parallel(n_jobs, waiting_rows, done)
+        for p in range(len(self.parasite)):
+            if not done[p]:
+                self._fill_row(p, waiting_rows)
+        if keep_tables:
+            self.root_costs = self.C[self.parasite.root]
+        else:
+            self.root_costs, _ = waiting_rows.pop(self.parasite.root)
+
+    def fill_memoized(self, row_memo: dict, row_keys: list, level_synchronous: bool = False) -> int:
+        """
+        Same as fill with keep_tables=False, but a parasite node whose key is in row_memo gets its rows and markers
+        from there instead of computing them, and the rows of the other nodes are added to row_memo.
+        :param row_memo <dict> - maps row keys to (C row, best_switch row, event markers row, landing markers row)
+        :param row_keys <list> - row_keys[p] is the key of parasite node p. Nodes with equal keys must have equal
+        rows and markers.
+        :return: the number of parasite nodes whose rows were found in row_memo
+        """
+        self.level_synchronous = level_synchronous or self.batch_size is not None
+        self._allocate(keep_tables=False)
+        self.event_cache = _EventsOnDemand(self)
+        self.count_cache = {}
+        waiting_rows = {}
+        n_reused = 0
+        for p in range(len(self.parasite)):
+            if row_keys[p] in row_memo:
+                c, best_switch, self.event_markers[p], self.landing_markers[p] = row_memo[row_keys[p]]
+                if not self.parasite.is_leaf(p):
+                    del waiting_rows[self.parasite.left[p]], waiting_rows[self.parasite.right[p]]
+                waiting_rows[p] = (c, best_switch)
+                n_reused += 1
+            else:
+                self._fill_row(p, waiting_rows)
+                c, best_switch = waiting_rows[p]
+                row_memo[row_keys[p]] = (c, best_switch, self.event_markers[p].copy(),
+                                         self.landing_markers[p].copy())
+        self.root_costs, _ = waiting_rows.pop(self.parasite.root)
+        return n_reused
+
+    def _allocate(self, keep_tables: bool):
+        self.event_markers = np.zeros(self.shape, dtype=np.uint8)
+        self.landing_markers = np.zeros(self.shape, dtype=np.uint8)
+        if keep_tables:
+            self.A = np.full(self.shape, Infinity)
+            self.C = np.full(self.shape, Infinity)
+            self.O = np.full(self.shape, Infinity)
+            self.best_switch = np.full(self.shape, Infinity)
+        else:
+            self.A = self.C = self.O = self.best_switch = None
+
+    def _parallel_subtrees(self, n_jobs: int) -> list:
+        """
+        :return: the roots of disjoint parasite subtrees of at most SUBTREES_PER_JOB-th of a job's share of the
+        parasite tree, largest first. Their ancestors and the leaves outside of them are left out.
+        """
+        parasite = self.parasite
+        max_size = max(1, len(parasite) // (n_jobs * SUBTREES_PER_JOB))
+        subtrees = []
+        stack = [parasite.root]
+        while stack:
+            node = stack.pop()
+            if parasite.size[node] > max_size:
+                stack.extend((parasite.left[node], parasite.right[node]))
+            elif not parasite.is_leaf(node):
+                subtrees.append(node)
+        return sorted(subtrees, key=lambda node: parasite.size[node], reverse=True)
+
+    def _fill_subtrees_in_parallel(self, n_jobs: int, waiting_rows: dict, done: list):
+        """
+        Fill the rows of the subtrees chosen by _parallel_subtrees in a pool of n_jobs processes. Each worker
+        sends back the markers of its subtree and the C and best_switch rows of the subtree root, which are added
+        to waiting_rows for the parent's row. done[p] is set for every parasite node p that was filled.
+        """
+        worker_tables = copy.copy(self)
+        worker_tables.event_markers = worker_tables.landing_markers = None
+        worker_tables.event_cache = worker_tables.count_cache = None
+        subtrees = self._parallel_subtrees(n_jobs)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_subtree_worker,
+                                                    initargs=(worker_tables,)) as executor:
+            futures = [executor.submit(_fill_subtree, root) for root in subtrees]
+            for future in concurrent.futures.as_completed(futures):
+                root, event_markers, landing_markers, root_rows = future.result()
+                first = root - self.parasite.size[root] + 1
+                self.event_markers[first:root + 1] = event_markers
+                self.landing_markers[first:root + 1] = landing_markers
+                waiting_rows[root] = root_rows
+                done[first:root + 1] = [True] * self.parasite.size[root]
+
+    def fill_subtree(self, root: int) -> tuple:
+        """
+        Fill the rows of the parasite subtree of root without keeping the tables. The markers must be allocated.
+        :return: root, the event and landing markers of the subtree (rows of ids root - size + 1 to root), and the
+        C and best_switch rows of root
+        """
+        first = root - self.parasite.size[root] + 1
+        waiting_rows = {}
+        for p in range(first, root + 1):
+            self._fill_row(p, waiting_rows)
+        return root, self.event_markers[first:root + 1], self.landing_markers[first:root + 1], waiting_rows[root]
+
+    def _fill_row(self, p: int, waiting_rows: dict = None):
+        """
+        (Re)compute the rows and markers of parasite node p from the rows of its children.
+        :param waiting_rows: when the tables are not kept, the C and best_switch rows of the nodes whose parent
+        is not done yet, by parasite id. The rows of p's children are removed and the rows of p are added.
+        """
+        p1 = self.parasite.left[p]
+        p2 = self.parasite.right[p]
+        if p1 == -1:
+            child_rows = None
+        elif self.C is None:
+            child_rows = waiting_rows.pop(p1) + waiting_rows.pop(p2)
+        else:
+            child_rows = (self.C[p1], self.best_switch[p1], self.C[p2], self.best_switch[p2])
+        a, c, o, best_switch = self.compute_row(p, child_rows)
+        if self.C is None:
+            waiting_rows[p] = (c, best_switch)
+        else:
+            self.A[p], self.C[p], self.O[p], self.best_switch[p] = a, c, o, best_switch
+        self.event_markers[p], self.landing_markers[p] = self._compute_markers(child_rows, a, c, o, best_switch)
+
+    def update_tip_mapping(self, tip_mapping: dict) -> list:
+        """
+        Change the tip mapping of filled, unbatched tables. Only the rows of parasite nodes on the path from a
+        changed tip to the parasite root depend on the change, so only those rows are recomputed, and only
+        their cached events and MPR counts are dropped.
+        :param tip_mapping <dict> - the new tip mapping
+        :return: the ids of the recomputed parasite nodes, children before parents
+        """
+        if self.C is None:
+            raise ValueError("the tip mapping can only be updated in tables filled with keep_tables=True")
+        new_tip_host = self._tip_host(tip_mapping)
+        affected = set()
+        for p in range(len(self.parasite)):
+            if new_tip_host[p] != self.tip_host[p]:
+                node = p
+                while node != -1 and node not in affected:
+                    affected.add(node)
+                    node = self.parasite.parent[node]
+        self.tip_host = new_tip_host
+
+        # Parasite ids are in postorder, so increasing ids recompute children before parents
+        affected = sorted(affected)
+        for p in affected:
+            self._fill_row(p)
+        for cache in (self.event_cache, self.count_cache):
+            for mapping_node in [mapping_node for mapping_node in cache if mapping_node[0] in affected]:
+                del cache[mapping_node]
+        return affected
+
+    def fill_costs(self):
+        """
+        Compute only the C and best_switch rows needed to get the optimal cost, without allocating the tables.
+        A row is dropped as soon as its parent's row is done, so memory scales with the number of rows that
+        are waiting for a sibling rather than with the size of the parasite tree.
+        :return: the same value as best_cost would return after fill
+        """
+        waiting_rows = {}
+        for p in range(len(self.parasite)):
+            p1 = self.parasite.left[p]
+            p2 = self.parasite.right[p]
+            if p1 == -1:
+                child_rows = None
+            else:
+                child_rows = waiting_rows.pop(p1) + waiting_rows.pop(p2)
+            _, c, _, best_switch = self._compute_row_by_levels(p, child_rows)
+            waiting_rows[p] = (c, best_switch)
+        root_costs, _ = waiting_rows[self.parasite.root]
+        if self.batch_size is None:
+            return float(root_costs.min())
+        return root_costs.min(axis=0)
+
+    def compute_row(self, p: int, child_rows: tuple) -> tuple:
+        """
+        :return: the A, C, O and best_switch rows that parasite node p would have if its children had child_rows
+        (see _compute_row), computed the way fill computes them. The tables are not changed.
+        """
+        compute_row = self._compute_row_by_levels if self.level_synchronous else self._compute_row
+        return tuple(np.asarray(row) for row in compute_row(p, child_rows))
+
+    def _compute_row(self, p: int, child_rows: tuple) -> Tuple[list, list, list, list]:
+        """
+        :param p: a parasite node
+        :param child_rows: None if p is a tip, otherwise the C and best_switch rows of the children of p, in the
+        order (C of left child, best_switch of left child, C of right child, best_switch of right child)
+        :return: the A, C, O and best_switch rows of p as lists indexed by host id
+        """
+        host = self.host
+        n_host = len(host)
+        left, right = host.left, host.right
+        vp_is_a_tip = child_rows is None
+        if not vp_is_a_tip:
+            c1, best_switch1, c2, best_switch2 = [row.tolist() for row in child_rows]
+        tip_host = self.tip_host[p]
+        dup_cost, transfer_cost, loss_cost = self.dup_cost, self.transfer_cost, self.loss_cost
+
+        a = [Infinity] * n_host
+        c = [Infinity] * n_host
+        o = [Infinity] * n_host
+        for h in range(n_host):
+            h1 = left[h]
+            h2 = right[h]
+
+            # Compute A(ep, eh)
+            if h1 == -1:
+                a_h = 0.0 if h == tip_host else Infinity
+            else:
+                if vp_is_a_tip:
+                    co_ep_eh = Infinity
+                else:
+                    co_ep_eh = min(c1[h1] + c2[h2], c1[h2] + c2[h1])
+                loss_ep_eh = loss_cost + min(c[h1], c[h2])
+                a_h = min(co_ep_eh, loss_ep_eh)
+
+            # Compute C(ep, eh) from A, D and T
+            if vp_is_a_tip:
+                c_h = a_h
+            else:
+                dup_ep_eh = dup_cost + c1[h] + c2[h]
+                switch_ep_eh = transfer_cost + min(c1[h] + best_switch2[h], c2[h] + best_switch1[h])
+                c_h = min(a_h, dup_ep_eh, switch_ep_eh)
+            a[h] = a_h
+            c[h] = c_h
+
+            # Compute O(ep, eh)
+            if h1 == -1:
+                o[h] = c_h
+            else:
+                o[h] = min(c_h, o[h1], o[h2])
+
+        # Compute best_switch values, top-down
+        best_switch = [Infinity] * n_host
+        for h in host.preorder:
+            h1 = left[h]
+            if h1 != -1:
+                h2 = right[h]
+                best_switch[h1] = min(best_switch[h], o[h2])
+                best_switch[h2] = min(best_switch[h], o[h1])
+        return a, c, o, best_switch
+
+    def _compute_row_by_levels(self, p: int, child_rows: tuple) -> Tuple[np.ndarray, np.ndarray, np.ndarray,
+                                                                        np.ndarray]:
+        """
+        Same as _compute_row, but every host level is computed in one vectorized step. Host nodes of the same
+        height only depend on lower heights for A, C and O, and nodes of the same depth only depend on shallower
+        nodes for best_switch, so a row costs O(height of the host tree) NumPy operations. The operations are the
+        ones _compute_row performs, in the same order, so both produce identical tables. With a batch axis,
+        every operation also runs over all problems of the batch at once.
+        """
+        host = self.host
+        n_host = len(host)
+        vp_is_a_tip = child_rows is None
+        if not vp_is_a_tip:
+            c1, best_switch1, c2, best_switch2 = child_rows
+        row_shape = (n_host,) if self.batch_size is None else (n_host, self.batch_size)
+
+        a = np.full(row_shape, Infinity)
+        c = np.full(row_shape, Infinity)
+        o = np.full(row_shape, Infinity)
+
+        # Host tips: only the mapped tip gets a contemporary event
+        if self.batch_size is None:
+            if self.tip_host[p] != -1:
+                a[self.tip_host[p]] = 0.0
+        else:
+            tip_host = np.broadcast_to(self.tip_host[p], (self.batch_size,))
+            batch = np.flatnonzero(tip_host != -1)
+            a[tip_host[batch], batch] = 0.0
+        levels = (host.leaves,) + host.height_levels
+        for level_index, level in enumerate(levels):
+            if level_index == 0:
+                a_level = a[level]
+            else:
+                h1 = host.left_array[level]
+                h2 = host.right_array[level]
+                if vp_is_a_tip:
+                    co_ep_eh = Infinity
+                else:
+                    co_ep_eh = np.minimum(c1[h1] + c2[h2], c1[h2] + c2[h1])
+                loss_ep_eh = self.loss_cost + np.minimum(c[h1], c[h2])
+                a_level = np.minimum(co_ep_eh, loss_ep_eh)
+                a[level] = a_level
+
+            if vp_is_a_tip:
+                c_level = a_level
+            else:
+                dup_ep_eh = self.dup_cost + c1[level] + c2[level]
+                switch_ep_eh = self.transfer_cost + np.minimum(c1[level] + best_switch2[level],
+                                                               c2[level] + best_switch1[level])
+                c_level = np.minimum(np.minimum(a_level, dup_ep_eh), switch_ep_eh)
+            c[level] = c_level
+
+            if level_index == 0:
+                o[level] = c_level
+            else:
+                o[level] = np.minimum(c_level, np.minimum(o[h1], o[h2]))
+
+        best_switch = np.full(row_shape, Infinity)
+        for level in host.depth_levels:
+            h1 = host.left_array[level]
+            h2 = host.right_array[level]
+            best_switch[h1] = np.minimum(best_switch[level], o[h2])
+            best_switch[h2] = np.minimum(best_switch[level], o[h1])
+        return a, c, o, best_switch
+
+    def _compute_markers(self, child_rows: tuple, a: np.ndarray, c: np.ndarray, o: np.ndarray,
+                         best_switch: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param child_rows: as in _compute_row
+        :param a, c, o, best_switch: the finished rows of the parasite node
+        :return: its event_markers and landing_markers rows. The comparisons are the ones recongraph_tools.DP
+        makes to list the events of each cell, on the same values, so the markers select exactly its events.
+        """
+        host = self.host
+        internal = host.internal
+        h1 = host.left_array[internal]
+        h2 = host.right_array[internal]
+        event_markers = np.zeros(c.shape, dtype=np.uint8)
+        landing_markers = np.zeros(c.shape, dtype=np.uint8)
+
+        if child_rows is None:
+            co_ep_eh = Infinity
+        else:
+            c1, best_switch1, c2, best_switch2 = child_rows
+            event_markers[c == self.dup_cost + c1 + c2] |= DUPLICATION
+            switch2 = c1 + best_switch2
+            switch1 = c2 + best_switch1
+            is_switch = c == self.transfer_cost + np.minimum(switch2, switch1)
+            event_markers[is_switch & (switch2 <= switch1)] |= TRANSFER_RIGHT
+            event_markers[is_switch & (switch1 < switch2)] |= TRANSFER_LEFT
+            co_ep_eh = np.minimum(c1[h1] + c2[h2], c1[h2] + c2[h1])
+
+        # Host tips have a contemporary event, internal host nodes speciations and losses. Only the cheaper of the
+        # two kinds is listed, or both on a tie.
+        leaves = host.leaves
+        leaf_markers = event_markers[leaves]
+        leaf_markers[c[leaves] == a[leaves]] |= CONTEMPORARY
+        event_markers[leaves] = leaf_markers
+        internal_markers = event_markers[internal]
+        is_a = c[internal] == a[internal]
+        loss_ep_eh = self.loss_cost + np.minimum(c[h1], c[h2])
+        is_loss = is_a & (loss_ep_eh <= co_ep_eh)
+        internal_markers[is_loss & (loss_ep_eh == self.loss_cost + c[h1])] |= LOSS_LEFT
+        internal_markers[is_loss & (loss_ep_eh == self.loss_cost + c[h2])] |= LOSS_RIGHT
+        if child_rows is not None:
+            is_speciation = is_a & (co_ep_eh <= loss_ep_eh)
+            internal_markers[is_speciation & (co_ep_eh == c2[h1] + c1[h2])] |= SPECIATION_SWAP
+            internal_markers[is_speciation & (co_ep_eh == c1[h1] + c2[h2])] |= SPECIATION
+        event_markers[internal] = internal_markers
+
+        landing_markers[c == o] |= O_SELF
+        landing_markers[leaves] |= O_SELF
+        internal_landing = landing_markers[internal]
+        internal_landing[o[h1] == o[internal]] |= O_LEFT
+        internal_landing[o[h2] == o[internal]] |= O_RIGHT
+        landing_markers[internal] = internal_landing
+        non_root = host.non_root
+        non_root_landing = landing_markers[non_root]
+        non_root_landing[best_switch[non_root] == best_switch[host.parent_array[non_root]]] |= SWITCH_INHERIT
+        non_root_landing[best_switch[non_root] == o[host.sibling_array[non_root]]] |= SWITCH_SIBLING
+        landing_markers[non_root] = non_root_landing
+        return event_markers, landing_markers
+
+    def o_best(self, p: int, h: int) -> list:
+        """
+        :return: the host nodes below h (inclusive) that give O(p, h) its cost, in the order
+        recongraph_tools.DP lists them
+        """
+        host = self.host
+        landing_markers = self.landing_markers[p]
+        locations = []
+        stack = [h]
+        while stack:
+            node = stack.pop()
+            if host.left[node] == -1:
+                locations.append(node)
+                continue
+            markers = landing_markers[node]
+            if markers & O_SELF:
+                locations.append(node)
+            # Push the right child first so the whole left subtree is listed before it
+            if markers & O_RIGHT:
+                stack.append(host.right[node])
+            if markers & O_LEFT:
+                stack.append(host.left[node])
+        return locations
+
+    def best_switch_locations(self, p: int, h: int) -> list:
+        """
+        :return: the host nodes that p can be transferred to from h at cost best_switch(p, h), in the order
+        recongraph_tools.DP lists them. The host root has the single placeholder location None.
+        """
+        host = self.host
+        landing_markers = self.landing_markers[p]
+        if host.parent[h] == -1:
+            return [None]
+
+        # h inherits the locations of every ancestor up to the first one whose best_switch differs (the children
+        # of the root never inherit the root's placeholder)
+        chain = [h]
+        node = h
+        while host.parent[host.parent[node]] != -1 and landing_markers[node] & SWITCH_INHERIT:
+            node = host.parent[node]
+            chain.append(node)
+
+        locations = []
+        for node in reversed(chain):
+            if landing_markers[node] & SWITCH_SIBLING:
+                locations.extend(self.o_best(p, host.sibling[node]))
+        return locations
+
+    def events(self, p: int, h: int) -> list:
+        """
+        :return: the optimal events at mapping node (p, h) in the order recongraph_tools.DP lists them. Mapping
+        nodes in the events are (parasite id, host id) pairs, with (None, None) for missing children.
+        """
+        markers = self.event_markers[p, h]
+        p1 = self.parasite.left[p]
+        p2 = self.parasite.right[p]
+        h1 = self.host.left[h]
+        h2 = self.host.right[h]
+        events = []
+        if markers & DUPLICATION:
+            events.append(("D", (p1, h), (p2, h)))
+        if markers & TRANSFER_RIGHT:
+            for location in self.best_switch_locations(p2, h):
+                events.append(("T", (p1, h), (p2, location)))
+        elif markers & TRANSFER_LEFT:
+            for location in self.best_switch_locations(p1, h):
+                events.append(("T", (p2, h), (p1, location)))
+        if markers & CONTEMPORARY:
+            events.append(("C", (None, None), (None, None)))
+        if markers & LOSS_LEFT:
+            events.append(("L", (p, h1), (None, None)))
+        if markers & LOSS_RIGHT:
+            events.append(("L", (p, h2), (None, None)))
+        if markers & SPECIATION_SWAP:
+            events.append(("S", (p2, h1), (p1, h2)))
+        if markers & SPECIATION:
+            events.append(("S", (p1, h1), (p2, h2)))
+        return events
+
+    def best_roots(self) -> list:
+        """
+        :return: the mapping nodes of the parasite root that can produce an MPR, in host postorder
+        """
+        p = self.parasite.root
+        root_costs = self.root_costs.tolist()
+        min_score = min([cost for cost in root_costs if cost != Infinity])
+        return [(p, h) for h, cost in enumerate(root_costs) if cost == min_score]
+
+    def best_cost(self):
+        """
+        :return: the cost of the best reconciliation, or an array with one cost per problem for batched tables
+        """
+        if self.batch_size is None:
+            return float(self.root_costs.min())
+        return self.root_costs.min(axis=0)
+
+    def mapping_node_name(self, mapping_node: tuple) -> tuple:
+        """
+        :return: the (parasite name, host name) pair for a (parasite id, host id) pair
+        """
+        p, h = mapping_node
+        if p is None:
+            return None, None
+        return self.parasite.names[p], self.host.names[h]
+
+    def compact_graph(self, graph: dict) -> CompactReconGraph:
+        """
+        :param graph: a reconciliation graph whose mapping nodes are (parasite id, host id) pairs
+        :return: the same graph as a CompactReconGraph in postorder, with the names of the trees as name tables.
+        Mapping nodes are ordered by their ids, without looking at their names.
+        """
+        n_hosts = len(self.host)
+        nodes = list(graph)
+        node_parasites = np.array([p for p, _ in nodes], dtype=np.int64)
+        node_hosts = np.array([h for _, h in nodes], dtype=np.int64)
+        event_offsets = [0]
+        event_types = []
+        child_keys = []
+        for mapping_node in nodes:
+            for etype, (p1, h1), (p2, h2) in graph[mapping_node]:
+                event_types.append(EVENT_CODES[etype])
+                child_keys.append(NO_NODE if p1 is None else p1 * n_hosts + h1)
+                child_keys.append(NO_NODE if p2 is None else p2 * n_hosts + h2)
+            event_offsets.append(len(event_types))
+
+        # Children are located by binary search over the sorted (parasite id, host id) keys of the mapping nodes
+        node_keys = node_parasites * n_hosts + node_hosts
+        order = np.argsort(node_keys)
+        child_keys = np.array(child_keys, dtype=np.int64).reshape(-1, 2)
+        children = order[np.searchsorted(node_keys[order], child_keys)]
+        children[child_keys == NO_NODE] = NO_NODE
+        return CompactReconGraph(self.parasite.names, self.host.names, node_parasites, node_hosts, event_offsets,
+                                 event_types, children[:, 0], children[:, 1]).postorder()
+
+    def named_graph(self, graph: dict) -> dict:
+        """
+        :param graph: a reconciliation graph whose mapping nodes are (parasite id, host id) pairs
+        :return: the same graph with (parasite name, host name) mapping nodes
+        """
+        named = {}
+        for mapping_node, events in graph.items():
+            named[self.mapping_node_name(mapping_node)] = [
+                (etype, self.mapping_node_name(child1), self.mapping_node_name(child2))
+                for etype, child1, child2 in events]
+        return named
+
+
+# Tables of a worker process of DPTables._fill_subtrees_in_parallel
+_subtree_worker_tables = None
+
+
+def _init_subtree_worker(tables: DPTables):
+    global _subtree_worker_tables
+    # np.zeros leaves untouched pages unallocated, so a worker only pays for the marker rows it fills
+    tables._allocate(keep_tables=False)
+    _subtree_worker_tables = tables
+
+
+def _fill_subtree(root: int) -> tuple:
+    return _subtree_worker_tables.fill_subtree(root)
+
+
+class _EventsOnDemand(dict):
+    """
+    Stands in for recongraph_tools.DP's events_dict. The events of a mapping node are read from the tables the
+    first time build_dtl_recon_graph asks for them, so only mapping nodes reachable from the best roots are visited.
+    """
+
+    def __init__(self, tables: DPTables):
+        super().__init__()
+        self.tables = tables
+
+    def __missing__(self, mapping_node: tuple) -> list:
+        events = self.tables.events(*mapping_node)
+        self[mapping_node] = events
+        return events
+
+
+def reconcile_tables(tables: DPTables, counting=mpr_counting.EXACT, compact: bool = False) -> tuple:
+    """
+    :param tables <DPTables> - filled tables of a single (unbatched) problem
+    :param counting - the mpr_counting backend of the MPR count
+    :param compact <bool> - also return the graph as a CompactReconGraph in postorder (see compact_graph), the
+    input of array_median.py
+    :return: the same values as DP, with the MPR count as a value of the counting backend, followed by the
+    CompactReconGraph if compact is set. Events already in the tables' cache are reused, and so are MPR counts
+    when counting exactly.
+    """
+    best_roots = tables.best_roots()
+    dtl_recon_graph = recongraph_tools.build_dtl_recon_graph(best_roots, tables.event_cache, {})
+    count_memo = tables.count_cache if counting is mpr_counting.EXACT else {}
+    mpr_count = counting.zero
+    for root in best_roots:
+        mpr_count = counting.add(mpr_count, recongraph_tools.count_mprs(root, dtl_recon_graph, count_memo, counting))
+    best_cost = tables.best_cost()
+
+    result = (tables.named_graph(dtl_recon_graph), best_cost, mpr_count,
+              [tables.mapping_node_name(root) for root in best_roots])
+    if compact:
+        return result + (tables.compact_graph(dtl_recon_graph),)
+    return result
+
+
+def DP(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float,
+       level_synchronous: bool = False, n_jobs: int = 1) -> Tuple[dict, float, int, list]:
+    """
+    Array-backed drop-in replacement for recongraph_tools.DP.
+    :param tree_data <_ReconInput> - host tree, parasite tree and tip mapping
+    :param dup_cost <float> - cost of a duplication event
+    :param transfer_cost <float> - cost of a transfer event
+    :param loss_cost <float> - cost of a loss event
+    :param level_synchronous <bool> - fill the tables one host level at a time (see DPTables.fill)
+    :param n_jobs <int> - number of processes to fill disjoint parasite subtrees with
+    :return: the DTL reconciliation graph, the total cost of the best reconciliation, the number of maximum
+    parsimony reconciliations, and the roots for a reconciliation graph that could produce a Maximum Parsimony
+    Reconciliation, exactly as returned by recongraph_tools.DP
+    """
+    tables = DPTables(tree_data, dup_cost, transfer_cost, loss_cost)
+    tables.fill(level_synchronous, keep_tables=False, n_jobs=n_jobs)
+    return reconcile_tables(tables)
+
+
+class ReconciliationSession:
+    """
+    Reconciles many parasite trees, such as bootstrap replicates of one gene tree, against the same host tree and
+    reuses the DP rows of every parasite subtree that was already seen in an earlier tree.
+
+    The rows and markers of a parasite node only depend on the shape of its subtree, the host tips its tips map to
+    and the costs, not on the names of its internal nodes or its position in the tree. Each subtree is therefore
+    given a canonical id made of the (parasite tip, host tip) pairs of its tips and the ids of its two subtrees,
+    and rows are kept per (subtree id, costs). Child order is part of the id because the order in which DP lists
+    events depends on it. The time to reconcile a set of replicates then grows with the number of distinct
+    clades rather than with the number of replicates times the size of the tree.
+    """
+
+    def __init__(self, host_dict: dict):
+        """
+        :param host_dict <dict> - the host tree shared by every reconciliation of the session
+        """
+        self.host_dict = host_dict
+        self.host = TreeIndex(host_dict, "hTop")
+        self.subtree_ids = {}
+        self.row_memo = {}
+        self.n_rows = 0
+        self.n_reused_rows = 0
+
+    def _row_keys(self, parasite: TreeIndex, tip_mapping: dict, costs: tuple) -> list:
+        row_keys = []
+        for p in range(len(parasite)):
+            if parasite.is_leaf(p):
+                name = parasite.names[p]
+                subtree = (name, tip_mapping[name])
+            else:
+                subtree = (row_keys[parasite.left[p]][0], row_keys[parasite.right[p]][0])
+            subtree_id = self.subtree_ids.setdefault(subtree, len(self.subtree_ids))
+            row_keys.append((subtree_id, costs))
+        return row_keys
+
+    def reconcile(self, tree_data: _ReconInput, dup_cost: float, transfer_cost: float,
+                  loss_cost: float) -> Tuple[dict, float, int, list]:
+        """
+        :param tree_data <_ReconInput> - parasite tree and tip mapping, with the session's host tree
+        :param dup_cost <float> - cost of a duplication event
+        :param transfer_cost <float> - cost of a transfer event
+        :param loss_cost <float> - cost of a loss event
+        :return: the same values as DP
+        """
+        if tree_data.host_dict != self.host_dict:
+            raise ValueError("the host tree differs from the host tree of the session")
+        tables = DPTables(tree_data, dup_cost, transfer_cost, loss_cost, host=self.host)
+        row_keys = self._row_keys(tables.parasite, tree_data.tip_mapping, (dup_cost, transfer_cost, loss_cost))
+        self.n_reused_rows += tables.fill_memoized(self.row_memo, row_keys)
+        self.n_rows += len(tables.parasite)
+        return reconcile_tables(tables)
+
+
+def DP_cost(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float) -> float:
+    """
+    Cost-only variant of DP for callers that only need the optimal cost (Monte Carlo trials, cost sweeps).
+    It fills the tables and skips all event bookkeeping, graph construction and MPR counting.
+    :return: the total cost of the best reconciliation
+    """
+    return DPTables(tree_data, dup_cost, transfer_cost, loss_cost).fill_costs()
+
+
+def DP_cost_batch(tree_data: _ReconInput, tip_mappings: list, dup_cost: float, transfer_cost: float,
+                  loss_cost: float) -> list:
+    """
+    Cost-only DP for many tip mappings of the same host and parasite trees, such as the random mappings of a
+    p-value test. All mappings are evaluated in a single traversal of the trees with one batch entry per mapping,
+    so the traversal and index setup are paid once rather than once per mapping.
+    :param tree_data <_ReconInput> - host and parasite trees (its own tip mapping is ignored)
+    :param tip_mappings <list> - list of tip mapping dictionaries
+    :return: list of the optimal cost under each tip mapping, in the same order
+    """
+    tables = DPTables(tree_data, dup_cost, transfer_cost, loss_cost, tip_mappings=tip_mappings)
+    return tables.fill_costs().tolist()
+
+
+def DP_batch(tree_data: _ReconInput, cost_triples: list) -> list:
+    """
+    Reconcile the same input under several cost triples in a single pass over the trees. Every cell of the
+    tables carries one cost per triple, so the traversal, tip-mapping lookups and table indexing are shared.
+    :param tree_data <_ReconInput> - host tree, parasite tree and tip mapping
+    :param cost_triples <list> - list of (dup_cost, transfer_cost, loss_cost) tuples
+    :return: a list with one DP result (see DP) per cost triple, in the same order
+    """
+    dup_costs, transfer_costs, loss_costs = zip(*cost_triples)
+    tables = DPTables(tree_data, dup_costs, transfer_costs, loss_costs)
+    tables.fill(keep_tables=False)
+    return [reconcile_tables(tables.batch_item(k)) for k in range(len(cost_triples))]
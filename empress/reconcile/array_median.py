@@ -0,0 +1,226 @@
+# array_median.py
+# Array-backed event frequencies and median reconciliations
+
+# median.py computes MPR counts, event frequencies and the median over a reconciliation graph dict, one mapping
+# node at a time, in an order found by sorting every mapping node with mapping_node_sort. This module does the
+# same passes over a CompactReconGraph (see recon_graph.py) whose mapping nodes are in postorder, as made by
+# CompactReconGraph.postorder or emitted by array_dp.reconcile_tables: every child of a mapping node comes before
+# it, so no sorting of names is needed.
+#
+# The passes are level-synchronous. A mapping node (p, h) only has children with a lower parasite node (S, D and T
+# events) or the same parasite node and a child of h (L events), so all mapping nodes with the same pair
+# (height of p, height of h) are independent of each other, and the children of every one of them are in
+# groups with a smaller pair. Schedule groups the mapping nodes and their events that way once, and every pass
+# then handles a whole group with a few NumPy operations:
+#
+#   - count_mprs goes up the groups, multiplying the counts of the two children of each event (missing children
+#     count one) and adding the products of the events of each mapping node
+#   - frequencies goes down the groups, giving each event its share of the frequency of its mapping node and
+#     adding it to the frequencies of its children
+#   - median_events goes up the groups, keeping for each mapping node the events of maximum (frequency - 0.5) sum
+#
+# Counts use the array methods of the mpr_counting backends. Results are the ones of median.py, up to the order
+# in which floating point frequencies are added up.
+
+from typing import Tuple
+
+import numpy as np
+
+from empress.recon_graph import CompactReconGraph, EVENT_CODES, EVENT_TYPES, NO_NODE
+from empress.reconcile import mpr_counting
+from empress.tree_index import TreeIndex
+
+_CONTEMPORARY = EVENT_CODES["C"]
+
+# Relative and absolute tolerance of median_events when comparing (frequency - 0.5) sums
+TIE_TOLERANCE = 1e-9
+
+
+class Schedule:
+    """
+    Mapping nodes and events of a postorder CompactReconGraph, grouped into levels that can each be handled at once
+    """
+
+    def __init__(self, graph: CompactReconGraph, parasite_index: TreeIndex, host_index: TreeIndex):
+        """
+        :param graph <CompactReconGraph> - graph in postorder whose name tables are the names of the two indices
+        :param parasite_index, host_index <TreeIndex> - indices of the trees of graph
+        """
+        if graph.parasite_names != parasite_index.names or graph.host_names != host_index.names:
+            raise ValueError("the name tables of the graph are not the names of the tree indices")
+        counts = np.diff(graph.event_offsets)
+        if graph.n_keys != graph.n_nodes or np.any(counts == 0):
+            raise ValueError("every mapping node of the graph must be a key with at least one event")
+        event_parents = np.repeat(np.arange(graph.n_nodes, dtype=np.int64), counts)
+        for children in (graph.event_children1, graph.event_children2):
+            if np.any(children >= event_parents):
+                raise ValueError("the graph is not in postorder")
+
+        self.graph = graph
+        self.parasite_root = parasite_index.root
+        parasite_heights = parasite_index.height_array[graph.node_parasites]
+        host_heights = host_index.height_array[graph.node_hosts]
+        levels = parasite_heights * (max(host_index.height) + 1) + host_heights
+
+        # Mapping nodes sorted by level and, within a level, in postorder; their events in the same order
+        self.node_order = np.argsort(levels, kind="stable")
+        ordered_counts = counts[self.node_order]
+        node_starts = np.zeros(graph.n_nodes + 1, dtype=np.int64)
+        np.cumsum(ordered_counts, out=node_starts[1:])
+        self.event_order = np.arange(graph.n_events, dtype=np.int64) + \
+            np.repeat(graph.event_offsets[:-1][self.node_order] - node_starts[:-1], ordered_counts)
+        self.event_parents = event_parents[self.event_order]
+        self.children1 = graph.event_children1[self.event_order].astype(np.int64)
+        self.children2 = graph.event_children2[self.event_order].astype(np.int64)
+        self.event_types = graph.event_types[self.event_order]
+
+        # Group g is node_order[node_bounds[g]:node_bounds[g + 1]], with events
+        # event_order[event_bounds[g]:event_bounds[g + 1]]. node_starts locates the events of each mapping node.
+        ordered_levels = levels[self.node_order]
+        self.node_bounds = np.concatenate(([0], np.flatnonzero(np.diff(ordered_levels)) + 1, [graph.n_nodes]))
+        self.event_bounds = node_starts[self.node_bounds]
+        self.node_starts = node_starts
+
+    def groups(self):
+        """
+        :return: an iterator over the (node slice, event slice, starts) of every group from the bottom up, where
+        starts are the positions of the first event of each mapping node within the event slice
+        """
+        for group in range(len(self.node_bounds) - 1):
+            node_start, node_end = self.node_bounds[group], self.node_bounds[group + 1]
+            event_start, event_end = self.event_bounds[group], self.event_bounds[group + 1]
+            yield slice(node_start, node_end), slice(event_start, event_end), \
+                self.node_starts[node_start:node_end] - event_start
+
+    def root_nodes(self) -> np.ndarray:
+        """
+        :return: the mapping nodes of the parasite root, in postorder
+        """
+        return np.flatnonzero(self.graph.node_parasites == self.parasite_root)
+
+
+def count_mprs(schedule: Schedule, counting=mpr_counting.EXACT, event_mask: np.ndarray = None) -> tuple:
+    """
+    :param schedule <Schedule> - schedule of the graph
+    :param counting - mpr_counting backend of the counts
+    :param event_mask <ndarray> - optional, boolean array over the events of the graph. Events outside of it are
+        left out, as if they were not in the graph.
+    :return: (node counts, event counts) as array values of the backend. Node counts are indexed by mapping node
+    and have one more entry, the count of a missing child; event counts are indexed by event.
+    """
+    graph = schedule.graph
+    node_counts = counting.array_full(graph.n_nodes + 1, counting.one)
+    event_counts = counting.array_full(graph.n_events, counting.zero)
+    mask = None if event_mask is None else event_mask[schedule.event_order]
+    for nodes, events, starts in schedule.groups():
+        # NO_NODE is -1 and reads the count of a missing child at the end
+        products = counting.array_multiply(counting.array_take(node_counts, schedule.children1[events]),
+                                           counting.array_take(node_counts, schedule.children2[events]))
+        if mask is not None:
+            products = counting.array_mask(products, mask[events])
+        counting.array_put(event_counts, schedule.event_order[events], products)
+        counting.array_put(node_counts, schedule.node_order[nodes], counting.array_segment_sum(products, starts))
+    return node_counts, event_counts
+
+
+def frequencies(schedule: Schedule, node_counts, event_counts, counting=mpr_counting.EXACT) -> tuple:
+    """
+    :param node_counts, event_counts - counts returned by count_mprs
+    :return: (node frequencies, event frequencies, number of MPRs). Frequencies are float arrays indexed by mapping
+    node and event, normalized by the number of MPRs as in median.generate_frequencies_dict.
+    """
+    graph = schedule.graph
+    roots = schedule.root_nodes()
+    mpr_count = counting.zero
+    for root in roots.tolist():
+        mpr_count = counting.add(mpr_count, counting.array_item(node_counts, root))
+
+    # The extra entry collects the frequencies given to missing children
+    node_frequencies = np.zeros(graph.n_nodes + 1, dtype=np.float64)
+    root_frequencies = np.zeros(graph.n_nodes, dtype=np.float64)
+    root_frequencies[roots] = counting.array_ratio(counting.array_take(node_counts, roots),
+                                                   counting.array_full(len(roots), mpr_count))
+    is_root = np.zeros(graph.n_nodes, dtype=bool)
+    is_root[roots] = True
+    event_frequencies = np.zeros(graph.n_events, dtype=np.float64)
+    ordered_event_counts = counting.array_take(event_counts, schedule.event_order)
+    for nodes, events, _ in reversed(list(schedule.groups())):
+        # A mapping node of the parasite root has its own share of the MPRs, even if it is also the child of a loss
+        # at another one (with a loss cost of 0), as in median.generate_frequencies_dict
+        group_roots = schedule.node_order[nodes][is_root[schedule.node_order[nodes]]]
+        node_frequencies[group_roots] = root_frequencies[group_roots]
+        parents = schedule.event_parents[events]
+        shares = node_frequencies[parents] * counting.array_ratio(
+            counting.array_take(ordered_event_counts, np.arange(events.start, events.stop)),
+            counting.array_take(node_counts, parents))
+        event_frequencies[schedule.event_order[events]] = shares
+        np.add.at(node_frequencies, schedule.children1[events], shares)
+        np.add.at(node_frequencies, schedule.children2[events], shares)
+    return node_frequencies[:-1], event_frequencies, mpr_count
+
+
+def median_events(schedule: Schedule, event_frequencies: np.ndarray, mpr_roots: list) -> Tuple[np.ndarray, list]:
+    """
+    :param event_frequencies <ndarray> - event frequencies returned by frequencies
+    :param mpr_roots <list> - mapping node indices that can be the root of an MPR
+    :return: a boolean array over the events, set for the events of maximum (frequency - 0.5) sum at their mapping
+    node, and the roots of the median reconciliations, as in median.compute_median
+    """
+    graph = schedule.graph
+    # The extra entry is the sum of a missing child
+    sums = np.zeros(graph.n_nodes + 1, dtype=np.float64)
+    best_events = np.zeros(graph.n_events, dtype=bool)
+    for nodes, events, starts in schedule.groups():
+        values = sums[schedule.children1[events]] + sums[schedule.children2[events]] + \
+            event_frequencies[schedule.event_order[events]] - 0.5
+        # Contemporaneous events have frequency 1
+        values[schedule.event_types[events] == _CONTEMPORARY] = 0.5
+        max_sums = np.maximum.reduceat(values, starts)
+        sums[schedule.node_order[nodes]] = max_sums
+        lengths = np.diff(np.append(starts, len(values)))
+        best_events[schedule.event_order[events]] = _ties(values, np.repeat(max_sums, lengths))
+    root_sums = sums[mpr_roots]
+    best_roots = _ties(root_sums, root_sums.max())
+    return best_events, [root for root, best in zip(mpr_roots, best_roots.tolist()) if best]
+
+
+def _ties(values: np.ndarray, max_values) -> np.ndarray:
+    """
+    :return: which values equal their maximum. Sums that are equal in exact arithmetic can differ in their last
+    bits depending on the order frequencies were added up in, so they are compared with a tolerance.
+    """
+    return np.isclose(values, max_values, rtol=TIE_TOLERANCE, atol=TIE_TOLERANCE)
+
+
+def choose_random_median(graph: CompactReconGraph, best_events: np.ndarray, median_roots: list,
+                         median_node_counts: np.ndarray, median_event_counts: np.ndarray) -> dict:
+    """
+    :param best_events, median_roots - returned by median_events
+    :param median_node_counts, median_event_counts - exact counts of count_mprs with best_events as the event mask
+    :return: a median reconciliation drawn uniformly at random, as a reconciliation graph dict with one event per
+    mapping node. Random choices are made in the same order and with the same weights as
+    median.choose_random_median_wrapper.
+    """
+    total_medians = 0.0
+    for root in median_roots:
+        total_medians += median_node_counts[root]
+    root = median_roots[np.random.choice(len(median_roots), p=[median_node_counts[root] / total_medians
+                                                               for root in median_roots])]
+
+    random_median = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        total_medians = float(median_node_counts[node])
+        events = [event for event in graph.node_events(node) if best_events[event]]
+        event = events[np.random.choice(len(events), p=[median_event_counts[event] / total_medians
+                                                         for event in events])]
+        child1 = int(graph.event_children1[event])
+        child2 = int(graph.event_children2[event])
+        random_median[graph.node_name(node)] = [(EVENT_TYPES[graph.event_types[event]], graph.node_name(child1),
+                                                 graph.node_name(child2))]
+        if child2 != NO_NODE:
+            stack.append(child2)
+        if child1 != NO_NODE:
+            stack.append(child1)
+    return random_median
@@ -0,0 +1,104 @@
+# batch.py
+# Reconciles many parasite (gene) trees against a single host tree
+
+# A manifest lists one family per line: the parasite tree file, the tip mapping file and an optional family name
+# (by default the name of the parasite file without its suffix), separated by whitespace. Relative paths are
+# relative to the manifest. Empty lines and lines starting with # are skipped.
+#
+# The host tree is read and indexed once, and every worker process gets a copy of it when it starts, so each
+# family only costs reading its own files and running the DP.
+
+import concurrent.futures
+from pathlib import Path
+from typing import Iterator
+
+from empress.input_reader import _ReconInput, ReconInputError
+from empress.reconcile import array_dp
+
+# Fields of the records yielded by reconcile_families, in output order
+RECORD_FIELDS = ["family", "parasite", "mapping", "cost", "n_recon", "error"]
+
+# Host tree and host index of the current process, set by _init_host
+_host_input = None
+_host_index = None
+
+
+def read_manifest(file_name: str) -> list:
+    """
+    :param file_name <str> - path of the manifest file
+    :return: list of (family name, parasite file name, mapping file name) tuples, in manifest order
+    """
+    manifest_dir = Path(file_name).parent
+    families = []
+    with open(file_name) as manifest_file:
+        for line_number, line in enumerate(manifest_file, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            if len(fields) not in (2, 3):
+                raise ReconInputError("line %d of manifest %s should be '<parasite_file> <mapping_file> [<name>]'"
+                                      % (line_number, file_name))
+            parasite_fname = str(manifest_dir / fields[0])
+            mapping_fname = str(manifest_dir / fields[1])
+            name = fields[2] if len(fields) == 3 else Path(fields[0]).stem
+            families.append((name, parasite_fname, mapping_fname))
+    return families
+
+
+def _init_host(host_input: _ReconInput):
+    global _host_input, _host_index
+    _host_input = host_input
+    _host_index = host_input.host_index
+
+
+def _reconcile_family(family: tuple, dup_cost: float, transfer_cost: float, loss_cost: float) -> dict:
+    """
+    Reconcile one family against the host tree of this process.
+    :return: the record of the family (see RECORD_FIELDS). A family whose files cannot be read or reconciled gets
+    its error message instead of a cost.
+    """
+    name, parasite_fname, mapping_fname = family
+    record = {"family": name, "parasite": parasite_fname, "mapping": mapping_fname,
+              "cost": None, "n_recon": None, "error": None}
+    recon_input = _ReconInput(_host_input.host_dict, _host_input.host_distances)
+    try:
+        recon_input.read_parasite(parasite_fname)
+        recon_input.read_mapping(mapping_fname)
+        tables = array_dp.DPTables(recon_input, dup_cost, transfer_cost, loss_cost, host=_host_index)
+        tables.fill(keep_tables=False)
+        _, cost, n_recon, _ = array_dp.reconcile_tables(tables)
+    except (ReconInputError, ValueError) as e:
+        # A family that cannot be reconciled (e.g. a parasite tip left out of the mapping) must not stop the others
+        record["error"] = str(e)
+        return record
+    record["cost"], record["n_recon"] = cost, n_recon
+    return record
+
+
+def reconcile_families(host_fname: str, families: list, dup_cost: float, transfer_cost: float, loss_cost: float,
+                       n_jobs: int = 1) -> Iterator[dict]:
+    """
+    Reconcile every family against the same host tree.
+    :param host_fname <str> - path of the host tree file
+    :param families <list> - list of (family name, parasite file name, mapping file name) tuples,
+        see read_manifest
+    :param dup_cost <float> - cost of a duplication event
+    :param transfer_cost <float> - cost of a transfer event
+    :param loss_cost <float> - cost of a loss event
+    :param n_jobs <int> - number of processes to reconcile families in
+    :return: an iterator over one record per family (a dictionary with the keys in RECORD_FIELDS). With more than
+        one process, records come in the order the families finish, as soon as they do.
+    """
+    host_input = _ReconInput()
+    host_input.read_host(host_fname)
+    if n_jobs == 1:
+        _init_host(host_input)
+        for family in families:
+            yield _reconcile_family(family, dup_cost, transfer_cost, loss_cost)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_host,
+                                                initargs=(host_input,)) as executor:
+        futures = [executor.submit(_reconcile_family, family, dup_cost, transfer_cost, loss_cost)
+                   for family in families]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
@@ -94,9 +94,9 @@ import sys
 
 def reformat_tree(tree, root):
     """
-    A recursive function that changes the format of a (species or gene) tree from edge to vertex, as described
-    above. It returns the tree (in postorder), the root of the tree, and the number of nodes in the tree. The base
-    case of this function is when there are no children for a given root.
+    Changes the format of a (species or gene) tree from edge to vertex, as described
+    above. It returns the tree (in postorder), the root of the tree, and the number of nodes in the tree. The tree
+    is walked with an explicit stack, so deep trees do not reach the recursion limit.
     :param tree <dict>                 - a tree in edge format
     :param root <str> | <tuple>        - the root of that tree
     :return                            0 <dict> - the new vertex based tree,
@@ -107,26 +107,24 @@ def reformat_tree(tree, root):
     # This line catches the "xTop" handle and replaces
     new_root = root[1] if isinstance(root, tuple) else tree[root][1]
 
-    child1 = tree[root][2][1] if tree[root][2] is not None else None  # These lines handle the leaves, where
-    child2 = tree[root][3][1] if tree[root][3] is not None else None  # there is None in the place of a tuple
-
-    # This is the tree that we will be returning. We will add the subtrees of our children first, then add this node.
+    # This is the tree that we will be returning. The subtrees of a node's children are added first, then the node.
     new_vertex_tree = OrderedDict()  # This has to be an OrderedDict, otherwise we can't guarantee it's in postorder
 
-    # This is the number of nodes in the subtree rooted at each of our children
-    # We actually don't need to calculate this here at all, since the count will just be the length of new_vertex_tree
-    child1_count = 0
-    child2_count = 0
-
-    if child1 is not None:  # If this node has children, then we need to add their children's subtrees to the dict
-        child1_tree, _, child1_count = reformat_tree(tree, tree[root][2])
-        new_vertex_tree.update(child1_tree)
-    if child2 is not None:
-        child2_tree, _, child2_count = reformat_tree(tree, tree[root][3])
-        new_vertex_tree.update(child2_tree)
-    new_vertex_tree.update({new_root: (child1, child2)})  # We add this node last, to ensure postorderness.
+    # Each edge is pushed once to add its children's subtrees and once more to add its own vertex after them
+    stack = [(root, False)]
+    while stack:
+        edge, children_done = stack.pop()
+        vertex = edge[1] if isinstance(edge, tuple) else tree[edge][1]
+        child1 = tree[edge][2][1] if tree[edge][2] is not None else None  # These lines handle the leaves, where
+        child2 = tree[edge][3][1] if tree[edge][3] is not None else None  # there is None in the place of a tuple
+        if children_done or child1 is None:
+            new_vertex_tree[vertex] = (child1, child2)
+        else:
+            stack.append((edge, True))
+            stack.append((tree[edge][3], False))
+            stack.append((tree[edge][2], False))
 
-    return new_vertex_tree, new_root, (child1_count + child2_count + 1)
+    return new_vertex_tree, new_root, len(new_vertex_tree)
 
 
 def intersect_cost(event):
@@ -0,0 +1,189 @@
+# graph_export.py
+# Streaming export of reconciliation graphs to CSV and JSON lines
+
+# Rows are produced one mapping node at a time, in the order of recongraph_tools.node_search_order, and written in
+# chunks of chunk_rows rows: each chunk is formatted into one string and handed to the file in a single write, so
+# memory stays bounded by the chunk and the traversal state no matter how large the graph is. The default columns
+# are the ones of recongraph_tools.export_csv, which writes the same rows.
+#
+# A CompactReconGraph (recon_graph.py) is walked over its integer arrays, with a bitmap of visited nodes instead of
+# a set of mapping node tuples, and its frequencies are read from its aligned arrays when no dicts are given.
+#
+# The format and compression follow the file name unless they are given: ".jsonl" selects JSON lines and a ".gz"
+# suffix gzip.
+
+import csv
+import gzip
+import io
+import json
+from typing import Dict
+
+import numpy as np
+
+from empress.recon_graph import CompactReconGraph, EVENT_TYPES, NO_NODE
+from empress.reconcile import recongraph_tools
+
+# Every column a row can have, in the order of a full row
+COLUMNS = ("parasite", "host", "event", "node_frequency", "event_frequency", "child1_parasite", "child1_host",
+           "child2_parasite", "child2_host")
+DEFAULT_COLUMNS = COLUMNS[:5]
+
+FORMATS = ("csv", "jsonl")
+
+DEFAULT_CHUNK_ROWS = 10000
+
+_EVENT_NAMES = tuple(recongraph_tools.event_str(event_type) for event_type in EVENT_TYPES)
+
+
+def infer_format(filename: str) -> tuple:
+    """
+    :return: the (format, compress) pair given by the suffixes of filename, ("csv", False) if they say nothing
+    """
+    name = str(filename)
+    compress = name.endswith(".gz")
+    if compress:
+        name = name[:-len(".gz")]
+    return ("jsonl" if name.endswith(".jsonl") else "csv"), compress
+
+
+def _dict_rows(graph: dict, roots: list, event_freqs: Dict[tuple, float], node_freqs: Dict[tuple, float]):
+    """
+    :return: an iterator over the full rows of a reconciliation graph dict
+    """
+    for node in recongraph_tools.node_search_order(graph, roots):
+        parasite, host = node
+        map_freq = node_freqs[node]
+        for event in graph[node]:
+            event_type, (child1_parasite, child1_host), (child2_parasite, child2_host) = event
+            yield (parasite, host, recongraph_tools.event_str(event_type), map_freq, event_freqs[event],
+                   child1_parasite, child1_host, child2_parasite, child2_host)
+
+
+def _compact_rows(graph: CompactReconGraph, roots: list, event_freqs: Dict[tuple, float],
+                  node_freqs: Dict[tuple, float]):
+    """
+    :return: an iterator over the full rows of a CompactReconGraph, in the same order as _dict_rows
+    """
+    if event_freqs is None and graph.event_frequencies is None or \
+            node_freqs is None and graph.node_frequencies is None:
+        raise ValueError("the graph has no frequencies to export")
+    offsets = graph.event_offsets
+    event_types = graph.event_types
+    children1 = graph.event_children1
+    children2 = graph.event_children2
+    array_event_freqs = graph.event_frequencies
+    array_node_freqs = graph.node_frequencies
+    parasite_names = graph.parasite_names
+    host_names = graph.host_names
+    node_parasites = graph.node_parasites
+    node_hosts = graph.node_hosts
+
+    def names(node):
+        if node == NO_NODE:
+            return None, None
+        return parasite_names[node_parasites[node]], host_names[node_hosts[node]]
+
+    root_ids = [graph.node_id(root) for root in roots]
+    visited = np.zeros(graph.n_nodes, dtype=bool)
+    visited[root_ids] = True
+    stack = root_ids
+    while stack:
+        node = stack.pop()
+        start, end = offsets[node:node + 2].tolist()
+        node_children1 = children1[start:end].tolist()
+        node_children2 = children2[start:end].tolist()
+        for child1, child2 in zip(node_children1, node_children2):
+            for child in (child1, child2):
+                if child != NO_NODE and not visited[child]:
+                    visited[child] = True
+                    stack.append(child)
+
+        parasite, host = names(node)
+        map_freq = node_freqs[(parasite, host)] if node_freqs is not None else float(array_node_freqs[node])
+        for event, event_type, child1, child2 in zip(range(start, end), event_types[start:end].tolist(),
+                                                     node_children1, node_children2):
+            child1_parasite, child1_host = names(child1)
+            child2_parasite, child2_host = names(child2)
+            if event_freqs is not None:
+                event_freq = event_freqs[(EVENT_TYPES[event_type], (child1_parasite, child1_host),
+                                          (child2_parasite, child2_host))]
+            else:
+                event_freq = float(array_event_freqs[event])
+            yield (parasite, host, _EVENT_NAMES[event_type], map_freq, event_freq, child1_parasite, child1_host,
+                   child2_parasite, child2_host)
+
+
+def iter_rows(graph, roots: list, event_freqs: Dict[tuple, float] = None, node_freqs: Dict[tuple, float] = None,
+              columns=DEFAULT_COLUMNS):
+    """
+    :param graph - reconciliation graph dict or CompactReconGraph
+    :param roots <list> - mapping nodes to start the traversal from
+    :param event_freqs, node_freqs <dict> - frequencies of the events and mapping nodes. They can be left out for
+        a CompactReconGraph that has frequency arrays.
+    :param columns - names from COLUMNS
+    :return: an iterator over the rows of the graph, as tuples of the selected columns
+    """
+    positions = [COLUMNS.index(column) for column in columns]
+    if isinstance(graph, CompactReconGraph):
+        rows = _compact_rows(graph, roots, event_freqs, node_freqs)
+    else:
+        rows = _dict_rows(graph, roots, event_freqs, node_freqs)
+    if positions == list(range(len(COLUMNS))):
+        return rows
+    return (tuple(row[position] for position in positions) for row in rows)
+
+
+def _chunks(rows, chunk_rows: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_graph(filename: str, graph, roots: list, event_freqs: Dict[tuple, float] = None,
+                 node_freqs: Dict[tuple, float] = None, columns=DEFAULT_COLUMNS, file_format: str = None,
+                 compress: bool = None, header: bool = False, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    """
+    Write the rows of iter_rows to filename
+    :param file_format <str> - "csv" or "jsonl", taken from filename if None
+    :param compress <bool> - whether to gzip the file, taken from filename if None
+    :param header <bool> - whether a CSV file starts with a row of column names (JSON lines are always named)
+    :param chunk_rows <int> - number of rows formatted and written at once
+    :return: the number of rows written
+    """
+    for column in columns:
+        if column not in COLUMNS:
+            raise ValueError("unknown column %s, columns are %s" % (column, ", ".join(COLUMNS)))
+    inferred_format, inferred_compress = infer_format(filename)
+    file_format = inferred_format if file_format is None else file_format
+    compress = inferred_compress if compress is None else compress
+    if file_format not in FORMATS:
+        raise ValueError("unknown format %s, formats are %s" % (file_format, ", ".join(FORMATS)))
+
+    if compress:
+        output_file = gzip.open(filename, "wt", newline="")
+    else:
+        output_file = open(filename, "w", newline="")
+    n_rows = 0
+    with output_file:
+        buffer = io.StringIO()
+        if file_format == "csv":
+            writer = csv.writer(buffer)
+            if header:
+                writer.writerow(columns)
+        for chunk in _chunks(iter_rows(graph, roots, event_freqs, node_freqs, columns), chunk_rows):
+            if file_format == "csv":
+                writer.writerows(chunk)
+            else:
+                buffer.writelines(json.dumps(dict(zip(columns, row))) + "\n" for row in chunk)
+            output_file.write(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+            n_rows += len(chunk)
+        # A header without rows
+        output_file.write(buffer.getvalue())
+    return n_rows
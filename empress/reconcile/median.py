@@ -29,7 +29,8 @@ from operator import itemgetter
 
 import numpy as np
 
-from empress.reconcile import recongraph_tools, diameter
+from empress.reconcile import recongraph_tools, diameter, mpr_counting
+from empress.tree_index import TreeIndex
 
 def mapping_node_sort(ordered_gene_node_list, ordered_species_node_list, mapping_node_list):
     """
@@ -38,6 +39,7 @@ def mapping_node_sort(ordered_gene_node_list, ordered_species_node_list, mapping
     or post-) in which this tree is passed determines the final order - a preorder gene node list will
     return mapping nodes sorted in preorder. The species and gene orderings must match.
     :param ordered_species_node_list: same as for the gene node list above, except for the species tree
+    Either list can also be a TreeIndex, whose nodes are in postorder.
     :param mapping_node_list: a list of all mapping nodes within a given reconciliation graph
     :return: the given mapping nodes except sorted in the order corresponding to the order in which
     the species and gene nodes are passed in (see description of ordered_gene_node_list for more on this).
@@ -46,37 +48,41 @@ def mapping_node_sort(ordered_gene_node_list, ordered_species_node_list, mapping
 
     # In order to sort the mapping nodes, we need a way to convert them into numbers. These two lookup tables allow
     # us to achieve a lexicographical ordering with gene nodes more significant than species nodes.
-    gene_level_lookup = {}
-    species_level_lookup = {}
-
-    # By multiplying the gene node keys by the number of species nodes, we can ensure that a mapping node with a later
-    # gene node always comes before one with a later species node, because a gene node paired with the last species
-    # node will be one level less than the next gene node paired with the first species node.
+    # A TreeIndex already numbers its nodes in postorder
+    def positions(ordered_node_list):
+        if isinstance(ordered_node_list, TreeIndex):
+            return ordered_node_list.ids
+        return {node: i for i, node in enumerate(ordered_node_list)}
+
+    gene_level_lookup = positions(ordered_gene_node_list)
+    species_level_lookup = positions(ordered_species_node_list)
+
+    # By multiplying the gene node levels by the number of species nodes, we can ensure that a mapping node with a
+    # later gene node always comes before one with a later species node, because a gene node paired with the last
+    # species node will be one level less than the next gene node paired with the first species node.
     gene_multiplier = len(ordered_species_node_list)
 
-    for i1, gene_node in enumerate(ordered_gene_node_list):
-        gene_level_lookup[gene_node] = i1 * gene_multiplier
-
-    for i2, species_node in enumerate(ordered_species_node_list):
-        species_level_lookup[species_node] = i2
-
     # The lambda function looks up the level of both the gene node and the species nodes and adds them together to
     # get a number to give to the sorting algorithm for that mapping node. The gene node is weighted far more heavily
     # than the species node to make sure it is always more significant.
-    sorted_list = sorted(mapping_node_list, key=lambda node: gene_level_lookup[node[0]] + species_level_lookup[node[1]])
+    sorted_list = sorted(mapping_node_list,
+                         key=lambda node: gene_level_lookup[node[0]] * gene_multiplier + species_level_lookup[node[1]])
 
     return sorted_list
 
 
-def generate_frequencies_dict(preorder_mapping_node_list, recon_graph, gene_root, normalize=True):
+def generate_frequencies_dict(preorder_mapping_node_list, recon_graph, gene_root, normalize=True,
+                              counting=mpr_counting.EXACT):
     """
     Computes frequencies for every event
     :param preorder_mapping_node_list: A list of all mapping nodes in DTLReconGraph in double preorder
     :param recon_graph: The reconciliation graph whose events we want to compute the corresponding frequencies
     :param gene_root: The root of the gene tree
+    :param counting: the mpr_counting backend used to count MPRs. With any backend other than the exact one, the
+    frequencies are computed from ratios of counts and are always normalized.
     :return: 0. A file structured like the DTLReconGraph, but with the lists of events replaced
                 with dicts, where the keys are the events and the values are the frequencies of those events, and
-             1. The number of MPRs in DTLReconGraph.
+             1. The number of MPRs in DTLReconGraph, as a value of the counting backend.
     """
 
     # Initialize the dictionary that will store mapping node and event counts (which also acts as a memoization
@@ -84,14 +90,14 @@ def generate_frequencies_dict(preorder_mapping_node_list, recon_graph, gene_root
     counts = dict()
 
     # Initialize the very start count, for the first call of count_mprs
-    count = 0
+    count = counting.zero
 
     # Loop over all given minimum cost reconciliation roots
     for mapping_node in preorder_mapping_node_list:
         if mapping_node[0] == gene_root:
 
             # This will also populate the counts dictionary with the number of MPRs each event and mapping node is in
-            count += count_mprs(mapping_node, recon_graph, counts)
+            count = counting.add(count, count_mprs(mapping_node, recon_graph, counts, counting))
 
     # This dict contains the frequency of each mapping node
     node_frequencies = dict()
@@ -110,12 +116,15 @@ def generate_frequencies_dict(preorder_mapping_node_list, recon_graph, gene_root
     for mapping_node in preorder_mapping_node_list:
         # If we are at the root of the gene tree, then we need to initialize the frequency entry
         if mapping_node[0] == gene_root:
-            node_frequencies[mapping_node] = counts[mapping_node]
+            if counting is mpr_counting.EXACT:
+                node_frequencies[mapping_node] = counts[mapping_node]
+            else:
+                node_frequencies[mapping_node] = counting.ratio(counts[mapping_node], count)
         # This fills up the event frequency dictionary
         calculate_event_frequencies_for_children(mapping_node, recon_graph, event_frequencies, node_frequencies,
-                                                 counts)
+                                                 counts, counting)
 
-    if normalize:
+    if normalize and counting is mpr_counting.EXACT:
         # Normalize all of the event_frequencies by the number of MPRs
         # so that each frequency is out of 1
         for mapping_node in preorder_mapping_node_list:
@@ -126,17 +135,18 @@ def generate_frequencies_dict(preorder_mapping_node_list, recon_graph, gene_root
     return node_frequencies, event_frequencies, count
 
 
-def count_mprs(mapping_node, recon_graph, counts):
+def count_mprs(mapping_node, recon_graph, counts, counting=mpr_counting.EXACT):
     """
     :param mapping_node: an individual mapping node that maps a node
     for the parasite tree onto a node of the host tree, in the format
     (p, h), where p is the parasite node and h is the host node
     :param recon_graph: The reconciliation graph whose events we want to compute the corresponding frequencies
-    :param counts: a dictionary representing the running memo that is passed
-    down recursive calls of this function. At first it is just an empty
-    dictionary (see above function), but as it gets passed down calls, it collects
+    :param counts: a dictionary representing the running memo that is shared
+    between calls of this function. At first it is just an empty
+    dictionary (see above function), but as it gets passed between calls, it collects
     keys of mapping nodes or event nodes and values of MPR counts. This memo improves runtime
     of the algorithm
+    :param counting: the mpr_counting backend the counts are computed with, exact integers by default
     :return: the number of MPRs spawned below the given mapping node in the graph
     """
 
@@ -146,30 +156,45 @@ def count_mprs(mapping_node, recon_graph, counts):
 
     # Base case, occurs if being called on a child produced by a loss or contemporary event
     if mapping_node == (None, None):
-        return 1
+        return counting.one
 
-    # Initialize a variable to keep count of the number of MPRs
-    count = 0
+    # Depth-first traversal with an explicit stack: a mapping node is pushed once to count its children and once
+    # more to be counted itself, when all of its children are in counts
+    stack = [(mapping_node, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if node in counts:
+            continue
+        if not children_done:
+            stack.append((node, True))
+            for eventNode in recon_graph[node]:
+                for mapping_child in (eventNode[1], eventNode[2]):
+                    if mapping_child != (None, None) and mapping_child not in counts:
+                        stack.append((mapping_child, False))
+            continue
 
-    # Loop over all event nodes corresponding to the current mapping node
-    for eventNode in recon_graph[mapping_node]:
+        # Initialize a variable to keep count of the number of MPRs
+        count = counting.zero
 
-        # Save the children produced by the current event
-        mapping_child1 = eventNode[1]
-        mapping_child2 = eventNode[2]
+        # Loop over all event nodes corresponding to the current mapping node
+        for eventNode in recon_graph[node]:
 
-        # Add the product of the counts of both children (over all children) for this event to get the parent's count
-        counts[eventNode] = count_mprs(mapping_child1, recon_graph, counts) * count_mprs(mapping_child2,
-                                                                                         recon_graph, counts)
-        count += counts[eventNode]
+            # Save the counts of the children produced by the current event
+            child1_count = counting.one if eventNode[1] == (None, None) else counts[eventNode[1]]
+            child2_count = counting.one if eventNode[2] == (None, None) else counts[eventNode[2]]
 
-    # Save the result in the counts
-    counts[mapping_node] = count
+            # Add the product of the counts of both children for this event to get the parent's count
+            counts[eventNode] = counting.multiply(child1_count, child2_count)
+            count = counting.add(count, counts[eventNode])
 
-    return count
+        # Save the result in the counts
+        counts[node] = count
 
+    return counts[mapping_node]
 
-def calculate_event_frequencies_for_children(mapping_node, dtl_recon_graph, event_frequencies, node_frequencies, counts):
+
+def calculate_event_frequencies_for_children(mapping_node, dtl_recon_graph, event_frequencies, node_frequencies, counts,
+                                             counting=mpr_counting.EXACT):
     """
     This function calculates the frequency for every mapping node that is a child of an event node that is a
     child of the given mapping node, and stores them in dtl_recon_graph.
@@ -180,6 +205,7 @@ def calculate_event_frequencies_for_children(mapping_node, dtl_recon_graph, even
     function helps build up
     :param counts: The counts generated in countMPRs (from the bottom-up). Note that the counts are filled during a
     bottom-up traversal, and the frequencies are filled in during a top-down traversal after the counts
+    :param counting: the mpr_counting backend of the counts
     :return: Nothing, but frequencies are built up.
     """
 
@@ -187,12 +213,17 @@ def calculate_event_frequencies_for_children(mapping_node, dtl_recon_graph, even
 
     # This multiplier results in  counts[event_node] / counts[mapping_node] for each event node, which is the % of
     # this mapping node's frequencies (node_frequencies[mapping_node]) that it gives to each event node.
-    multiplier = float(node_frequencies[mapping_node]) / counts[mapping_node]
+    if counting is mpr_counting.EXACT:
+        multiplier = float(node_frequencies[mapping_node]) / counts[mapping_node]
 
     # Iterate over every event
     for event_node in dtl_recon_graph[mapping_node]:
 
-        event_frequencies[event_node] = multiplier * counts[event_node]
+        if counting is mpr_counting.EXACT:
+            event_frequencies[event_node] = multiplier * counts[event_node]
+        else:
+            event_frequencies[event_node] = node_frequencies[mapping_node] * \
+                                            counting.ratio(counts[event_node], counts[mapping_node])
 
         # Save the children produced by the current event
         mapping_child1 = event_node[1]
@@ -342,8 +373,8 @@ def choose_random_median_wrapper(median_recon, med_roots, count_dict):
 def choose_random_median(median_recon, map_node, count_dict):
     """
     :param median_recon: the full median reconciliation graph, as returned by compute_median
-    :param map_node: the current mapping node in the median reconciliation that we're trying
-    to find a path from. In the first call, this mapping node will be one of the root mapping
+    :param map_node: the mapping node in the median reconciliation that we're trying
+    to find a path from. This will usually be one of the root mapping
     nodes for the median reconciliation graph, randomly selected
     :param count_dict: a dictionary that tells us how many total medians a given event node can spawn
     :return: a single-path reconciliation graph that is a sub-graph of the median. It is chosen
@@ -354,25 +385,31 @@ def choose_random_median(median_recon, map_node, count_dict):
     # Initialize the dictionary that will store the final single-path median that we choose
     random_submedian = dict()
 
-    # Find the total number of medians we can get from the current mapping node
-    total_meds = float(count_dict[map_node])
+    # Mapping nodes still to be given an event. The first child of an event is handled (with all of its descendants)
+    # before the second, so the random choices are made in depth-first preorder
+    stack = [map_node]
+    while stack:
+        map_node = stack.pop()
+
+        # Find the total number of medians we can get from the current mapping node
+        total_meds = float(count_dict[map_node])
 
-    # Use a convoluted numpy workaround to select tuples (events) from a list, taking into account
-    # how many medians each event can produce
-    next_event = median_recon[map_node][np.random.choice(len(median_recon[map_node]),
-                                                         p=[count_dict[event] / total_meds for event in
-                                                            median_recon[map_node]])]
+        # Use a convoluted numpy workaround to select tuples (events) from a list, taking into account
+        # how many medians each event can produce
+        next_event = median_recon[map_node][np.random.choice(len(median_recon[map_node]),
+                                                             p=[count_dict[event] / total_meds for event in
+                                                                median_recon[map_node]])]
 
-    random_submedian.update({map_node: [next_event]})
+        random_submedian.update({map_node: [next_event]})
 
-    # Check for a loss
-    if next_event[0] == 'L':
-        random_submedian.update(choose_random_median(median_recon, next_event[1], count_dict))
+        # Check for a loss
+        if next_event[0] == 'L':
+            stack.append(next_event[1])
 
-    # Check for events that produce two children
-    elif next_event[0] in ['T', 'S', 'D']:
-        random_submedian.update(choose_random_median(median_recon, next_event[1], count_dict))
-        random_submedian.update(choose_random_median(median_recon, next_event[2], count_dict))
+        # Check for events that produce two children
+        elif next_event[0] in ['T', 'S', 'D']:
+            stack.append(next_event[2])
+            stack.append(next_event[1])
 
     # Make sure our single path median is indeed a subgraph of the median
     assert check_subgraph(median_recon, random_submedian), 'The randomly chosen single-path median is not a subgraph ' \
@@ -388,12 +425,14 @@ def usage():
 
     return 'usage: DTLMedian filename dup_cost transfer_cost loss_cost [-r] [-n]'
 
-def get_median_graph(recon_graph, postorder_gene_tree, postorder_species_tree, gene_tree_root, best_roots):
+def get_median_graph(recon_graph, postorder_gene_tree, postorder_species_tree, gene_tree_root, best_roots,
+                     counting=mpr_counting.EXACT):
     # Get a list of the mapping nodes in preorder
     postorder_mapping_node_list = mapping_node_sort(postorder_gene_tree, postorder_species_tree,
                                                     list(recon_graph.keys()))
     # Find the dictionary for frequencies for the given mapping nodes and graph, and the given gene root
-    _, event_frequencies, _ = generate_frequencies_dict(postorder_mapping_node_list[::-1], recon_graph, gene_tree_root)
+    _, event_frequencies, _ = generate_frequencies_dict(postorder_mapping_node_list[::-1], recon_graph, gene_tree_root,
+                                                        counting=counting)
 
     # Now find the median and related info
     median_graph, n_meds, roots_for_median = compute_median(recon_graph, event_frequencies,
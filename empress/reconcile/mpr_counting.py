@@ -0,0 +1,210 @@
+# mpr_counting.py
+# Numeric backends for counting maximum parsimony reconciliations (MPRs)
+
+# MPR counts are sums of products over the reconciliation graph and grow exponentially with the size of the
+# trees. The exact backend counts with Python integers, which is exact but gets slow on huge graphs, and turning
+# a count above about 1e308 into a float overflows. The log backend keeps the natural log of every count and
+# adds with log-sum-exp, so counts and frequencies stay fast and finite. The modular backend keeps the same log
+# together with the count modulo a large prime, which identifies counts exactly (two graphs with different
+# residues have different counts) without big integers.
+#
+# A backend provides zero, one, add, multiply, ratio (a / b as a float, used for frequencies) and n_recon
+# (the number reported as ReconGraphWrapper.n_recon: the count itself for the exact backend, its log10 otherwise).
+#
+# The array_* methods do the same on whole NumPy arrays of counts, for the passes of array_median.py: exact
+# counts are object arrays of Python integers, log counts float arrays, and modular counts (log array, residue
+# array) pairs. array_segment_sum adds up consecutive runs of values, as np.add.reduceat does.
+
+import math
+
+import numpy as np
+
+Infinity = float('inf')
+
+
+class ExactCounting:
+    name = "exact"
+    zero = 0
+    one = 1
+
+    @staticmethod
+    def add(a: int, b: int) -> int:
+        return a + b
+
+    @staticmethod
+    def multiply(a: int, b: int) -> int:
+        return a * b
+
+    @staticmethod
+    def ratio(a: int, b: int) -> float:
+        return a / b
+
+    @staticmethod
+    def n_recon(a: int) -> int:
+        return a
+
+    @staticmethod
+    def array_full(n: int, value: int) -> np.ndarray:
+        return np.full(n, value, dtype=object)
+
+    @staticmethod
+    def array_take(values: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        return values[indices]
+
+    @staticmethod
+    def array_put(values: np.ndarray, indices: np.ndarray, new_values: np.ndarray):
+        values[indices] = new_values
+
+    @staticmethod
+    def array_item(values: np.ndarray, index: int) -> int:
+        return values[index]
+
+    @staticmethod
+    def array_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return a * b
+
+    @staticmethod
+    def array_mask(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return np.where(mask, values, 0)
+
+    @staticmethod
+    def array_segment_sum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        return np.add.reduceat(values, starts)
+
+    @staticmethod
+    def array_ratio(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return (a / b).astype(np.float64)
+
+
+class LogCounting:
+    name = "log"
+    zero = -Infinity
+    one = 0.0
+
+    @staticmethod
+    def add(a: float, b: float) -> float:
+        if a < b:
+            a, b = b, a
+        if b == -Infinity:
+            return a
+        return a + math.log1p(math.exp(b - a))
+
+    @staticmethod
+    def multiply(a: float, b: float) -> float:
+        return a + b
+
+    @staticmethod
+    def ratio(a: float, b: float) -> float:
+        return math.exp(a - b)
+
+    @staticmethod
+    def n_recon(a: float) -> float:
+        return a / math.log(10)
+
+    @staticmethod
+    def array_full(n: int, value: float) -> np.ndarray:
+        return np.full(n, value, dtype=np.float64)
+
+    @staticmethod
+    def array_take(values: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        return values[indices]
+
+    @staticmethod
+    def array_put(values: np.ndarray, indices: np.ndarray, new_values: np.ndarray):
+        values[indices] = new_values
+
+    @staticmethod
+    def array_item(values: np.ndarray, index: int) -> float:
+        return float(values[index])
+
+    @staticmethod
+    def array_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return a + b
+
+    @staticmethod
+    def array_mask(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return np.where(mask, values, -Infinity)
+
+    @staticmethod
+    def array_segment_sum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        return np.logaddexp.reduceat(values, starts)
+
+    @staticmethod
+    def array_ratio(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.exp(a - b)
+
+
+class ModularCounting:
+    """
+    Values are (natural log of the count, count modulo MODULUS) pairs.
+    """
+    name = "modular"
+    MODULUS = 2 ** 61 - 1
+    zero = (-Infinity, 0)
+    one = (0.0, 1)
+
+    @staticmethod
+    def add(a: tuple, b: tuple) -> tuple:
+        return LogCounting.add(a[0], b[0]), (a[1] + b[1]) % ModularCounting.MODULUS
+
+    @staticmethod
+    def multiply(a: tuple, b: tuple) -> tuple:
+        return a[0] + b[0], (a[1] * b[1]) % ModularCounting.MODULUS
+
+    @staticmethod
+    def ratio(a: tuple, b: tuple) -> float:
+        return math.exp(a[0] - b[0])
+
+    @staticmethod
+    def n_recon(a: tuple) -> float:
+        return a[0] / math.log(10)
+
+    @staticmethod
+    def array_full(n: int, value: tuple) -> tuple:
+        return np.full(n, value[0], dtype=np.float64), np.full(n, value[1], dtype=object)
+
+    @staticmethod
+    def array_take(values: tuple, indices: np.ndarray) -> tuple:
+        return values[0][indices], values[1][indices]
+
+    @staticmethod
+    def array_put(values: tuple, indices: np.ndarray, new_values: tuple):
+        values[0][indices] = new_values[0]
+        values[1][indices] = new_values[1]
+
+    @staticmethod
+    def array_item(values: tuple, index: int) -> tuple:
+        return float(values[0][index]), values[1][index]
+
+    @staticmethod
+    def array_multiply(a: tuple, b: tuple) -> tuple:
+        return a[0] + b[0], (a[1] * b[1]) % ModularCounting.MODULUS
+
+    @staticmethod
+    def array_mask(values: tuple, mask: np.ndarray) -> tuple:
+        return np.where(mask, values[0], -Infinity), np.where(mask, values[1], 0)
+
+    @staticmethod
+    def array_segment_sum(values: tuple, starts: np.ndarray) -> tuple:
+        return np.logaddexp.reduceat(values[0], starts), np.add.reduceat(values[1], starts) % ModularCounting.MODULUS
+
+    @staticmethod
+    def array_ratio(a: tuple, b: tuple) -> np.ndarray:
+        return np.exp(a[0] - b[0])
+
+
+EXACT = ExactCounting()
+LOG = LogCounting()
+MODULAR = ModularCounting()
+
+BACKENDS = {backend.name: backend for backend in (EXACT, LOG, MODULAR)}
+
+
+def get_backend(name: str):
+    """
+    :param name <str> - "exact", "log" or "modular"
+    :return: the counting backend with that name
+    """
+    if name not in BACKENDS:
+        raise ValueError("unknown MPR counting backend %s, expected one of %s" % (name, ", ".join(BACKENDS)))
+    return BACKENDS[name]
@@ -30,6 +30,7 @@ from numpy import mean
 from numpy import median as md
 
 from empress.reconcile import reconcile_main_input
+from empress.reconcile import mpr_counting
 from empress.input_reader import _ReconInput
 
 Infinity = float('inf')
@@ -42,32 +43,32 @@ def preorder(tree: dict, root_edge_name: Tuple) -> Iterator:
     :yield: list of edges in the given tree in preorder (high to low edges).
     """
 
-    value = tree[root_edge_name]
-    _, _, left_child_edge_name, right_child_edge_name = value
-
-    # Base case
-    if left_child_edge_name is None:  # Then right_child_edge_name == None also
-        yield root_edge_name
-    else:  # Recursive call
-        yield root_edge_name
-        yield from preorder(tree, left_child_edge_name)
-        yield from preorder(tree, right_child_edge_name)
+    # Explicit stack rather than recursion, so that deep trees do not reach the recursion limit
+    stack = [root_edge_name]
+    while stack:
+        edge_name = stack.pop()
+        _, _, left_child_edge_name, right_child_edge_name = tree[edge_name]
+        yield edge_name
+        if left_child_edge_name is not None:  # Then right_child_edge_name is not None either
+            stack.append(right_child_edge_name)
+            stack.append(left_child_edge_name)
 
 
 def postorder(tree: dict, root_edge_name: Tuple) -> Iterator:
     """ The parameters of this function are the same as that of preorder above, except it
     yields the edge list in postorder. """
 
-    value = tree[root_edge_name]
-    _, _, left_child_edge_name, right_child_edge_name = value
-
-    # Base case
-    if left_child_edge_name is None:  # then right_child_edge_name == None also
-        yield root_edge_name
-    else:  # Recursive call
-        yield from postorder(tree, left_child_edge_name)
-        yield from postorder(tree, right_child_edge_name)
-        yield root_edge_name
+    # Each edge is pushed once to visit its children and once more to be yielded after them
+    stack = [(root_edge_name, False)]
+    while stack:
+        edge_name, children_done = stack.pop()
+        _, _, left_child_edge_name, right_child_edge_name = tree[edge_name]
+        if children_done or left_child_edge_name is None:  # A tip has no children to wait for
+            yield edge_name
+        else:
+            stack.append((edge_name, True))
+            stack.append((right_child_edge_name, False))
+            stack.append((left_child_edge_name, False))
 
 
 def contemporaneous(host_1, host_1_parent, host_2, host_2_parent, distances):
@@ -91,6 +92,34 @@ def contemporaneous(host_1, host_1_parent, host_2, host_2_parent, distances):
     return True
 
 
+class _SharedLocations:
+    """
+    Immutable list of mapping nodes used for o_best and best_switch_locations in DP. A list built from the lists
+    of neighbouring host nodes keeps references to them instead of copying their items, so building one costs
+    O(1) no matter how deep the host tree is. The items are only enumerated when transfer events are emitted.
+    """
+    __slots__ = ("own", "parts")
+
+    def __init__(self, own: tuple = (), parts: tuple = ()):
+        """
+        :param own <tuple> - mapping nodes listed first
+        :param parts <tuple> - _SharedLocations whose items follow, in order
+        """
+        self.own = own
+        self.parts = parts
+
+    def __iter__(self) -> Iterator:
+        stack = [self]
+        while stack:
+            locations = stack.pop()
+            yield from locations.own
+            stack.extend(reversed(locations.parts))
+
+
+# best_switch_locations of the host root: a transfer from above the root lands nowhere
+_NO_SWITCH_LOCATIONS = _SharedLocations(((None, None),))
+
+
 def DP(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float) -> Tuple[dict, float, int, list]:
     """
     :param tree_data <_ReconInput> object - See newickFormatReader (data comes from getInput)
@@ -110,6 +139,9 @@ def DP(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost:
     host_distances = tree_data.host_distances
     parasite_dict = tree_data.parasite_dict
     tip_mapping = tree_data.tip_mapping
+    # Edge orders from the shared tree indices, rather than walking the host tree again for every parasite edge
+    host_postorder = tree_data.host_index.postorder_edges
+    host_preorder = tree_data.host_index.preorder_edges
 
     # A, C, O, and best_switch are all defined in tech report. Keys are edges and values are as defined in tech report
     A = {}
@@ -123,14 +155,15 @@ def DP(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost:
     # Dictionary to keep track of minimum reconciliation cost for each (vp, vh)
     min_cost = {}
 
-    # Keeps track of which vertex mappings 'gave' O its cost for the corresponding edges
+    # Keeps track of which vertex mappings 'gave' O its cost for the corresponding edges, as _SharedLocations
     o_best = {}
 
-    # Keeps track of switch locations. Keys are edges, values are edges to send the key edges to for transfers
+    # Keeps track of switch locations. Keys are edges, values are edges to send the key edges to for transfers,
+    # as _SharedLocations
     best_switch_locations = {}
 
     # Following logic taken from tech report, we loop over all ep and eh
-    for ep in postorder(parasite_dict, "pTop"):
+    for ep in tree_data.parasite_index.postorder_edges:
 
         # Get the parasite tree info in the format
         # (vp top, vp bottom, edge of child 1, edge of child 2)
@@ -149,14 +182,13 @@ def DP(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost:
             p_child2 = ep2[1]
 
         # Begin looping over host edges
-        for eh in postorder(host_dict, "hTop"):
+        for eh in host_postorder:
 
             # Similar format to that of the parasite tree above
             _, vh, eh1, eh2 = host_dict[eh]
 
             # Initialize entries for this iteration of ep and eh
             events_dict[(vp, vh)] = []
-            o_best[(vp, vh)] = []
 
             # Same logic as for the parasite tree above
             if eh1 is None:
@@ -303,7 +335,7 @@ def DP(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost:
             # Compute o_best[(vp, vh)], the source of O(ep, eh)
             if vh_is_a_tip:
                 O[(ep, eh)] = C[(ep, eh)]
-                o_best[(vp, vh)] = [(vp, vh)]
+                o_best[(vp, vh)] = _SharedLocations(((vp, vh),))
             else:
 
                 # Compute O(ep, eh) if vh is not a tip
@@ -315,19 +347,20 @@ def DP(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost:
                          if elem == O[(ep, eh)]]
 
                 # Corresponds to C
-                if 0 in o_min:
-                    o_best[(vp, vh)].append((vp, vh))
+                own = ((vp, vh),) if 0 in o_min else ()
 
                 # Corresponds to the O table for each child
+                parts = []
                 if 1 in o_min:
-                    o_best[(vp, vh)].extend(o_best[(vp, h_child1)])
+                    parts.append(o_best[(vp, h_child1)])
                 if 2 in o_min:
-                    o_best[(vp, vh)].extend(o_best[(vp, h_child2)])
+                    parts.append(o_best[(vp, h_child2)])
+                o_best[(vp, vh)] = _SharedLocations(own, tuple(parts))
 
         # Compute best_switch values
         best_switch[(ep, "hTop")] = Infinity
-        best_switch_locations[(vp, host_dict["hTop"][1])] = [(None, None)]
-        for eh in preorder(host_dict, "hTop"):
+        best_switch_locations[(vp, host_dict["hTop"][1])] = _NO_SWITCH_LOCATIONS
+        for eh in host_preorder:
 
             # Redefine the host information for this new loop
             _, vh, eh1, eh2 = host_dict[eh]
@@ -346,33 +379,27 @@ def DP(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost:
             # and the location to which the edge switches (best_switch_locations)
             if not vh_is_a_tip:
 
-                # Initialize lists for switch locations
-                best_switch_locations[(vp, h_child1)] = []
-                best_switch_locations[(vp, h_child2)] = []
-
                 # Compute the switch costs
                 best_switch[(ep, eh1)] = min(best_switch[(ep, eh)], O[(ep, eh2)])
                 best_switch[(ep, eh2)] = min(best_switch[(ep, eh)], O[(ep, eh1)])
 
-                # Add best switch locations for child 1
+                # Add best switch locations for child 1, sharing the parent's and sibling's lists
+                child1_parts = []
                 if best_switch[(ep, eh1)] == best_switch[(ep, eh)] and \
-                        best_switch_locations[(vp, vh)] != [(None, None)]:
-                    best_switch_locations[(vp, h_child1)].extend(
-                        best_switch_locations[(vp, vh)])
-                if best_switch[(ep, eh1)] == O[(ep, eh2)] and \
-                        o_best[(vp, h_child2)] != [(None, None)]:
-                    best_switch_locations[(vp, h_child1)].extend(
-                        o_best[(vp, h_child2)])
+                        best_switch_locations[(vp, vh)] is not _NO_SWITCH_LOCATIONS:
+                    child1_parts.append(best_switch_locations[(vp, vh)])
+                if best_switch[(ep, eh1)] == O[(ep, eh2)]:
+                    child1_parts.append(o_best[(vp, h_child2)])
+                best_switch_locations[(vp, h_child1)] = _SharedLocations((), tuple(child1_parts))
 
                 # Add best switch locations for child 2
+                child2_parts = []
                 if best_switch[(ep, eh2)] == best_switch[(ep, eh)] and \
-                        best_switch_locations[(vp, vh)] != [(None, None)]:
-                    best_switch_locations[(vp, h_child2)].extend(
-                        best_switch_locations[(vp, vh)])
-                if best_switch[(ep, eh2)] == O[(ep, eh1)] and \
-                        o_best[(vp, h_child1)] != [(None, None)]:
-                    best_switch_locations[(vp, h_child2)].extend(
-                        o_best[(vp, h_child1)])
+                        best_switch_locations[(vp, vh)] is not _NO_SWITCH_LOCATIONS:
+                    child2_parts.append(best_switch_locations[(vp, vh)])
+                if best_switch[(ep, eh2)] == O[(ep, eh1)]:
+                    child2_parts.append(o_best[(vp, h_child1)])
+                best_switch_locations[(vp, h_child2)] = _SharedLocations((), tuple(child2_parts))
 
     # Create the list of minimum cost mapping nodes involving root of parasite tree
     tree_min = find_best_roots(parasite_dict, min_cost)
@@ -409,7 +436,7 @@ def calculate_mean_med_event_nodes_per_mapping_node(dtl_recon_graph: dict) -> Tu
     return mean_event_nodes_per_mapping_node, median_event_nodes_per_mapping_node, data
 
 
-def count_mprs_wrapper(mapping_node_list: list, dtl_recon_graph: dict) -> int:
+def count_mprs_wrapper(mapping_node_list: list, dtl_recon_graph: dict, counting=mpr_counting.EXACT):
     """
     :param mapping_node_list: output from findBestRoots, a list of mapping
     nodes for the root of the parasite tree that could produce a MPR.
@@ -419,34 +446,35 @@ def count_mprs_wrapper(mapping_node_list: list, dtl_recon_graph: dict) -> int:
     :return: this function uses the helper function countMPRs to loop over
     all of the minimum cost parasite root mappings and sum their MPR counts
     to find the total number of MPRs for the given DTLReconGraph. This
-    number is returned as an integer
+    number is returned as an integer, or as a value of the given mpr_counting backend
     """
 
     # Initialize the memo
     memo = dict()
 
     # Initialize the very start count, for the first call of countMPRs
-    count = 0
+    count = counting.zero
 
     # Loop over all given minimum cost reconciliation roots
     for mappingNode in mapping_node_list:
-        count += count_mprs(mappingNode, dtl_recon_graph, memo)
+        count = counting.add(count, count_mprs(mappingNode, dtl_recon_graph, memo, counting))
 
     return count
 
 
-def count_mprs(mapping_node: tuple, dtl_recon_graph: dict, memo: dict) -> int:
+def count_mprs(mapping_node: tuple, dtl_recon_graph: dict, memo: dict, counting=mpr_counting.EXACT):
     """
     :param mapping_node: an individual mapping node that maps a node
     for the parasite tree onto a node of the host tree, in the format
     (p, h), where p is the parasite node and h is the host node
     :param dtl_recon_graph: a DTLReconGraph, output from buildDTLReconGraph
     (see that function for more info on the format of this input)
-    :param memo: a dictionary representing the running memo that is passed
-    down recursive calls of this function. At first it is just an empty
-    dictionary (see above function), but as it gets passed down calls, it collects
+    :param memo: a dictionary representing the running memo that is shared
+    between calls of this function. At first it is just an empty
+    dictionary (see above function), but as it gets passed between calls, it collects
     keys of mapping nodes and values of MPR counts. This memo improves runtime
     of the algorithm
+    :param counting: the mpr_counting backend the counts are computed with, exact integers by default
     :return: the number of MPRs spawned below the given mapping node in the graph
     """
 
@@ -456,24 +484,39 @@ def count_mprs(mapping_node: tuple, dtl_recon_graph: dict, memo: dict) -> int:
 
     # Base case, occurs if being called on a child produced by a loss or contemporary evet
     if mapping_node == (None, None):
-        return 1
+        return counting.one
 
-    # Initialize a variable to keep count of the number of MPRs
-    count = 0
+    # Depth-first traversal with an explicit stack: a mapping node is pushed once to count its children and once
+    # more to be counted itself, when all of its children are in the memo
+    stack = [(mapping_node, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if node in memo:
+            continue
+        if not children_done:
+            stack.append((node, True))
+            for eventNode in dtl_recon_graph[node]:
+                for mapping_child in (eventNode[1], eventNode[2]):
+                    if mapping_child != (None, None) and mapping_child not in memo:
+                        stack.append((mapping_child, False))
+            continue
 
-    # Loop over all event nodes corresponding to the current mapping node
-    for eventNode in dtl_recon_graph[mapping_node]:
-        # Save the children produced by the current event
-        mapping_child1 = eventNode[1]
-        mapping_child2 = eventNode[2]
+        # Initialize a variable to keep count of the number of MPRs
+        count = counting.zero
 
-        # Add the product of the counts of both children (over all children) for this event to get the parent's count
-        count += count_mprs(mapping_child1, dtl_recon_graph, memo) * count_mprs(mapping_child2, dtl_recon_graph, memo)
+        # Loop over all event nodes corresponding to the current mapping node
+        for eventNode in dtl_recon_graph[node]:
+            # Save the counts of the children produced by the current event
+            child1_count = counting.one if eventNode[1] == (None, None) else memo[eventNode[1]]
+            child2_count = counting.one if eventNode[2] == (None, None) else memo[eventNode[2]]
 
-    # Save the result in the memo
-    memo[mapping_node] = count
+            # Add the product of the counts of both children for this event to get the parent's count
+            count = counting.add(count, counting.multiply(child1_count, child2_count))
 
-    return count
+        # Save the result in the memo
+        memo[node] = count
+
+    return memo[mapping_node]
 
 
 def find_best_roots(parasite_dict: dict, min_cost_dict: dict) -> list:
@@ -506,18 +549,31 @@ def build_dtl_recon_graph(best_roots: list, event_dict: dict, unique_dict: dict)
     :param event_dict: a dictionary representing events and the corresponding children
     for each node - see eventDict in DP for more info on the format of this input
     :param unique_dict: a dictionary of unique vertex mappings, which initially
-    starts empty and gets built up using eventDict and tupleList using recursion
-    :return: the modified uniqueDict for this particular call of the function which,
-    after all recursive calls are done, will be the final DTL reconciliation graph
+    starts empty and gets built up using eventDict in a depth-first traversal from the roots
+    :return: the modified uniqueDict which is the final DTL reconciliation graph
     """
 
+    def child_locations(vertex_pair):
+        for event in event_dict[vertex_pair]:
+            for location in event:
+                if type(location) is tuple and location != (None, None):
+                    yield location
+
+    # Each stack entry holds the children of a mapping node that are still to be visited. Mapping nodes are added
+    # when they are first reached, so the graph lists them in the same depth-first preorder as a recursive traversal.
     for vertexPair in best_roots:
-        if vertexPair not in unique_dict:
-            unique_dict[vertexPair] = event_dict[vertexPair]
-            for event in event_dict[vertexPair]:
-                for location in event:
-                    if type(location) is tuple and location != (None, None):
-                        build_dtl_recon_graph([location], event_dict, unique_dict)
+        if vertexPair in unique_dict:
+            continue
+        unique_dict[vertexPair] = event_dict[vertexPair]
+        stack = [child_locations(vertexPair)]
+        while stack:
+            for location in stack[-1]:
+                if location not in unique_dict:
+                    unique_dict[location] = event_dict[location]
+                    stack.append(child_locations(location))
+                    break
+            else:
+                stack.pop()
     return unique_dict
 
 
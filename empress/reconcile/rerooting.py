@@ -0,0 +1,120 @@
+# rerooting.py
+# Reconciles an unrooted parasite tree under every possible rooting
+
+# The parasite tree is read as a rooted tree like any other, and its root is ignored: every edge of the underlying
+# unrooted tree is a candidate root. A rooting on the edge above node v has two subtrees, the "down" subtree of v
+# in the input rooting and the "up" subtree made of everything else. DP rows of down subtrees are the rows of
+# the input rooting, and the up subtree of v is v's parent with two children, the up subtree of the parent and
+# the down subtree of v's sibling (below a child of the input root, the up subtree is just the sibling's down
+# subtree). So one DP pass fills the down rows, a second top-down pass the up rows, and the cost of every
+# rooting is read from one more row per edge, instead of running one full DP per rooting.
+#
+# The new root keeps the name of the input root, which disappears from the unrooted tree.
+
+from empress.input_reader import _ReconInput
+from empress.reconcile import array_dp
+
+
+def rooting_costs(tree_data: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float) -> dict:
+    """
+    :param tree_data <_ReconInput> - host tree, parasite tree (any rooting of the unrooted tree) and tip mapping
+    :param dup_cost <float> - cost of a duplication event
+    :param transfer_cost <float> - cost of a transfer event
+    :param loss_cost <float> - cost of a loss event
+    :return: dictionary that maps every parasite node v to the cost of the best reconciliation of the tree rooted
+        on the edge above v. The two children of the input root are above the same unrooted edge, so only the left
+        one is listed.
+    """
+    tables = array_dp.DPTables(tree_data, dup_cost, transfer_cost, loss_cost)
+    tables.fill()
+    parasite = tables.parasite
+    root = parasite.root
+    costs = {}
+    up_rows = {}
+    for v in parasite.preorder:
+        if v == root:
+            continue
+        u = parasite.parent[v]
+        sibling = parasite.sibling[v]
+        if u == root:
+            up_rows[v] = (tables.C[sibling], tables.best_switch[sibling])
+        else:
+            _, c, _, best_switch = tables.compute_row(u, up_rows[u] + (tables.C[sibling],
+                                                                    tables.best_switch[sibling]))
+            up_rows[v] = (c, best_switch)
+        if v != parasite.right[root]:
+            _, c, _, _ = tables.compute_row(root, (tables.C[v], tables.best_switch[v]) + up_rows[v])
+            costs[parasite.names[v]] = float(c.min())
+    return costs
+
+
+def reroot(parasite_dict: dict, node: str) -> dict:
+    """
+    :param parasite_dict <dict> - a parasite tree (see the top of recongraph_tools.py)
+    :param node <str> - a parasite node other than the root
+    :return: the same unrooted tree rooted on the edge above node. The root has the down subtree of node as its
+        left child and the rest of the tree as its right child.
+    """
+    parent = {}
+    children = {}
+    for edge, (top, bottom, left_edge, right_edge) in parasite_dict.items():
+        if edge == "pTop":
+            root = bottom
+        else:
+            parent[bottom] = top
+        if left_edge is not None:
+            children[bottom] = (left_edge[1], right_edge[1])
+
+    # The children of every node in the new rooting. Nodes on the path from node up to a child of the input root
+    # are turned upside down, the rest keep their children.
+    new_children = dict(children)
+    del new_children[root]
+    if parent[node] == root:
+        new_children[root] = (node, _other_child(children[root], node))
+    else:
+        new_children[root] = (node, parent[node])
+        previous = node
+        current = parent[node]
+        while current != root:
+            above = parent[current]
+            up = above if above != root else _other_child(children[root], current)
+            new_children[current] = (up, _other_child(children[current], previous))
+            previous = current
+            current = above
+            if up != above:
+                break
+
+    new_dict = {}
+    stack = [("Top", root)]
+    while stack:
+        top, bottom = stack.pop()
+        edge = "pTop" if top == "Top" else (top, bottom)
+        if bottom in new_children:
+            left, right = new_children[bottom]
+            new_dict[edge] = (top, bottom, (bottom, left), (bottom, right))
+            stack.append((bottom, right))
+            stack.append((bottom, left))
+        else:
+            new_dict[edge] = (top, bottom, None, None)
+    return new_dict
+
+
+def _other_child(pair: tuple, child: str) -> str:
+    return pair[1] if pair[0] == child else pair[0]
+
+
+def best_rootings(tree_data: _ReconInput, dup_cost: float, transfer_cost: float,
+                  loss_cost: float) -> list:
+    """
+    :return: one (rerooted input, DP result) pair for every rooting of the parasite tree with the lowest cost (see
+        rooting_costs), where the DP result is what array_dp.DP returns for the rerooted input
+    """
+    costs = rooting_costs(tree_data, dup_cost, transfer_cost, loss_cost)
+    best_cost = min(costs.values())
+    rootings = []
+    for node, cost in costs.items():
+        if cost == best_cost:
+            rerooted = _ReconInput(tree_data.host_dict, tree_data.host_distances,
+                                   reroot(tree_data.parasite_dict, node), None, tree_data.tip_mapping)
+            rootings.append((rerooted, array_dp.DP(rerooted, dup_cost, transfer_cost, loss_cost)))
+    return rootings
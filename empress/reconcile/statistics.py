@@ -6,39 +6,90 @@
 # of solution costs.
 # https://www.ncbi.nlm.nih.gov/pmc/articles/PMC379178/
 
+import math
 import random
+import concurrent.futures
 import matplotlib
 from empress.input_reader import _ReconInput
 import matplotlib.pyplot as plt
 
-from empress.reconcile import recongraph_tools
+from empress.reconcile import array_dp
 
-def _trials(recon_input: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float, num_trials: int) -> list:
+# Number of random tip mappings reconciled together by array_dp.DP_cost_batch
+TRIALS_PER_BATCH = 128
+
+# Number of trials between two stopping checks of sequential_stats
+SEQUENTIAL_TRIALS_PER_STEP = 20
+
+def _trials(recon_input: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float, num_trials: int,
+            rng: random.Random = random) -> list:
     """
     :param recon_input <_ReconInput> - class containing host tree, parasite tree, tip mapping
     :param dup_cost <float> - duplication cost
     :param transfer_cost <float> - transfer cost
     :param loss_cost <float> -loss cost
     :param num_trials <int> - number of trials in Monte Carlo simulation
+    :param rng <random.Random> - source of randomness, the global random module by default
     :return: list of floating point costs of reconciliations of the Monte Carlo samples
     """
    
-    costs = list()  # List of costs of random trials
+    random_phis = list()  # Random tip mappings, one per trial
     parasites = recon_input.tip_mapping.keys()
     hosts = list(recon_input.tip_mapping.values())
     for t in range(num_trials):
-        random_phi = _create_random_phi(recon_input.tip_mapping)
+        random_phi = _create_random_phi(recon_input.tip_mapping, rng)
         for p in parasites:
-            h = random.choice(hosts)
+            h = rng.choice(hosts)
             random_phi[p] = h
-        new_input = _ReconInput(recon_input.host_dict, None, recon_input.parasite_dict, None, random_phi)
-        _, cost, _, _ = recongraph_tools.DP(new_input, dup_cost, transfer_cost, loss_cost)
-        costs.append(cost)
+        random_phis.append(random_phi)
+
+    # The trees are the same in every trial, so the trials are reconciled together in batches
+    costs = list()  # List of costs of random trials
+    for start in range(0, num_trials, TRIALS_PER_BATCH):
+        costs.extend(array_dp.DP_cost_batch(recon_input, random_phis[start:start + TRIALS_PER_BATCH],
+                                            dup_cost, transfer_cost, loss_cost))
+    return costs
+
+def _seeded_trials(recon_input: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float,
+                   num_trials: int, seed: int, worker: int, step: int = None) -> list:
+    """
+    Runs one worker's share of the trials with its own random stream, derived from seed, the worker index and,
+    for sequential_stats, the step index.
+    This is a top-level function so that it can be sent to a process pool.
+    """
+    stream = "%d:%d" % (seed, worker) if step is None else "%d:%d:%d" % (seed, step, worker)
+    return _trials(recon_input, dup_cost, transfer_cost, loss_cost, num_trials, random.Random(stream))
+
+def _parallel_trials(recon_input: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float,
+                     num_trials: int, n_jobs: int, seed: int,
+                     executor: concurrent.futures.Executor = None, step: int = None) -> list:
+    """
+    :param n_jobs <int> - number of worker processes; the trials are split as evenly as possible between them
+    :param seed <int> - seed of the per-worker random streams. The costs only depend on the seed and n_jobs.
+    :param executor <Executor> - pool of n_jobs processes to run the trials in, a new one if None
+    :param step <int> - index of the step of sequential_stats, which gets its own random streams
+    :return: list of floating point costs of reconciliations of the Monte Carlo samples, ordered by worker
+    """
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return _parallel_trials(recon_input, dup_cost, transfer_cost, loss_cost, num_trials, n_jobs, seed,
+                                    executor, step)
+    trials_per_worker, extra_trials = divmod(num_trials, n_jobs)
+    worker_trials = [trials_per_worker + (1 if worker < extra_trials else 0) for worker in range(n_jobs)]
+    base_input = _ReconInput(recon_input.host_dict, None, recon_input.parasite_dict, None, recon_input.tip_mapping)
+
+    costs = list()
+    futures = [executor.submit(_seeded_trials, base_input, dup_cost, transfer_cost, loss_cost, n, seed, worker,
+                               step)
+               for worker, n in enumerate(worker_trials) if n > 0]
+    for future in futures:
+        costs.extend(future.result())
     return costs
 
-def _create_random_phi(tip_mapping : dict) -> dict:
+def _create_random_phi(tip_mapping : dict, rng: random.Random = random) -> dict:
     """
     :param tip_mapping <dict> - dictionary representation of parasite tip to host tip mapping
+    :param rng <random.Random> - source of randomness, the global random module by default
     :return: a dictionary of parasite tips to host tips that preserves the degree of
         of the host tips in tip_mapping
     """
@@ -53,7 +104,7 @@ def _create_random_phi(tip_mapping : dict) -> dict:
         if h in parasite_count: parasite_count[h] += 1
         else: parasite_count[h] = 1
     for h in unique_hosts:
-        parasite_samples = random.sample(parasites, parasite_count[h])
+        parasite_samples = rng.sample(parasites, parasite_count[h])
         for p in parasite_samples: 
             random_phi[p] = h
             parasites.remove(p)
@@ -73,20 +124,33 @@ def draw_stats(ax: plt.Axes, mpr_cost: float, costs: list, pvalue: float = None)
     ax.set_ylabel("count")
 
 def stats(recon_input: _ReconInput, dup_cost: float, transfer_cost: float,
-          loss_cost: float, num_trials: int) -> (float, list, float):
+          loss_cost: float, num_trials: int, n_jobs: int = 1, seed: int = None,
+          mpr_cost: float = None) -> (float, list, float):
     """
     :param recon_input <_ReconInput> - class containing host tree, parasite tree, tip mapping
     :param dup_cost <float> - duplication cost
     :param transfer_cost <float> - float transfer cost
     :param loss_cost <float> -loss cost
     :param num_trials <int> - int number of trials in Monte Carlo simulation
+    :param n_jobs <int> - number of processes to spread the trials over, at least 1
+    :param seed <int> - if given, the trials are reproducible for the same seed and n_jobs
+    :param mpr_cost <float> - cost of the optimal MPR, if already known
     :return: tuple of three items:
         float cost of optimal MPR for given data
         list of floating point costs of reconciliations of the Monte Carlo samples
         float empirical p-value between 0 and 1
     """
-    _, mpr_cost, _, _ = recongraph_tools.DP(recon_input, dup_cost, transfer_cost, loss_cost)
-    costs = _trials(recon_input, dup_cost, transfer_cost, loss_cost, num_trials)
+    if n_jobs < 1:
+        raise ValueError("n_jobs must be at least 1, got %s" % n_jobs)
+    if mpr_cost is None:
+        mpr_cost = array_dp.DP_cost(recon_input, dup_cost, transfer_cost, loss_cost)
+    if n_jobs == 1:
+        rng = random if seed is None else random.Random("%d:%d" % (seed, 0))
+        costs = _trials(recon_input, dup_cost, transfer_cost, loss_cost, num_trials, rng)
+    else:
+        if seed is None:
+            seed = random.getrandbits(32)
+        costs = _parallel_trials(recon_input, dup_cost, transfer_cost, loss_cost, num_trials, n_jobs, seed)
 
     # Empirical p-value computed as (r+1)/(n+1) where n is the number of trials and r is the number of trials 
     # whose cost is less than or equal to the cost of the MPR for the actual data.
@@ -94,4 +158,100 @@ def stats(recon_input: _ReconInput, dup_cost: float, transfer_cost: float,
     p = (r+1)/(num_trials + 1)
     return mpr_cost, costs, p
 
+def _normal_quantile(q: float) -> float:
+    """
+    :param q <float> - probability strictly between 0 and 1
+    :return: the q quantile of the standard normal distribution, found by bisection on its CDF
+    """
+    low, high = -40.0, 40.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if 0.5 * math.erfc(-middle / math.sqrt(2)) < q:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+def _p_value_interval(r: int, n: int, confidence: float) -> (float, float):
+    """
+    :param r <int> - number of trials whose cost is less than or equal to the cost of the MPR
+    :param n <int> - number of trials
+    :param confidence <float> - confidence level of the interval, between 0 and 1
+    :return: Wilson score interval for the p-value, using the same (r+1)/(n+1) correction as the point estimate
+    """
+    successes = r + 1
+    total = n + 1
+    z = _normal_quantile(1 - (1 - confidence) / 2)
+    estimate = successes / total
+    denominator = 1 + z * z / total
+    center = (estimate + z * z / (2 * total)) / denominator
+    half_width = z * math.sqrt(estimate * (1 - estimate) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+def sequential_stats(recon_input: _ReconInput, dup_cost: float, transfer_cost: float, loss_cost: float,
+                     alpha: float, max_trials: int, confidence: float = 0.99, seed: int = None,
+                     mpr_cost: float = None, n_jobs: int = 1) -> (float, list, float, (float, float)):
+    """
+    Sequential Monte Carlo version of stats. Trials are run SEQUENTIAL_TRIALS_PER_STEP at a time and the test
+    stops as soon as the confidence interval of the p-value lies entirely below or above alpha, or after
+    max_trials trials. The interval is checked after every step, so each check uses a level of
+    1 - (1 - confidence) / (number of steps): by a union bound over the checks, the interval returned when the test
+    stops still covers the p-value with probability at least confidence (up to the normal approximation of the
+    Wilson interval).
+    :param recon_input <_ReconInput> - class containing host tree, parasite tree, tip mapping
+    :param dup_cost <float> - duplication cost
+    :param transfer_cost <float> - float transfer cost
+    :param loss_cost <float> -loss cost
+    :param alpha <float> - significance threshold the p-value is compared to, strictly between 0 and 1
+    :param max_trials <int> - largest number of trials to run
+    :param confidence <float> - confidence level of the interval used to decide when to stop, strictly between
+        0 and 1
+    :param seed <int> - if given, the trials are reproducible for the same seed and n_jobs
+    :param mpr_cost <float> - cost of the optimal MPR, if already known
+    :param n_jobs <int> - number of processes to spread the trials of each step over, at least 1
+    :return: tuple of four items:
+        float cost of optimal MPR for given data
+        list of floating point costs of the trials that were run (its length is the number of trials used)
+        float empirical p-value between 0 and 1
+        (float, float) confidence interval of the p-value
+    """
+    if not 0 < alpha < 1:
+        raise ValueError("alpha must be between 0 and 1, got %s" % alpha)
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1, got %s" % confidence)
+    if n_jobs < 1:
+        raise ValueError("n_jobs must be at least 1, got %s" % n_jobs)
+    if mpr_cost is None:
+        mpr_cost = array_dp.DP_cost(recon_input, dup_cost, transfer_cost, loss_cost)
+    if n_jobs == 1:
+        rng = random if seed is None else random.Random("%d:%d" % (seed, 0))
+        executor = None
+    else:
+        # One pool for every step; each step splits its trials between the workers with their own streams
+        if seed is None:
+            seed = random.getrandbits(32)
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs)
+    costs = list()
+    r = 0
+    interval = (0.0, 1.0)
+    n_steps = math.ceil(max_trials / SEQUENTIAL_TRIALS_PER_STEP)
+    step_confidence = 1 - (1 - confidence) / max(n_steps, 1)
+    try:
+        for step in range(n_steps):
+            n_step = min(SEQUENTIAL_TRIALS_PER_STEP, max_trials - len(costs))
+            if executor is None:
+                step_costs = _trials(recon_input, dup_cost, transfer_cost, loss_cost, n_step, rng)
+            else:
+                step_costs = _parallel_trials(recon_input, dup_cost, transfer_cost, loss_cost, n_step, n_jobs, seed,
+                                              executor, step)
+            costs.extend(step_costs)
+            r += len([score for score in step_costs if score <= mpr_cost])
+            interval = _p_value_interval(r, len(costs), step_confidence)
+            if interval[1] < alpha or interval[0] > alpha:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    p = (r+1)/(len(costs) + 1)
+    return mpr_cost, costs, p, interval
 
@@ -0,0 +1,214 @@
+# result_cache.py
+# Persistent on-disk cache of reconciliation results
+
+# Results are keyed by a hash of a canonical form of everything they depend on: the host tree, the parasite tree,
+# the tip mapping, the costs, the kind of result and CACHE_VERSION. Each entry is one file holding the pickled,
+# zlib-compressed result behind a short header. Entries are written to a temporary file and renamed into place,
+# so processes sharing a cache directory never see a partial entry, and a reader that loses a race with an
+# eviction simply gets a miss. Reading an entry refreshes its modification time, and once the directory grows
+# past its size limit the least recently used entries are removed.
+#
+# The cache is opt-in: it is only consulted after enable_cache is called (the CLI does this for --cache-dir) or
+# when the EMPRESS_CACHE_DIR environment variable is set. Entries are unpickled when read, so only point the cache
+# at a directory you trust.
+
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from collections.abc import Mapping
+from pathlib import Path
+
+from empress.input_reader import _ReconInput
+
+# Bump whenever a cached computation changes its output, so that stale entries are never read again
+CACHE_VERSION = 2
+
+# Default size limit of a cache directory, in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Environment variables that enable the cache without any code change
+CACHE_DIR_VARIABLE = "EMPRESS_CACHE_DIR"
+CACHE_SIZE_VARIABLE = "EMPRESS_CACHE_MAX_BYTES"
+
+# Every entry file starts with this, followed by the zlib-compressed pickle of the result
+_HEADER = b"EMPRESS-CACHE\x00" + CACHE_VERSION.to_bytes(2, "big")
+_SUFFIX = ".bin"
+
+# Cache returned by active_cache, set by enable_cache
+_active_cache = None
+_environment_checked = False
+
+
+def _canonical(value) -> str:
+    """
+    :param value - a tree dict, tip mapping, reconciliation graph, number, string or a tuple/list of those
+    :return: a string that only depends on the content of value, not on the insertion order of its dicts
+    """
+    if isinstance(value, Mapping):
+        return "{%s}" % ",".join(sorted("%s:%s" % (_canonical(k), _canonical(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return "(%s)" % ",".join(_canonical(item) for item in value)
+    if isinstance(value, bool) or value is None:
+        return repr(value)
+    if isinstance(value, (int, float)):
+        # 1 and 1.0 are the same cost
+        return repr(float(value))
+    return repr(value)
+
+
+class ResultCache:
+    """
+    A directory of cached results, shared safely by any number of processes
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param directory <str> - directory of the entries, created if it does not exist
+        :param max_bytes <int> - total size of the entries above which the least recently used ones are evicted
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, recon_input: _ReconInput, *parameters) -> str:
+        """
+        :param kind <str> - name of the cached computation, e.g. "reconcile"
+        :param recon_input <_ReconInput> - the trees and tip mapping the result was computed from
+        :param parameters - everything else the result depends on (costs, options, ...)
+        :return: hex digest identifying the result
+        """
+        canonical = _canonical((CACHE_VERSION, kind, recon_input.host_dict, recon_input.parasite_dict,
+                                recon_input.tip_mapping, parameters))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / (key + _SUFFIX)
+
+    def get(self, key: str, default=None):
+        """
+        :param key <str> - key returned by ResultCache.key
+        :return: the cached result, or default if there is no usable entry for key
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                data = entry_file.read()
+        except OSError:
+            self.misses += 1
+            return default
+        try:
+            if not data.startswith(_HEADER):
+                raise ValueError("entry written by another cache version")
+            value = pickle.loads(zlib.decompress(data[len(_HEADER):]))
+        except Exception:
+            # Corrupt or outdated entry, drop it
+            self._remove(path)
+            self.misses += 1
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value):
+        """
+        Store value under key, then evict the least recently used entries if the cache is too large.
+        Failing to write (full disk, read-only directory, ...) is not an error, the value is just not cached.
+        """
+        data = _HEADER + zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        try:
+            file_descriptor, temp_name = tempfile.mkstemp(dir=str(self.directory), suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(file_descriptor, "wb") as temp_file:
+                temp_file.write(data)
+            os.replace(temp_name, str(self._path(key)))
+        except OSError:
+            self._remove(Path(temp_name))
+            return
+        self.evict()
+
+    def get_or_compute(self, key: str, compute):
+        """
+        :param key <str> - key returned by ResultCache.key
+        :param compute - function without arguments computing the result on a miss
+        :return: the cached or newly computed result
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def evict(self):
+        """
+        Remove least recently used entries until the total size of the entries is at most max_bytes
+        """
+        entries = []
+        total_size = 0
+        for path in self.directory.glob("*" + _SUFFIX):
+            try:
+                stat = path.stat()
+            except OSError:
+                # Removed by another process
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+            total_size += stat.st_size
+        if total_size <= self.max_bytes:
+            return
+        entries.sort()
+        for _, path, size in entries:
+            if total_size <= self.max_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+    def clear(self):
+        for path in self.directory.glob("*" + _SUFFIX):
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def enable_cache(directory: str, max_bytes: int = DEFAULT_MAX_BYTES) -> ResultCache:
+    """
+    Make the wrappers and the CLI read and store their results in directory
+    :return: the active cache
+    """
+    global _active_cache
+    _active_cache = ResultCache(directory, max_bytes)
+    return _active_cache
+
+
+def disable_cache():
+    global _active_cache, _environment_checked
+    _active_cache = None
+    # An explicit call wins over the environment
+    _environment_checked = True
+
+
+def active_cache():
+    """
+    :return: the ResultCache set by enable_cache or by the EMPRESS_CACHE_DIR environment variable, or None
+    """
+    global _environment_checked
+    if _active_cache is None and not _environment_checked:
+        _environment_checked = True
+        directory = os.environ.get(CACHE_DIR_VARIABLE)
+        if directory:
+            enable_cache(directory, int(os.environ.get(CACHE_SIZE_VARIABLE, DEFAULT_MAX_BYTES)))
+    return _active_cache
@@ -0,0 +1,234 @@
+# tree_index.py
+# Integer index of an edge-based host or parasite tree
+
+# The trees of a _ReconInput are dictionaries of edges (see the top of recongraph_tools.py). Walking them means
+# following edge tuples from the root, which every algorithm used to redo with its own recursive traversal. A
+# TreeIndex walks the tree once, without recursion, and numbers the nodes by their position in postorder, so
+# children always have smaller ids than their parents and the ids of a subtree are the contiguous range
+# [root - size[root] + 1, root]. Every other view of the tree (preorder, parent and child ids, depths, the vertex
+# format of diameter.reformat_tree) is derived from that numbering.
+#
+# A TreeIndex is never modified after it is built: sequences are tuples and NumPy arrays are read-only, so one
+# index can be shared by every algorithm that runs on the same tree. _ReconInput.host_index and
+# _ReconInput.parasite_index build one lazily for each tree of the input.
+#
+# Algorithms that work on integer ids take a TreeIndex directly. The legacy formats are reached through adapters:
+# the constructor reads an edge dict and to_edge_dict writes one back, from_vertex_tree and vertex_tree do the
+# same for the vertex format of diameter.reformat_tree, and recon_vis.utils.index_to_tree builds the node objects
+# used for rendering.
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+class TreeIndex:
+    """
+    Integer-indexed view of an edge-based tree. Node ids are positions in postorder, so the root has the largest id.
+    Missing children and the parent of the root are -1.
+    """
+
+    def __init__(self, tree: dict, root_edge_name: str):
+        """
+        :param tree <dict> - host or parasite tree in edge format
+        :param root_edge_name <str> - the key of the root edge, "hTop" or "pTop"
+        """
+        self.root_edge_name = root_edge_name
+
+        # Postorder walk with an explicit stack; each edge is pushed once unexpanded and once expanded
+        postorder_edges = []
+        stack = [(root_edge_name, False)]
+        while stack:
+            edge, expanded = stack.pop()
+            _, _, left_edge, right_edge = tree[edge]
+            if expanded or left_edge is None:
+                postorder_edges.append(edge)
+            else:
+                stack.append((edge, True))
+                stack.append((right_edge, False))
+                stack.append((left_edge, False))
+
+        n_nodes = len(postorder_edges)
+        self.edges = tuple(postorder_edges)
+        self.names = tuple(tree[edge][1] for edge in postorder_edges)
+        self.ids = {name: node for node, name in enumerate(self.names)}
+        self.root = n_nodes - 1
+
+        left = [-1] * n_nodes
+        right = [-1] * n_nodes
+        parent = [-1] * n_nodes
+        sibling = [-1] * n_nodes
+        for node, edge in enumerate(postorder_edges):
+            _, _, left_edge, right_edge = tree[edge]
+            if left_edge is not None:
+                left[node] = self.ids[left_edge[1]]
+                right[node] = self.ids[right_edge[1]]
+                parent[left[node]] = node
+                parent[right[node]] = node
+                sibling[left[node]] = right[node]
+                sibling[right[node]] = left[node]
+
+        # Preorder visits a node, then its left subtree, then its right subtree
+        preorder = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            preorder.append(node)
+            if left[node] != -1:
+                stack.append(right[node])
+                stack.append(left[node])
+
+        depth = [0] * n_nodes
+        for node in preorder:
+            if parent[node] != -1:
+                depth[node] = depth[parent[node]] + 1
+        height = [0] * n_nodes
+        size = [1] * n_nodes
+        for node in range(n_nodes):
+            if left[node] != -1:
+                height[node] = 1 + max(height[left[node]], height[right[node]])
+                size[node] += size[left[node]] + size[right[node]]
+
+        # Plain sequences are kept next to the arrays because scalar loops index them one item at a time
+        self.left = tuple(left)
+        self.right = tuple(right)
+        self.parent = tuple(parent)
+        self.sibling = tuple(sibling)
+        self.preorder = tuple(preorder)
+        self.depth = tuple(depth)
+        # Leaves have height 0, and every other node one more than its highest child
+        self.height = tuple(height)
+        # size[node] is the number of nodes in the subtree of node, which are the ids size[node] - 1 below it
+        self.size = tuple(size)
+
+        self.postorder_array = _read_only(np.arange(n_nodes, dtype=np.int64))
+        self.left_array = _read_only(np.array(left, dtype=np.int64))
+        self.right_array = _read_only(np.array(right, dtype=np.int64))
+        self.parent_array = _read_only(np.array(parent, dtype=np.int64))
+        self.sibling_array = _read_only(np.array(sibling, dtype=np.int64))
+        self.preorder_array = _read_only(np.array(preorder, dtype=np.int64))
+        self.depth_array = _read_only(np.array(depth, dtype=np.int64))
+        self.height_array = _read_only(np.array(height, dtype=np.int64))
+        self.leaf_flags = _read_only(self.left_array == -1)
+        self.leaves = _read_only(np.flatnonzero(self.leaf_flags))
+        self.internal = _read_only(np.flatnonzero(~self.leaf_flags))
+        self.non_root = _read_only(np.flatnonzero(self.parent_array != -1))
+
+        # Level-synchronous schedule: internal nodes grouped by height (every child of a node in height_levels[i] is
+        # in an earlier level or is a leaf) and by depth (every parent of a node in depth_levels[i] is in an
+        # earlier level)
+        self.height_levels = _group_internal_nodes(left, height)
+        self.depth_levels = _group_internal_nodes(left, depth)
+
+    def __len__(self):
+        return len(self.names)
+
+    def is_leaf(self, node: int) -> bool:
+        return self.left[node] == -1
+
+    def is_ancestor(self, ancestor: int, node: int) -> bool:
+        """
+        :return: True if ancestor is a proper ancestor of node. The ids below a node are the size - 1 ids before it.
+        """
+        return ancestor - self.size[ancestor] < node < ancestor
+
+    def ancestry(self, node1: int, node2: int) -> str:
+        """
+        :return: how node1 relates to node2, with the strings of histogram_alg.calculate_ancestral_table:
+        'eq' (same node), 'an' (node1 is an ancestor of node2), 'des' (node1 is a descendant of node2) or 'in'
+        (incomparable)
+        """
+        if node1 == node2:
+            return 'eq'
+        if self.is_ancestor(node1, node2):
+            return 'an'
+        if self.is_ancestor(node2, node1):
+            return 'des'
+        return 'in'
+
+    @classmethod
+    def from_vertex_tree(cls, vertex_tree: dict, root: str, root_edge_name: str = "hTop") -> 'TreeIndex':
+        """
+        :param vertex_tree <dict> - tree in the vertex format of diameter.reformat_tree, {node: (child1, child2)}
+        :param root <str> - the root vertex of vertex_tree
+        :param root_edge_name <str> - the key of the root edge of the index, "hTop" or "pTop"
+        """
+        return cls(vertex_tree_to_edge_dict(vertex_tree, root, root_edge_name), root_edge_name)
+
+    def to_edge_dict(self) -> dict:
+        """
+        :return: the tree in edge format, with the edges in preorder like the dicts of input_reader
+        """
+        tree = {}
+        for node in self.preorder:
+            edge = self.edges[node]
+            top = "Top" if node == self.root else self.names[self.parent[node]]
+            if self.left[node] == -1:
+                tree[edge] = (top, self.names[node], None, None)
+            else:
+                tree[edge] = (top, self.names[node], self.edges[self.left[node]], self.edges[self.right[node]])
+        return tree
+
+    @property
+    def postorder_edges(self) -> tuple:
+        """
+        The edges of the tree in the order of recongraph_tools.postorder
+        """
+        return self.edges
+
+    @property
+    def preorder_edges(self) -> tuple:
+        """
+        The edges of the tree in the order of recongraph_tools.preorder
+        """
+        return tuple(self.edges[node] for node in self.preorder)
+
+    def vertex_tree(self):
+        """
+        :return: the same (vertex tree, root name, number of nodes) triple as diameter.reformat_tree on the root
+        edge. The vertex tree is a new OrderedDict, so callers may modify it.
+        """
+        vertex_tree = OrderedDict()
+        for node, name in enumerate(self.names):
+            if self.left[node] == -1:
+                vertex_tree[name] = (None, None)
+            else:
+                vertex_tree[name] = (self.names[self.left[node]], self.names[self.right[node]])
+        return vertex_tree, self.names[self.root], len(self.names)
+
+
+def vertex_tree_to_edge_dict(vertex_tree: dict, root: str, root_edge_name: str) -> dict:
+    """
+    :param vertex_tree <dict> - tree in vertex format, {node: (child1, child2)} with (None, None) for leaves
+    :param root <str> - the root vertex of vertex_tree
+    :param root_edge_name <str> - the key of the root edge, "hTop" or "pTop"
+    :return: the same tree in edge format, with the edges in preorder
+    """
+    tree = {}
+    stack = [(root_edge_name, "Top", root)]
+    while stack:
+        edge, top, vertex = stack.pop()
+        child1, child2 = vertex_tree[vertex]
+        if child1 is None:
+            tree[edge] = (top, vertex, None, None)
+        else:
+            tree[edge] = (top, vertex, (vertex, child1), (vertex, child2))
+            stack.append(((vertex, child2), vertex, child2))
+            stack.append(((vertex, child1), vertex, child1))
+    return tree
+
+
+def _group_internal_nodes(left: list, level: list) -> tuple:
+    """
+    :return: a tuple of NumPy arrays, the i-th holding the internal nodes with the i-th smallest level value
+    """
+    groups = {}
+    for node, node_level in enumerate(level):
+        if left[node] != -1:
+            groups.setdefault(node_level, []).append(node)
+    return tuple(_read_only(np.array(groups[node_level], dtype=np.int64)) for node_level in sorted(groups))
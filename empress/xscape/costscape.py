@@ -9,6 +9,7 @@ import time
 
 # xscape libraries
 from empress import xscape
+from empress import result_cache
 from empress.xscape import reconcile
 from empress.xscape import plotcosts_analytic as plotcosts
 
@@ -20,8 +21,15 @@ def solve(newick_data, transferMin, transferMax, dupMin, dupMax, outfile, log):
 
     print("Reconciling trees...")
     startTime = time.time()
-    CVlist = reconcile.reconcile(parasiteTree, hostTree, tip_mapping,
-                                 transferMin, transferMax, dupMin, dupMax)
+    cache = result_cache.active_cache()
+    if cache is None:
+        CVlist = reconcile.reconcile(parasiteTree, hostTree, tip_mapping,
+                                     transferMin, transferMax, dupMin, dupMax)
+    else:
+        CVlist = cache.get_or_compute(
+            cache.key("cost-regions", newick_data, transferMin, transferMax, dupMin, dupMax),
+            lambda: reconcile.reconcile(parasiteTree, hostTree, tip_mapping,
+                                        transferMin, transferMax, dupMin, dupMax))
     endTime = time.time()
     elapsedTime = endTime - startTime
     print("Elapsed time %.2f seconds" % elapsedTime)
@@ -6,6 +6,9 @@
 
 import argparse
 
+import empress.result_cache
+
+import cli_commands.batch
 import cli_commands.cluster
 import cli_commands.cost_regions
 import cli_commands.histogram
@@ -19,6 +22,13 @@ def main():
         epilog="Show help for each command by running `python empress_cli.py <command> --help`",
     )
 
+    parser.add_argument("--cache-dir", metavar="<directory>", default=None,
+                        help="reuse results computed by earlier runs from this directory and store new ones in it "
+                             "(also enabled by the %s environment variable)" % empress.result_cache.CACHE_DIR_VARIABLE)
+    parser.add_argument("--cache-size", metavar="<megabytes>", type=float,
+                        default=empress.result_cache.DEFAULT_MAX_BYTES / 2**20,
+                        help="size above which the least recently used results are removed from the cache")
+
     # Create subparsers and setup the subparsers
     subparsers = parser.add_subparsers(dest='command', help='Commands empress can run', required=True)
 
@@ -65,6 +75,14 @@ def main():
     )
     cli_commands.p_value.add_p_value_to_parser(p_value_parser)
 
+    # Batch
+    batch_description = "Reconcile many parasite trees listed in a manifest file against one host tree."
+    batch_parser = subparsers.add_parser(
+            'batch', description=batch_description, help=batch_description.lower().rstrip("."),
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    cli_commands.batch.add_batch_to_parser(batch_parser)
+
     # Tanglegram
     tanglegram_description = "View a tanglegram which shows the tip mapping between the two trees."
     tanglegram_parser = subparsers.add_parser(
@@ -75,6 +93,8 @@ def main():
 
     # Determine which command we should run and run it
     args = parser.parse_args()
+    if args.cache_dir is not None:
+        empress.result_cache.enable_cache(args.cache_dir, int(args.cache_size * 2**20))
 
     if args.command == "cost-regions":
         cli_commands.cost_regions.run_cost_regions(args)
@@ -86,6 +106,8 @@ def main():
         cli_commands.cluster.run_cluster(args)
     elif args.command == "p-value":
         cli_commands.p_value.run_p_value(args)
+    elif args.command == "batch":
+        cli_commands.batch.run_batch(args)
     elif args.command == "tanglegram":
         cli_commands.tanglegram.run_tanglegram(args)
 
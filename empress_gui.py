@@ -5,6 +5,7 @@ from tkinter import messagebox
 # You have to import filedialog explicitly for it to work across platforms
 # see https://stackoverflow.com/a/36165227/2860949
 from tkinter import filedialog
+import multiprocessing
 import os
 import sys
 import pathlib
@@ -179,6 +180,8 @@ class App(tk.Frame):
         self.loss_count_label = tk.Label(self.recon_nums_frame)
         self.recon_info_displayed = False
         App.recon_graph = None
+        # The last reconciliation before the files were reloaded, reused when only the tip mapping changed
+        App.previous_recon_graph = None
 
     def init_view_solution_space(self):
         # "View solution space" dropdown
@@ -231,6 +234,8 @@ class App(tk.Frame):
             self.host_tree_info.destroy()
         else:
             if self.need_to_reset:
+                if App.recon_graph is not None:
+                    App.previous_recon_graph = App.recon_graph
                 self.reset()
             App.recon_input.read_host(self.host_file_path)
             self.host_tree_info.destroy()
@@ -243,6 +248,8 @@ class App(tk.Frame):
             self.parasite_tree_info.destroy()
         else:
             if self.need_to_reset:
+                if App.recon_graph is not None:
+                    App.previous_recon_graph = App.recon_graph
                 self.reset()
             App.recon_input.read_host(self.host_file_path)
             App.recon_input.read_parasite(self.parasite_file_path)
@@ -256,6 +263,8 @@ class App(tk.Frame):
             self.first_time_loading_files = False
         else:
             if self.need_to_reset:
+                if App.recon_graph is not None:
+                    App.previous_recon_graph = App.recon_graph
                 self.reset()
             App.recon_input.read_host(self.host_file_path)
             App.recon_input.read_parasite(self.parasite_file_path)
@@ -582,7 +591,18 @@ class App(tk.Frame):
 
     def display_recon_information(self):
         """Display numeric reconciliation results and close unnecessary windows."""
-        App.recon_graph = App.recon_input.reconcile(self.dup_cost, self.trans_cost, self.loss_cost)
+        previous = App.previous_recon_graph
+        if previous is not None and previous.recon_input.host_dict == App.recon_input.host_dict \
+                and previous.recon_input.parasite_dict == App.recon_input.parasite_dict \
+                and (previous.dup_cost, previous.trans_cost, previous.loss_cost) == \
+                (self.dup_cost, self.trans_cost, self.loss_cost):
+            # Only the tip mapping changed, so only the DP rows above the remapped tips are recomputed. The first
+            # edit has no tables to reuse and reconciles from scratch, keeping the tables for the next edits.
+            App.recon_graph = previous.update_tip_mapping(App.recon_input.tip_mapping)
+        else:
+            # Tables are only worth their memory once the tip mapping is being edited
+            App.recon_graph = App.recon_input.reconcile(self.dup_cost, self.trans_cost, self.loss_cost)
+        App.previous_recon_graph = None
         self.recon_count = App.recon_graph.n_recon
         self.cospec_count, self.dup_count, self.trans_count, self.loss_count = App.recon_graph.median().count_events()
         if not self.recon_info_displayed:
@@ -785,7 +805,8 @@ class App(tk.Frame):
 
     def open_window_pvalue_histogram(self):
         """Pop up a new tkinter window to display the p-value histogram."""
-        App.p_value_histogram = App.recon_graph.draw_stats()
+        # Spread the random trials over every core
+        App.p_value_histogram = App.recon_graph.draw_stats(n_jobs=os.cpu_count() or 1)
         self.view_pvalue_histogram_window = tk.Toplevel(self.master)
         self.view_pvalue_histogram_window.geometry("700x700")
         self.view_pvalue_histogram_window.title("p-value Histogram")
@@ -1063,10 +1084,14 @@ def on_closing():
     plt.close("all")
     root.destroy()
 
-root = tk.Tk()
-root.geometry("700x600")
-root.title("eMPRess GUI Version 1")
-App(root)
-root.protocol("WM_DELETE_WINDOW", on_closing)
-root.mainloop()
-root.quit()
+if __name__ == "__main__":
+    # The p-value histogram runs its trials on a process pool; its workers import this module again, and in a
+    # frozen app would run it again, so the window is only created in the main process
+    multiprocessing.freeze_support()
+    root = tk.Tk()
+    root.geometry("700x600")
+    root.title("eMPRess GUI Version 1")
+    App(root)
+    root.protocol("WM_DELETE_WINDOW", on_closing)
+    root.mainloop()
+    root.quit()
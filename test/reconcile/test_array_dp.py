@@ -0,0 +1,124 @@
+import unittest
+
+import empress
+from empress import input_reader
+from empress.miscs import input_generator
+from empress.reconcile import recongraph_tools, array_dp, statistics
+
+
+class TestArrayDP(unittest.TestCase):
+    """
+    array_dp.DP must return exactly what recongraph_tools.DP returns
+    """
+    example_host = "./examples/test_size5_no924_host.nwk"
+    example_parasite = "./examples/test_size5_no924_parasite.nwk"
+    example_mapping = "./examples/test_size5_no924_mapping.mapping"
+
+    costs = [(1, 1, 1), (2, 3, 1), (0.5, 1.5, 2.25)]
+
+    def assertSameResult(self, recon_input, dup_cost, trans_cost, loss_cost, **kwargs):
+        expected = recongraph_tools.DP(recon_input, dup_cost, trans_cost, loss_cost)
+        result = array_dp.DP(recon_input, dup_cost, trans_cost, loss_cost, **kwargs)
+        graph, best_cost, n_recon, roots = result
+        self.assertEqual(list(graph.items()), list(expected[0].items()))
+        self.assertEqual(best_cost, expected[1])
+        self.assertEqual(n_recon, expected[2])
+        self.assertEqual(roots, expected[3])
+
+    def test_example(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite,
+                                                           self.example_mapping)
+        for costs in self.costs:
+            self.assertSameResult(recon_input, *costs)
+
+    def test_all_small_inputs(self):
+        for recon_input in input_generator.generate_all_recon_input(3, 4):
+            for costs in self.costs:
+                self.assertSameResult(recon_input, *costs)
+
+    def test_random_inputs(self):
+        for _ in range(10):
+            recon_input = input_generator.generate_random_recon_input(20, 25)
+            for costs in self.costs:
+                self.assertSameResult(recon_input, *costs)
+
+    def test_level_synchronous(self):
+        for recon_input in input_generator.generate_all_recon_input(3, 4):
+            for costs in self.costs:
+                self.assertSameResult(recon_input, *costs, level_synchronous=True)
+        for _ in range(10):
+            recon_input = input_generator.generate_random_recon_input(20, 25)
+            for costs in self.costs:
+                self.assertSameResult(recon_input, *costs, level_synchronous=True)
+
+    def test_cost_only(self):
+        for recon_input in input_generator.generate_all_recon_input(3, 4):
+            for costs in self.costs:
+                _, expected_cost, _, _ = recongraph_tools.DP(recon_input, *costs)
+                self.assertEqual(array_dp.DP_cost(recon_input, *costs), expected_cost)
+
+    def test_cost_only_batch(self):
+        recon_input = input_generator.generate_random_recon_input(15, 20)
+        tip_mappings = [statistics._create_random_phi(recon_input.tip_mapping) for _ in range(5)]
+        expected = []
+        for tip_mapping in tip_mappings:
+            trial_input = input_reader._ReconInput(recon_input.host_dict, None, recon_input.parasite_dict, None,
+                                                   tip_mapping)
+            expected.append(array_dp.DP_cost(trial_input, 2, 3, 1))
+        self.assertEqual(array_dp.DP_cost_batch(recon_input, tip_mappings, 2, 3, 1), expected)
+
+    def test_batch(self):
+        for _ in range(10):
+            recon_input = input_generator.generate_random_recon_input(20, 25)
+            results = array_dp.DP_batch(recon_input, self.costs)
+            for costs, result in zip(self.costs, results):
+                self.assertEqual(result, recongraph_tools.DP(recon_input, *costs))
+
+    def test_streaming_fill(self):
+        recon_input = input_generator.generate_random_recon_input(20, 25)
+        for costs in self.costs:
+            tables = array_dp.DPTables(recon_input, *costs)
+            tables.fill(keep_tables=False)
+            self.assertIsNone(tables.C)
+            self.assertEqual(array_dp.reconcile_tables(tables), recongraph_tools.DP(recon_input, *costs))
+            with self.assertRaises(ValueError):
+                tables.update_tip_mapping(recon_input.tip_mapping)
+
+    def test_parallel_fill(self):
+        recon_input = input_generator.generate_random_recon_input(40, 60)
+        for costs in self.costs:
+            self.assertSameResult(recon_input, *costs, n_jobs=2)
+
+    def test_session(self):
+        recon_input = input_generator.generate_random_recon_input(20, 25)
+        session = array_dp.ReconciliationSession(recon_input.host_dict)
+        for costs in self.costs:
+            for _ in range(2):
+                self.assertEqual(session.reconcile(recon_input, *costs), recongraph_tools.DP(recon_input, *costs))
+        self.assertEqual(session.n_reused_rows, session.n_rows / 2)
+        # A replicate that only differs at the root reuses the rows of every other clade
+        parasite_dict = dict(recon_input.parasite_dict)
+        top, root, left_edge, right_edge = parasite_dict["pTop"]
+        parasite_dict["pTop"] = (top, root, right_edge, left_edge)
+        replicate = input_reader._ReconInput(recon_input.host_dict, None, parasite_dict, None,
+                                             recon_input.tip_mapping)
+        n_reused_rows = session.n_reused_rows
+        self.assertEqual(session.reconcile(replicate, *self.costs[0]), recongraph_tools.DP(replicate, *self.costs[0]))
+        self.assertEqual(session.n_reused_rows - n_reused_rows, len(parasite_dict) - 1)
+
+    def test_update_tip_mapping(self):
+        for _ in range(10):
+            recon_input = input_generator.generate_random_recon_input(20, 25)
+            for costs in self.costs:
+                tables = array_dp.DPTables(recon_input, *costs)
+                tables.fill()
+                array_dp.reconcile_tables(tables)
+                tip_mapping = statistics._create_random_phi(recon_input.tip_mapping)
+                tables.update_tip_mapping(tip_mapping)
+                new_input = input_reader._ReconInput(recon_input.host_dict, None, recon_input.parasite_dict, None,
+                                                     tip_mapping)
+                self.assertEqual(array_dp.reconcile_tables(tables), recongraph_tools.DP(new_input, *costs))
+
+
+if __name__ == '__main__':
+    unittest.main()
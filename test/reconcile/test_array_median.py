@@ -0,0 +1,97 @@
+import random
+import unittest
+
+import numpy as np
+
+import empress
+from empress.miscs import input_generator
+from empress.recon_graph import CompactReconGraph, NO_NODE
+from empress.reconcile import array_median, median, mpr_counting
+
+
+class TestArrayMedian(unittest.TestCase):
+
+    def test_matches_median(self):
+        n_compared = 0
+        for trial in range(20):
+            random.seed(trial)
+            recon_input = input_generator.generate_random_recon_input(12, 15)
+            recon_input = empress.ReconInputWrapper(recon_input.host_dict, None, recon_input.parasite_dict, None,
+                                                    recon_input.tip_mapping)
+            for counting in (mpr_counting.EXACT, mpr_counting.LOG):
+                recongraph = recon_input.reconcile(1, 2, 1, counting=counting.name)
+                postorder = median.mapping_node_sort(recon_input.parasite_index, recon_input.host_index,
+                                                     list(recongraph.recongraph))
+                node_frequencies, event_frequencies, _ = median.generate_frequencies_dict(
+                    postorder[::-1], recongraph.recongraph, recon_input.parasite_index.names[-1], counting=counting)
+                array_node_frequencies, array_event_frequencies = recongraph._frequencies()
+                for mapping_node, frequency in array_node_frequencies.items():
+                    self.assertAlmostEqual(frequency, node_frequencies[mapping_node])
+                for event, frequency in array_event_frequencies.items():
+                    # Contemporaneous events share one key, which median.py divides once per leaf
+                    if event[0] != "C":
+                        self.assertAlmostEqual(frequency, event_frequencies[event])
+
+            median_graph, _, median_roots = median.compute_median(recongraph.recongraph, event_frequencies,
+                                                                  postorder, recongraph.roots)
+            median_counts = median.get_med_counts(median_graph, median_roots)
+            np.random.seed(trial)
+            expected = median.choose_random_median_wrapper(median_graph, median_roots, median_counts)
+            np.random.seed(trial)
+            random_median = recongraph.median()._reconciliation
+            # median.py compares float sums exactly and can miss ties that median_events finds
+            self.assertAlmostEqual(self.score(random_median, array_event_frequencies),
+                                   self.score(expected, array_event_frequencies))
+            # When both find the same median graph, the same random choices give the same median
+            if self.median_graph(recongraph) == (median_graph, median_roots):
+                self.assertEqual(random_median, expected)
+                n_compared += 1
+        # The inputs are fixed, and only 3 of them have ties that median.py misses
+        self.assertEqual(n_compared, 17)
+
+    @staticmethod
+    def median_graph(recongraph) -> tuple:
+        """
+        :return: the median graph of the array passes, reduced to the mapping nodes reachable from its roots like
+        median.compute_median, and its roots
+        """
+        graph = recongraph._postorder_graph()
+        best_events, median_roots, _, _ = recongraph._session["median_graph"]
+        median_graph = {}
+        stack = list(median_roots)
+        while stack:
+            node = stack.pop()
+            if graph.node_name(node) in median_graph:
+                continue
+            # The events of a mapping node are in the order of its list in the reconciliation graph dict
+            events = [(event, event_tuple) for event, event_tuple in
+                      zip(graph.node_events(node), recongraph.recongraph[graph.node_name(node)]) if best_events[event]]
+            median_graph[graph.node_name(node)] = [event_tuple for _, event_tuple in events]
+            for event, _ in events:
+                for child in (graph.event_children1[event], graph.event_children2[event]):
+                    if child != NO_NODE:
+                        stack.append(int(child))
+        return median_graph, [graph.node_name(root) for root in median_roots]
+
+    @staticmethod
+    def score(reconciliation: dict, event_frequencies: dict) -> float:
+        return sum(0.5 if event[0] == "C" else event_frequencies[event] - 0.5
+                   for events in reconciliation.values() for event in events)
+
+    def test_needs_postorder(self):
+        recon_input = input_generator.generate_random_recon_input(8, 8)
+        recongraph = empress.ReconInputWrapper(recon_input.host_dict, None, recon_input.parasite_dict, None,
+                                               recon_input.tip_mapping).reconcile(1, 1, 1)
+        indices = recongraph.recon_input.parasite_index, recongraph.recon_input.host_index
+        graph = CompactReconGraph.from_dict(recongraph.recongraph, parasite_index=indices[0],
+                                            host_index=indices[1])
+        postorder_graph = graph.postorder()
+        self.assertEqual(postorder_graph, graph)
+        self.assertEqual(list(postorder_graph.event_tuples()), list(recongraph._postorder_graph().event_tuples()))
+        array_median.Schedule(postorder_graph, *indices)
+        with self.assertRaises(ValueError):
+            array_median.Schedule(graph, *indices)
+
+
+if __name__ == '__main__':
+    unittest.main()
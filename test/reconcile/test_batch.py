@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+import empress
+from empress.reconcile import batch
+
+
+class TestBatch(unittest.TestCase):
+    example_host = "./examples/test_size5_no924_host.nwk"
+    example_parasite = "./examples/test_size5_no924_parasite.nwk"
+    example_mapping = "./examples/test_size5_no924_mapping.mapping"
+    example_invalid_mapping = "./examples/test_size5_no924_invalid_mapping.mapping"
+
+    def setUp(self):
+        self.manifest_dir = tempfile.TemporaryDirectory()
+        self.manifest = os.path.join(self.manifest_dir.name, "manifest.txt")
+        with open(self.manifest, "w") as manifest_file:
+            manifest_file.write("# families\n")
+            manifest_file.write("%s %s good\n" % (os.path.abspath(self.example_parasite),
+                                                  os.path.abspath(self.example_mapping)))
+            manifest_file.write("\n")
+            manifest_file.write("%s %s\n" % (os.path.abspath(self.example_parasite),
+                                             os.path.abspath(self.example_invalid_mapping)))
+            # A mapping that leaves a parasite tip out can be read but not reconciled
+            manifest_file.write("%s incomplete.mapping incomplete\n" % os.path.abspath(self.example_parasite))
+            manifest_file.write("%s %s after\n" % (os.path.abspath(self.example_parasite),
+                                                   os.path.abspath(self.example_mapping)))
+        with open(self.example_mapping) as mapping_file:
+            mapping_lines = mapping_file.read().split()
+        with open(os.path.join(self.manifest_dir.name, "incomplete.mapping"), "w") as mapping_file:
+            mapping_file.write("\n".join(mapping_lines[1:]) + "\n")
+
+    def tearDown(self):
+        self.manifest_dir.cleanup()
+
+    def test_read_manifest(self):
+        families = batch.read_manifest(self.manifest)
+        self.assertEqual([name for name, _, _ in families], ["good", "test_size5_no924_parasite", "incomplete",
+                                                                 "after"])
+
+    def test_reconcile_families(self):
+        expected = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite,
+                                                        self.example_mapping).reconcile(2, 3, 1)
+        families = batch.read_manifest(self.manifest)
+        for n_jobs in (1, 2):
+            records = {record["family"]: record for record in
+                       batch.reconcile_families(self.example_host, families, 2, 3, 1, n_jobs)}
+            self.assertEqual(records["good"]["cost"], expected.total_cost)
+            self.assertEqual(records["good"]["n_recon"], expected.n_recon)
+            self.assertIsNone(records["good"]["error"])
+            self.assertIsNone(records["test_size5_no924_parasite"]["cost"])
+            self.assertIsNotNone(records["test_size5_no924_parasite"]["error"])
+            self.assertIsNone(records["incomplete"]["cost"])
+            self.assertIsNotNone(records["incomplete"]["error"])
+            self.assertEqual(records["after"]["cost"], expected.total_cost)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+import empress
+from empress.reconcile import graph_export, recongraph_tools
+
+
+class TestGraphExport(unittest.TestCase):
+    example_host = "./examples/test_size5_no924_host.nwk"
+    example_parasite = "./examples/test_size5_no924_parasite.nwk"
+    example_mapping = "./examples/test_size5_no924_mapping.mapping"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite,
+                                                           self.example_mapping)
+        self.recongraph = recon_input.reconcile(1, 1, 1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def test_same_as_export_csv(self):
+        recongraph = self.recongraph
+        recongraph_tools.export_csv(self.path("old.csv"), recongraph.recongraph, recongraph.roots,
+                                    recongraph.event_frequencies, recongraph.node_frequencies)
+        with open(self.path("old.csv")) as old_file:
+            expected = old_file.read()
+        # Chunks of 3 rows do not line up with the mapping nodes
+        for graph, name in ((recongraph.recongraph, "dict.csv"), (recongraph.compact(), "compact.csv")):
+            graph_export.export_graph(self.path(name), graph, recongraph.roots, recongraph.event_frequencies,
+                                      recongraph.node_frequencies, chunk_rows=3)
+            with open(self.path(name)) as new_file:
+                self.assertEqual(new_file.read(), expected)
+        # The frequency arrays of a compact graph stand in for the dicts
+        self.assertEqual(list(graph_export.iter_rows(recongraph.compact(), recongraph.roots)),
+                         list(graph_export.iter_rows(recongraph.recongraph, recongraph.roots,
+                                                     recongraph.event_frequencies, recongraph.node_frequencies)))
+
+    def test_jsonl_gzip_columns(self):
+        columns = ["parasite", "event", "child1_host"]
+        self.recongraph.export_csv(self.path("graph.jsonl.gz"), columns)
+        with gzip.open(self.path("graph.jsonl.gz"), "rt") as jsonl_file:
+            rows = [json.loads(line) for line in jsonl_file]
+        expected = list(graph_export.iter_rows(self.recongraph.recongraph, self.recongraph.roots,
+                                               self.recongraph.event_frequencies, self.recongraph.node_frequencies,
+                                               columns))
+        self.assertEqual([tuple(row[column] for column in columns) for row in rows], expected)
+        with self.assertRaises(ValueError):
+            self.recongraph.export_csv(self.path("graph.csv"), ["parasite", "unknown"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import math
+import unittest
+
+import empress
+from empress.miscs import input_generator
+from empress.reconcile import recongraph_tools, mpr_counting
+
+
+class TestMPRCounting(unittest.TestCase):
+    example_host = "./examples/test_size5_no924_host.nwk"
+    example_parasite = "./examples/test_size5_no924_parasite.nwk"
+    example_mapping = "./examples/test_size5_no924_mapping.mapping"
+
+    def test_count_mprs(self):
+        for _ in range(5):
+            recon_input = input_generator.generate_random_recon_input(20, 25)
+            graph, _, count, roots = recongraph_tools.DP(recon_input, 1, 1, 1)
+            log_count = recongraph_tools.count_mprs_wrapper(roots, graph, mpr_counting.LOG)
+            self.assertAlmostEqual(mpr_counting.LOG.n_recon(log_count), math.log10(count))
+            modular_count = recongraph_tools.count_mprs_wrapper(roots, graph, mpr_counting.MODULAR)
+            self.assertAlmostEqual(modular_count[0], log_count)
+            self.assertEqual(modular_count[1], count % mpr_counting.ModularCounting.MODULUS)
+
+    def test_wrapper_frequencies(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite,
+                                                           self.example_mapping)
+        exact = recon_input.reconcile(1, 1, 1)
+        for counting in ("log", "modular"):
+            recongraph = recon_input.reconcile(1, 1, 1, counting=counting)
+            self.assertAlmostEqual(recongraph.n_recon, math.log10(exact.n_recon))
+            self.assertEqual(recongraph.event_frequencies.keys(), exact.event_frequencies.keys())
+            for event, frequency in exact.event_frequencies.items():
+                # Every contemporary event is the same event node, so its frequency is not meaningful
+                if event[0] == "C":
+                    continue
+                self.assertAlmostEqual(recongraph.event_frequencies[event], frequency)
+            for mapping_node, frequency in exact.node_frequencies.items():
+                if mapping_node == (None, None):
+                    continue
+                self.assertAlmostEqual(recongraph.node_frequencies[mapping_node], frequency)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            mpr_counting.get_backend("float")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from empress import input_reader
+from empress.miscs import input_generator
+from empress.reconcile import recongraph_tools, rerooting
+
+
+class TestRerooting(unittest.TestCase):
+    costs = [(1, 1, 1), (2, 3, 1), (0.5, 1.5, 2.25)]
+
+    def test_rooting_costs(self):
+        for _ in range(5):
+            recon_input = input_generator.generate_random_recon_input(10, 12)
+            for costs in self.costs:
+                rooting_costs = rerooting.rooting_costs(recon_input, *costs)
+                self.assertEqual(len(rooting_costs), len(recon_input.parasite_dict) - 2)
+                for node, cost in rooting_costs.items():
+                    rerooted = input_reader._ReconInput(recon_input.host_dict, None,
+                                                        rerooting.reroot(recon_input.parasite_dict, node), None,
+                                                        recon_input.tip_mapping)
+                    self.assertEqual(len(rerooted.parasite_dict), len(recon_input.parasite_dict))
+                    self.assertEqual(recongraph_tools.DP(rerooted, *costs)[1], cost)
+
+    def test_best_rootings(self):
+        recon_input = input_generator.generate_random_recon_input(10, 12)
+        rooting_costs = rerooting.rooting_costs(recon_input, 2, 3, 1)
+        rootings = rerooting.best_rootings(recon_input, 2, 3, 1)
+        self.assertEqual(len(rootings), list(rooting_costs.values()).count(min(rooting_costs.values())))
+        for rerooted, result in rootings:
+            self.assertEqual(result, recongraph_tools.DP(rerooted, 2, 3, 1))
+            self.assertEqual(result[1], min(rooting_costs.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import empress
+from empress import binary_io
+from empress.recon_graph import CompactReconGraph
+
+
+class TestBinaryIO(unittest.TestCase):
+    example_host = "./examples/test_size5_no924_host.nwk"
+    example_parasite = "./examples/test_size5_no924_parasite.nwk"
+    example_mapping = "./examples/test_size5_no924_mapping.mapping"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite,
+                                                                self.example_mapping)
+        self.recongraph = self.recon_input.reconcile(1, 1, 1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def test_recon_graph(self):
+        compact = CompactReconGraph.from_dict(self.recongraph.recongraph, self.recongraph.event_frequencies,
+                                              node_counts={node: 2 ** 70 for node in self.recongraph.recongraph})
+        binary_io.save_recon_graph(self.path("graph.bin"), compact)
+        loaded = binary_io.load_recon_graph(self.path("graph.bin"))
+        # The arrays are views of the mapped file
+        base = loaded.event_types
+        while base.base is not None and not isinstance(base, np.memmap):
+            base = base.base
+        self.assertIsInstance(base, np.memmap)
+        self.assertFalse(loaded.event_types.flags.writeable)
+        self.assertEqual(list(loaded.to_dict().items()), list(self.recongraph.recongraph.items()))
+        self.assertEqual(loaded.event_frequencies_dict(), self.recongraph.event_frequencies)
+        self.assertEqual(loaded.node_counts.tolist(), compact.node_counts.tolist())
+        self.assertEqual(binary_io.load_recon_graph(self.path("graph.bin"), mmap=False), loaded)
+
+    def test_tree_index_and_histogram(self):
+        binary_io.save_tree_index(self.path("host.bin"), self.recon_input.host_index)
+        self.assertEqual(binary_io.load_tree_index(self.path("host.bin")).to_edge_dict(), self.recon_input.host_dict)
+        histogram = {0: 3, 2: 2 ** 80, 5: 1}
+        binary_io.save_histogram(self.path("histogram.bin"), histogram)
+        self.assertEqual(binary_io.load_histogram(self.path("histogram.bin")).histogram_dict, histogram)
+        with self.assertRaises(ValueError):
+            binary_io.load_recon_graph(self.path("histogram.bin"))
+
+    def test_version(self):
+        binary_io.save_histogram(self.path("histogram.bin"), {0: 1})
+        with open(self.path("histogram.bin"), "r+b") as binary_file:
+            binary_file.seek(len(binary_io.MAGIC))
+            binary_file.write((binary_io.FORMAT_VERSION + 1).to_bytes(4, "little"))
+        with self.assertRaises(ValueError):
+            binary_io.load_histogram(self.path("histogram.bin"))
+
+    def test_wrapper(self):
+        self.recongraph.save(self.path("result.bin"))
+        loaded = empress.ReconGraphWrapper.load(self.path("result.bin"))
+        self.assertEqual(loaded.recongraph, self.recongraph.recongraph)
+        self.assertEqual(loaded.roots, self.recongraph.roots)
+        self.assertEqual((loaded.total_cost, loaded.n_recon), (self.recongraph.total_cost, self.recongraph.n_recon))
+        self.assertEqual(loaded.recon_input.host_dict, self.recon_input.host_dict)
+        self.assertEqual(loaded.recon_input.tip_mapping, self.recon_input.tip_mapping)
+        self.assertEqual(dict(loaded.event_frequencies), self.recongraph.event_frequencies)
+        self.assertEqual(loaded._histogram(), self.recongraph._histogram())
+        self.assertEqual(loaded._frequencies(), self.recongraph._frequencies())
+        self.assertEqual(loaded.median().count_events(), self.recongraph.median().count_events())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import empress
 import unittest
 import os
+import sys
 
 
 class TestEmpressWrappers(unittest.TestCase):
@@ -25,6 +26,67 @@ class TestEmpressWrappers(unittest.TestCase):
         # the testing recongraph should be designed to have multiple MPRs for DTL = 111
         self.assertGreater(recongraph.n_recon, 1)
 
+    def test_reconcile_batch(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite, self.example_mapping)
+        cost_triples = [(1, 1, 1), (2, 3, 1), (0.5, 2, 1)]
+        recongraphs = recon_input.reconcile_batch(cost_triples)
+        self.assertEqual(len(recongraphs), len(cost_triples))
+        for costs, recongraph in zip(cost_triples, recongraphs):
+            expected = recon_input.reconcile(*costs)
+            self.assertEqual(recongraph.recongraph, expected.recongraph)
+            self.assertEqual(recongraph.total_cost, expected.total_cost)
+            self.assertEqual(recongraph.n_recon, expected.n_recon)
+
+    def test_reconcile_best_rootings(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite, self.example_mapping)
+        rootings = recon_input.reconcile_best_rootings(1, 1, 1)
+        self.assertGreater(len(rootings), 0)
+        for rerooted, recongraph in rootings:
+            self.assertEqual(recongraph.total_cost, rerooted.reconcile(1, 1, 1).total_cost)
+            self.assertLessEqual(recongraph.total_cost, recon_input.reconcile(1, 1, 1).total_cost)
+
+    def test_update_tip_mapping(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite, self.example_mapping)
+        recongraph = recon_input.reconcile(1, 1, 1, keep_tables=True)
+        parasite_tips = sorted(recon_input.tip_mapping)
+        changes = {parasite_tips[0]: recon_input.tip_mapping[parasite_tips[-1]]}
+        updated = recongraph.update_tip_mapping(changes)
+        tip_mapping = dict(recon_input.tip_mapping)
+        tip_mapping.update(changes)
+        expected = empress.ReconInputWrapper(recon_input.host_dict, None, recon_input.parasite_dict, None,
+                                             tip_mapping).reconcile(1, 1, 1)
+        self.assertEqual(updated.recongraph, expected.recongraph)
+        self.assertEqual(updated.total_cost, expected.total_cost)
+        self.assertEqual(updated.n_recon, expected.n_recon)
+        self.assertEqual(updated.event_frequencies, expected.event_frequencies)
+        # Without tables the new tip mapping is reconciled from scratch
+        self.assertEqual(recon_input.reconcile(1, 1, 1).update_tip_mapping(changes).recongraph, expected.recongraph)
+
+    def test_stats_reproducible(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite, self.example_mapping)
+        recongraph = recon_input.reconcile(1, 1, 1)
+        costs, p = recongraph.stats(20, n_jobs=2, seed=3)
+        self.assertEqual(len(costs), 20)
+        self.assertEqual((costs, p), recongraph.stats(20, n_jobs=2, seed=3))
+        with self.assertRaises(ValueError):
+            recongraph.stats(20, n_jobs=0, seed=3)
+
+    def test_sequential_stats(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite, self.example_mapping)
+        recongraph = recon_input.reconcile(1, 1, 1)
+        costs, p, (p_low, p_high) = recongraph.sequential_stats(0.05, max_trials=200, seed=3)
+        self.assertLessEqual(len(costs), 200)
+        self.assertTrue(p_low <= p <= p_high)
+        # Either the test stopped early because the interval cleared alpha, or it used every trial
+        self.assertTrue(p_high < 0.05 or p_low > 0.05 or len(costs) == 200)
+        # The steps can run on a process pool, reproducibly for the same seed and n_jobs
+        parallel = recongraph.sequential_stats(0.05, max_trials=200, seed=3, n_jobs=2)
+        self.assertLessEqual(len(parallel[0]), 200)
+        self.assertEqual(parallel, recongraph.sequential_stats(0.05, max_trials=200, seed=3, n_jobs=2))
+        for alpha, confidence in ((1.5, 0.99), (0.05, 1), (0.05, 0)):
+            with self.assertRaises(ValueError):
+                recongraph.sequential_stats(alpha, max_trials=200, confidence=confidence, seed=3)
+
     def test_median(self):
         recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite, self.example_mapping)
         recongraph = recon_input.reconcile(1, 1, 1)
@@ -43,6 +105,36 @@ class TestEmpressWrappers(unittest.TestCase):
         # n_recon ~ number of reconciliation graphs
         self.assertEqual(total_recon, recongraph.n_recon)
 
+    def test_session_reuse(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite, self.example_mapping)
+        recongraph = recon_input.reconcile(1, 1, 1)
+        event_frequencies = recongraph.event_frequencies
+        for _ in range(3):
+            median_reconciliation = recongraph.median()
+            for mapping_node, events in median_reconciliation._reconciliation.items():
+                self.assertTrue(set(events) <= set(recongraph.recongraph[mapping_node]))
+        recongraph.set_event_frequencies()
+        self.assertIs(recongraph.event_frequencies, event_frequencies)
+        clusters = recon_input.reconcile(1, 1, 1, counting="log").cluster(2)
+        self.assertEqual(len(clusters), 2)
+
+    def test_deep_tree(self):
+        # A caterpillar parasite tree much deeper than the recursion limit
+        n_tips = 3 * sys.getrecursionlimit()
+        newick = "p0"
+        for i in range(1, n_tips):
+            newick = "(%s,p%d)i%d" % (newick, i, i)
+        recon_input = empress.ReconInputWrapper()
+        recon_input.read_host(self.example_host)
+        recon_input.parasite_dict, _ = empress.input_reader._ReconInput._parse_newick(newick + ";", "parasite")
+        host_tips = [vertex for _, vertex, left, _ in recon_input.host_dict.values() if left is None]
+        recon_input.tip_mapping = {"p%d" % i: host_tips[i % len(host_tips)] for i in range(n_tips)}
+        recongraph = recon_input.reconcile(1, 1, 1)
+        self.assertGreater(recongraph.n_recon, 0)
+        self.assertTrue(isinstance(recongraph.median(), empress.ReconciliationWrapper))
+        self.assertEqual(empress.input_reader._ReconInput._tree_dict_to_str(recon_input.parasite_dict, "pTop"),
+                         newick)
+
     def test_reconciliation_count_events(self):
         recon_dict = {
             ('n0', 'm1'): [('T', ('n1', 'm1'), ('n5', 'm5'))],
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+import empress
+from empress.histogram import histogram_alg
+from empress.reconcile import median, recongraph_tools
+from empress.recon_graph import CompactReconGraph, NO_NODE
+
+
+class TestCompactReconGraph(unittest.TestCase):
+    example_host = "./examples/test_size5_no924_host.nwk"
+    example_parasite = "./examples/test_size5_no924_parasite.nwk"
+    example_mapping = "./examples/test_size5_no924_mapping.mapping"
+
+    def setUp(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite,
+                                                           self.example_mapping)
+        self.recongraph = recon_input.reconcile(1, 1, 1)
+        self.compact = self.recongraph.compact()
+
+    def test_round_trip(self):
+        graph = self.recongraph.recongraph
+        self.assertEqual(list(self.compact.to_dict().items()), list(graph.items()))
+        self.assertEqual(self.compact, graph)
+        self.assertEqual(len(self.compact), len(graph))
+        self.assertEqual(self.compact.n_events, sum(len(events) for events in graph.values()))
+        self.assertEqual(self.compact.event_frequencies_dict(), self.recongraph.event_frequencies)
+        # The (None, None) placeholder is not a mapping node
+        node_frequencies = dict(self.recongraph.node_frequencies)
+        node_frequencies.pop((None, None), None)
+        self.assertEqual(self.compact.node_frequencies_dict(), node_frequencies)
+        self.assertNotIn(("missing", "node"), self.compact)
+        with self.assertRaises(KeyError):
+            self.compact[("missing", "node")]
+
+    def test_subgraph_children(self):
+        # A child that is not a key is stored but stays out of the dict view
+        graph = {("n0", "m0"): [("S", ("n1", "m1"), ("n2", "m2"))], ("n1", "m1"): [("C", (None, None), (None, None))]}
+        compact = CompactReconGraph.from_dict(graph)
+        self.assertEqual((compact.n_keys, compact.n_nodes), (2, 3))
+        self.assertEqual(compact.to_dict(), graph)
+        self.assertNotIn(("n2", "m2"), compact)
+        self.assertEqual(compact.event_children2[1], NO_NODE)
+
+    def test_dict_consumers(self):
+        graph = self.recongraph.recongraph
+        parasite_tree, parasite_root, host_tree, _ = self.recongraph._vertex_trees()
+        self.assertEqual(
+            histogram_alg.diameter_algorithm(host_tree, parasite_tree, parasite_root, self.compact, self.compact,
+                                             False, False).histogram_dict,
+            histogram_alg.diameter_algorithm(host_tree, parasite_tree, parasite_root, graph, graph,
+                                             False, False).histogram_dict)
+        postorder = median.mapping_node_sort(parasite_tree, host_tree, list(self.compact.keys()))
+        self.assertEqual(postorder, median.mapping_node_sort(self.recongraph.recon_input.parasite_index,
+                                                             self.recongraph.recon_input.host_index,
+                                                             list(self.recongraph.recongraph)))
+        self.assertEqual(median.compute_median(self.compact, self.recongraph.event_frequencies, postorder,
+                                               self.recongraph.roots),
+                         median.compute_median(graph, self.recongraph.event_frequencies, postorder,
+                                               self.recongraph.roots))
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, name) for name in ("dict.csv", "compact.csv")]
+            for path, g in zip(paths, (graph, self.compact)):
+                recongraph_tools.export_csv(path, g, self.recongraph.roots, self.recongraph.event_frequencies,
+                                            self.recongraph.node_frequencies)
+            with open(paths[0]) as dict_file, open(paths[1]) as compact_file:
+                self.assertEqual(dict_file.read(), compact_file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+import unittest
+
+import empress
+from empress import result_cache
+
+
+class TestResultCache(unittest.TestCase):
+    example_host = "./examples/test_size5_no924_host.nwk"
+    example_parasite = "./examples/test_size5_no924_parasite.nwk"
+    example_mapping = "./examples/test_size5_no924_mapping.mapping"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite,
+                                                                self.example_mapping)
+
+    def tearDown(self):
+        result_cache.disable_cache()
+        self.directory.cleanup()
+
+    def test_key(self):
+        key = result_cache.ResultCache.key("reconcile", self.recon_input, 1, 1, 1)
+        self.assertEqual(key, result_cache.ResultCache.key("reconcile", self.recon_input, 1.0, 1.0, 1.0))
+        self.assertNotEqual(key, result_cache.ResultCache.key("reconcile", self.recon_input, 1, 2, 1))
+        self.assertNotEqual(key, result_cache.ResultCache.key("histogram", self.recon_input, 1, 1, 1))
+        # Insertion order of the tree dicts does not matter
+        reordered = empress.ReconInputWrapper(dict(reversed(list(self.recon_input.host_dict.items()))), None,
+                                              self.recon_input.parasite_dict, None, self.recon_input.tip_mapping)
+        self.assertEqual(key, result_cache.ResultCache.key("reconcile", reordered, 1, 1, 1))
+
+    def test_get_put(self):
+        cache = result_cache.ResultCache(self.directory.name)
+        self.assertIsNone(cache.get("missing"))
+        cache.put("present", {("n0", "m1"): [("S", ("n1", "m2"), ("n2", "m3"))]})
+        self.assertEqual(cache.get("present"), {("n0", "m1"): [("S", ("n1", "m2"), ("n2", "m3"))]})
+        with open(os.path.join(self.directory.name, "present.bin"), "wb") as entry_file:
+            entry_file.write(b"corrupt")
+        self.assertIsNone(cache.get("present"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_lru_eviction(self):
+        cache = result_cache.ResultCache(self.directory.name, max_bytes=10 ** 9)
+        for i in range(3):
+            cache.put(str(i), os.urandom(1000))
+            past = time.time() - 100 + i
+            os.utime(os.path.join(self.directory.name, "%d.bin" % i), (past, past))
+        # Reading 0 makes 1 the least recently used entry
+        cache.get("0")
+        cache.max_bytes = 2500
+        cache.evict()
+        self.assertIsNone(cache.get("1"))
+        self.assertIsNotNone(cache.get("0"))
+        self.assertIsNotNone(cache.get("2"))
+
+    def test_reconcile(self):
+        cache = result_cache.enable_cache(self.directory.name)
+        expected = self.recon_input.reconcile(1, 1, 1)
+        self.assertEqual(cache.hits, 0)
+        cached = self.recon_input.reconcile(1, 1, 1)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cached.recongraph, expected.recongraph)
+        self.assertEqual(cached.roots, expected.roots)
+        self.assertEqual(cached.total_cost, expected.total_cost)
+        self.assertEqual(cached.n_recon, expected.n_recon)
+        self.assertEqual(cached.event_frequencies, expected.event_frequencies)
+        self.assertEqual(cached.node_frequencies, expected.node_frequencies)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import empress
+from empress.miscs import input_generator
+from empress.histogram import histogram_alg
+from empress.reconcile import recongraph_tools, diameter
+from empress.tree_index import TreeIndex
+
+
+class TestTreeIndex(unittest.TestCase):
+    example_host = "./examples/test_size5_no924_host.nwk"
+    example_parasite = "./examples/test_size5_no924_parasite.nwk"
+    example_mapping = "./examples/test_size5_no924_mapping.mapping"
+
+    def test_matches_traversals(self):
+        for _ in range(10):
+            recon_input = input_generator.generate_random_recon_input(20, 25)
+            for tree, root, index in [(recon_input.host_dict, "hTop", recon_input.host_index),
+                                      (recon_input.parasite_dict, "pTop", recon_input.parasite_index)]:
+                self.assertEqual(list(index.postorder_edges), list(recongraph_tools.postorder(tree, root)))
+                self.assertEqual(list(index.preorder_edges), list(recongraph_tools.preorder(tree, root)))
+                vertex_tree, vertex_root, n_nodes = index.vertex_tree()
+                expected_tree, expected_root, expected_n_nodes = diameter.reformat_tree(tree, root)
+                self.assertEqual(list(vertex_tree.items()), list(expected_tree.items()))
+                self.assertEqual((vertex_root, n_nodes), (expected_root, expected_n_nodes))
+                for node in range(len(index)):
+                    if not index.is_leaf(node):
+                        self.assertEqual(index.depth[index.left[node]], index.depth[node] + 1)
+                        self.assertEqual(index.parent[index.right[node]], node)
+
+    def test_ancestry_and_adapters(self):
+        recon_input = input_generator.generate_random_recon_input(15, 20)
+        index = recon_input.host_index
+        vertex_tree, vertex_root, _ = index.vertex_tree()
+        table = histogram_alg.calculate_ancestral_table(vertex_tree)
+        for name1 in vertex_tree:
+            for name2 in vertex_tree:
+                self.assertEqual(index.ancestry(index.ids[name1], index.ids[name2]), table[name1][name2])
+        self.assertEqual(index.to_edge_dict(), recon_input.host_dict)
+        rebuilt = TreeIndex.from_vertex_tree(vertex_tree, vertex_root)
+        self.assertEqual(rebuilt.edges, index.edges)
+        self.assertEqual(rebuilt.left, index.left)
+
+    def test_shared_and_invalidated(self):
+        recon_input = empress.ReconInputWrapper.from_files(self.example_host, self.example_parasite,
+                                                           self.example_mapping)
+        index = recon_input.host_index
+        self.assertIs(recon_input.host_index, index)
+        with self.assertRaises(ValueError):
+            index.left_array[0] = 0
+        recon_input.read_host(self.example_host)
+        self.assertIsNot(recon_input.host_index, index)
+        parasite_index = recon_input.parasite_index
+        recon_input.parasite_dict = dict(recon_input.parasite_dict)
+        self.assertIsNot(recon_input.parasite_index, parasite_index)
+
+
+if __name__ == '__main__':
+    unittest.main()